@@ -34,6 +34,45 @@ extern module kasumi_cipher_3(  clock clk,
     timing from rising clock clk kasumi_output, kasumi_input_ack;
 }
 
+/*m kasumi_cipher_pair_3 */
+extern module kasumi_cipher_pair_3(  clock clk,
+                         input bit reset_n,
+                         input t_kasumi_input    kasumi_input,
+                         output bit              kasumi_input_ack,
+                         output t_kasumi_output  kasumi_output,
+                         input bit               kasumi_output_ack
+    )
+{
+    timing to   rising clock clk kasumi_input, kasumi_output_ack;
+    timing from rising clock clk kasumi_output, kasumi_input_ack;
+}
+
+/*m kasumi_accelerator */
+extern module kasumi_accelerator(  clock clk,
+                         input bit reset_n,
+                         input t_kasumi_acceleration_request   acceleration_request,
+                         output bit                            acceleration_request_ack,
+                         output t_kasumi_acceleration_response acceleration_response,
+                         input bit                             acceleration_response_ack
+    )
+{
+    timing to   rising clock clk acceleration_request, acceleration_response_ack;
+    timing from rising clock clk acceleration_response, acceleration_request_ack;
+}
+
+/*m kasumi_cipher_array */
+extern module kasumi_cipher_array(  clock clk,
+                         input bit reset_n,
+                         input t_kasumi_tagged_input   kasumi_input,
+                         output bit                    kasumi_input_ack,
+                         output t_kasumi_tagged_output kasumi_output,
+                         input bit                     kasumi_output_ack
+    )
+{
+    timing to   rising clock clk kasumi_input, kasumi_output_ack;
+    timing from rising clock clk kasumi_output, kasumi_input_ack;
+}
+
 /*m Generic kasumi_cipher */
 extern module kasumi_cipher(  clock clk,
                          input bit reset_n,
@@ -32,12 +32,26 @@ typedef enum[4] {
     kasumi_op_f9,               // Take specified number of bits and assume it is fully describing an authdata + data + direction + padding and generate MAC
 } t_kasumi_op;
 typedef struct {
+    bit         valid;
     t_kasumi_op op;
-    bit[4]      tag    "Tag of the request";
-    bit[16]     length "Additional data length";
-    bit[64]     data   "Interpreted as length in bits for ciphering";
+    bit[4]      tag    "Tag of the request; the bottom bits select the stream of the accelerator";
+    bit[16]     length "Length in bits of the data words that follow the request";
+    bit[64]     data   "Key, auth data or initial value, depending on the operation; or a data word";
 } t_kasumi_acceleration_request;
 
+/*t t_kasumi_acceleration_response
+ *
+ * Response from the Kasumi accelerator - keystream or ciphered data
+ * words, or a MAC-I (in the top 32 bits)
+ *
+ */
+typedef struct {
+    bit         valid;
+    bit[4]      tag  "Tag of the request";
+    bit         last "Asserted for the last response word of the request";
+    bit[64]     data;
+} t_kasumi_acceleration_response;
+
 /*t t_kasumi_input
  *
  * Input data for Kasumi
@@ -60,3 +74,28 @@ typedef struct {
     bit[64] data;
 } t_kasumi_output;
 
+/*t t_kasumi_tagged_input
+ *
+ * Input data for an array of Kasumi ciphers, with a tag returned with
+ * the output
+ *
+ */
+typedef struct {
+    bit valid;
+    bit[8] tag;
+    bit[64] data;
+    bit[64] k0;
+    bit[64] k1;
+} t_kasumi_tagged_input;
+
+/*t t_kasumi_tagged_output
+ *
+ * Output data from an array of Kasumi ciphers
+ *
+ */
+typedef struct {
+    bit valid;
+    bit[8] tag;
+    bit[64] data;
+} t_kasumi_tagged_output;
+
@@ -26,17 +26,29 @@ typedef struct {
     bit data;
 } t_prng_data;
 
+/*t t_prng_wide_data
+ *
+ * Data from the wide output of the PRNG; each bit of data is valid
+ * (independently) if the corresponding bit of valid is set
+ */
+typedef struct {
+    bit[8] valid;
+    bit[8] data;
+} t_prng_wide_data;
+
 /*t t_prng_config */
 typedef struct {
     bit enable;
     bit[3] min_valid;
     bit    seed_request;
+    bit[2] wide "0 for one bit every other cycle; 1 for four bits per cycle; 2 or 3 for eight bits per cycle";
 } t_prng_config;
 
 /*t t_prng_status */
 typedef struct {
     bit seed_complete;
     t_prng_data data;
+    t_prng_wide_data wide_data "In wide mode, the valid bits of the wide output, of which data is bit 0; else data in bit 0";
 } t_prng_status;
 
 /*t t_prng_whiteness_control
@@ -55,6 +67,21 @@ typedef struct {
     bit[64] data;
 } t_prng_whiteness_result;
 
+/*t t_prng_health_config
+ */
+typedef struct {
+    bit      enable;
+    bit[8]   repetition_cutoff "Length of a run of identical bits that fails the repetition count test; 0 to disable";
+    bit[10]  proportion_cutoff "Number of bits of a window of 1024 matching its first that fails the adaptive proportion test; 0 to disable";
+} t_prng_health_config;
+
+/*t t_prng_health_status
+ */
+typedef struct {
+    bit repetition_failure "Asserted for one cycle when the repetition count test fails";
+    bit proportion_failure "Asserted for one cycle when the adaptive proportion test fails";
+} t_prng_health_status;
+
 /*a Modules */
 /*m prng */
 extern module prng( clock clk         "System clock",
@@ -72,7 +99,7 @@ extern module prng( clock clk         "System clock",
 /*m prng_whiteness_monitor */
 extern module prng_whiteness_monitor( clock clk         "System clock",
                                       input bit reset_n "Active low reset",
-                                      input t_prng_data data_in "Data from PRNG",
+                                      input t_prng_wide_data data_in "Data from PRNG, with up to eight valid bits per cycle",
                                       input t_prng_whiteness_control whiteness_control "Control (enable, type etc) of whiteness monitor",
                                       output t_prng_whiteness_result whiteness_result  "Results from whiteness monitor,"
     )
@@ -82,4 +109,34 @@ extern module prng_whiteness_monitor( clock clk         "System clock",
     timing from rising clock clk whiteness_result;
 }
 
+/*m prng_whiteness_concurrent */
+extern module prng_whiteness_concurrent( clock clk         "System clock",
+                                         input bit reset_n "Active low reset",
+                                         input t_prng_wide_data data_in "Data from PRNG, with up to eight valid bits per cycle",
+                                         input t_prng_whiteness_control whiteness_control "Control of the run; the monitor type and subtype are ignored",
+                                         input bit[12] run_length_parameter "Data for the run length monitor",
+                                         input bit[12] template_parameter   "Data for the template match monitors",
+                                         input bit[3] result_monitor "Monitor whose result is presented in the next cycle",
+                                         input bit consume_result "Asserted to consume the presented result",
+                                         output t_prng_whiteness_result whiteness_result "Result of the monitor selected by result_monitor; zero for monitors 0 and 3"
+    )
+{
+    timing to   rising clock clk data_in;
+    timing to   rising clock clk whiteness_control;
+    timing to   rising clock clk run_length_parameter, template_parameter;
+    timing to   rising clock clk result_monitor, consume_result;
+    timing from rising clock clk whiteness_result;
+}
 
+/*m prng_health_monitor */
+extern module prng_health_monitor( clock clk         "System clock",
+                                   input bit reset_n "Active low reset",
+                                   input t_prng_wide_data data_in "Data to be tested; each lane whose valid bit is set has a data bit",
+                                   input t_prng_health_config health_config "Configuration (enable, cutoffs) of the tests",
+                                   output t_prng_health_status health_status "Failures of the tests"
+    )
+{
+    timing to   rising clock clk data_in;
+    timing to   rising clock clk health_config;
+    timing from rising clock clk health_status;
+}
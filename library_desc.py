@@ -14,10 +14,16 @@ class PrngiModules(cdl_desc.Modules):
     export_dirs = cdl_include_dirs + [ src_dir ]
     modules = []
     modules += [ CdlModule("prng_whiteness_monitor") ]
+    modules += [ CdlModule("prng_whiteness_monitor_8", cdl_filename="prng_whiteness_monitor", constants={"cfg_lanes":8}) ]
+    modules += [ CdlModule("prng_whiteness_concurrent") ]
+    modules += [ CdlModule("prng_whiteness_concurrent_none") ]
+    modules += [ CdlModule("prng_health_monitor") ]
     modules += [ CdlModule("prng_entropy_mux_4") ]
     modules += [ CdlModule("prng") ]
-    modules += [ CdlModule("apb_target_prng", constants={"cfg_disable_whiteness":0}) ]
+    modules += [ CdlModule("apb_target_prng", constants={"cfg_disable_whiteness":0}, instance_types={"prng_whiteness_concurrent":"prng_whiteness_concurrent_none"}) ]
+    modules += [ CdlModule("apb_target_prng_concurrent", cdl_filename="apb_target_prng", constants={"cfg_concurrent_whiteness":1}) ]
     modules += [ CdlModule("tb_prng", src_dir=tb_src_dir) ]
+    modules += [ CdlModule("tb_prng_8", src_dir=tb_src_dir, cdl_filename="tb_prng", instance_types={"prng_whiteness_monitor":"prng_whiteness_monitor_8"}) ]
     pass
 
 class KasumiModules(cdl_desc.Modules):
@@ -33,6 +39,16 @@ class KasumiModules(cdl_desc.Modules):
     modules += [ CdlModule("kasumi_sbox7") ]
     modules += [ CdlModule("kasumi_sbox9") ]
     modules += [ CdlModule("kasumi_cipher_3") ]
+    modules += [ CdlModule("kasumi_cipher_pair_3") ]
+    modules += [ CdlModule("kasumi_accelerator") ]
+    for n in (1, 2, 8):
+        modules += [ CdlModule("kasumi_accelerator_%d"%n, cdl_filename="kasumi_accelerator", constants={"cfg_num_streams":n}) ]
+        pass
+    for n in (1, 2, 4, 8):
+        modules += [ CdlModule("kasumi_cipher_array_%d"%n, cdl_filename="kasumi_cipher_array", constants={"cfg_num_cores":n}) ]
+        pass
     modules += [ CdlModule("tb_kasumi_cipher", src_dir=tb_src_dir) ]
+    modules += [ CdlModule("tb_kasumi_cipher_3", src_dir=tb_src_dir, cdl_filename="tb_kasumi_cipher", instance_types={"kasumi_cipher":"kasumi_cipher_3"}) ]
+    modules += [ CdlModule("tb_kasumi_cipher_pair_3", src_dir=tb_src_dir, cdl_filename="tb_kasumi_cipher", instance_types={"kasumi_cipher":"kasumi_cipher_pair_3"}) ]
     pass
 
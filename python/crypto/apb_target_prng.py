@@ -16,6 +16,8 @@
 #
 
 #a Imports
+import math
+from .prng_health import repetition_cutoff, proportion_cutoff
 from cdl.utils.csr   import Csr, CsrField, CsrFieldZero, Map, MapCsr, CsrFieldResvd
 
 #a CSRs
@@ -36,27 +38,66 @@ class WhitenessControlCsr(Csr):
                 1:   CsrField(width=1, name="continuous", brief="cont", doc="If asserted then run whiteness continuously"),
                 2:   CsrFieldResvd(width=2),
                 4:   CsrField(width=1, name="source", brief="src", doc="If asserted then monitor entropy in; else monitor PRNG"),
+                5:   CsrField(width=1, name="concurrent", brief="conc", doc="If asserted then run all the monitor types at once (if the hardware has the concurrent monitors)"),
                 16:   CsrField(width=16, name="control", brief="ctl", doc="Control register value, including type and data for whiteness monitor type"),
               }
 
+class WhitenessParametersCsr(Csr):
+    _fields = { 0:   CsrField(width=12, name="run_length", brief="rl", doc="Data (run length) for the concurrent run length monitor"),
+                12:  CsrFieldResvd(width=4),
+                16:  CsrField(width=12, name="template", brief="tmpl", doc="Data (template and divider) for the concurrent template match monitors"),
+                28:  CsrFieldResvd(width=4),
+              }
+
+class HealthConfigCsr(Csr):
+    _fields = { 0:   CsrField(width=1, name="enable", brief="en", doc="If asserted then the health tests of the source are enabled"),
+                1:   CsrField(width=1, name="gate", brief="gate", doc="If asserted then random data is gated while an alarm of the source is set"),
+                2:   CsrFieldResvd(width=6),
+                8:   CsrField(width=8, name="repetition_cutoff", brief="rct", doc="Length of a run of identical bits that fails the repetition count test; 0 to disable"),
+                16:  CsrField(width=10, name="proportion_cutoff", brief="apt", doc="Number of bits of a window of 1024 matching its first that fails the adaptive proportion test; 0 to disable"),
+                26:  CsrFieldResvd(width=6),
+              }
+
+class HealthStatusCsr(Csr):
+    _fields = { 0:   CsrField(width=1, name="entropy_repetition", brief="erct", doc="Sticky alarm of the repetition count test of entropy in; write one to clear"),
+                1:   CsrField(width=1, name="entropy_proportion", brief="eapt", doc="Sticky alarm of the adaptive proportion test of entropy in; write one to clear"),
+                2:   CsrField(width=1, name="prng_repetition", brief="prct", doc="Sticky alarm of the repetition count test of the PRNG data; write one to clear"),
+                3:   CsrField(width=1, name="prng_proportion", brief="papt", doc="Sticky alarm of the adaptive proportion test of the PRNG data; write one to clear"),
+                4:   CsrFieldZero(width=28),
+              }
+
 class PrngConfigCsr(Csr):
     _fields = { 0:   CsrField(width=1, name="enable", brief="en", doc="If asserted then PRNG is enabled; must be set for random data"),
-                1:   CsrFieldResvd(width=3),
+                1:   CsrField(width=2, name="wide", brief="wide", doc="0 for one bit every other cycle; 1 for four bits per cycle; 2 or 3 for eight bits per cycle"),
+                3:   CsrFieldResvd(width=1),
                 4:   CsrField(width=3, name="min_valid", brief="mv", doc="Minimum number of bits valid out of 4 LFSRs for valid data"),
                 7:  CsrFieldResvd(width=25),
               }
 
 class StatusCsr(Csr):
-    _fields = { 0: CsrFieldZero(width=32),
-                # locked config
-                # whiteness data ready
-                # whiteness requested
+    _fields = { 0: CsrField(width=1, name="locked", brief="lck", doc="If asserted then the configuration is locked"),
+                1: CsrField(width=1, name="data_valid", brief="dv", doc="If asserted then the random data FIFO is not empty"),
+                2: CsrField(width=1, name="whiteness_valid", brief="wv", doc="If asserted then a whiteness result is ready"),
+                3: CsrField(width=1, name="whiteness_requested", brief="wreq", doc="If asserted then the whiteness monitor has been requested and not yet acknowledged"),
+                4: CsrField(width=1, name="fifo_low", brief="low", doc="If asserted then the random data FIFO level is below the watermark"),
+                5: CsrField(width=1, name="health_alarm", brief="alm", doc="If asserted then a health test alarm is set"),
+                6: CsrField(width=1, name="data_gated", brief="gate", doc="If asserted then random data is gated (the FIFO is empty and no data is captured) because of a health test alarm"),
+                7: CsrFieldZero(width=1),
+                8: CsrField(width=8, name="fifo_level", brief="lvl", doc="Number of 32-bit words of random data in the FIFO"),
+                16: CsrFieldZero(width=16),
               }
 
 class ConfigCsr(Csr):
-    _fields = { 0: CsrFieldZero(width=32),
+    _fields = { 0: CsrField(width=1, name="locked", brief="lck", doc="If written as one then the configuration is locked until reset"),
+                1: CsrField(width=1, name="capture", brief="cap", doc="If asserted then the PRNG data is captured for reading as random data"),
+                2: CsrFieldZero(width=6),
+                8: CsrField(width=8, name="fifo_watermark", brief="wm", doc="FIFO level below which the status reports the FIFO as low"),
+                16: CsrFieldZero(width=16),
               }
 
+# Concurrent whiteness monitor N (type N/2, subtype N%2) has its result at registers 16+2N and 17+2N
+concurrent_monitors = (0, 1, 2, 4, 5, 6, 7)
+
 class PrngAddressMap(Map):
     _map = [ MapCsr(reg=0,  name="config",       brief="cfg",    csr=ConfigCsr, doc=""),
              MapCsr(reg=1,  name="status",       brief="sts",    csr=StatusCsr, doc=""),
@@ -66,4 +107,250 @@ class PrngAddressMap(Map):
              MapCsr(reg=5,  name="whiteness_run_length",  brief="wlen",   csr=WhitenessRunLengthCsr, doc="Run length of whiteness monitoring"),
              MapCsr(reg=6,  name="whiteness_data_0",  brief="wd0",   csr=WhitenessDataCsr, doc="Data from whiteness monitor"),
              MapCsr(reg=7,  name="whiteness_data_1",  brief="wd0",   csr=WhitenessDataCsr, doc="Data from whiteness monitor"),
-             ]
+             MapCsr(reg=8,  name="whiteness_parameters",  brief="wpar",   csr=WhitenessParametersCsr, doc="Parameters of the concurrent whiteness monitors"),
+             MapCsr(reg=9,  name="health_entropy_config",  brief="hent",   csr=HealthConfigCsr, doc="Configuration of the health tests of entropy in"),
+             MapCsr(reg=10, name="health_prng_config",  brief="hprng",   csr=HealthConfigCsr, doc="Configuration of the health tests of the PRNG data"),
+             MapCsr(reg=11, name="health_status",  brief="hsts",   csr=HealthStatusCsr, doc="Sticky alarms of the health tests"),
+             ] + [ MapCsr(reg=16+2*m+i,  name="whiteness_data_%d_%d"%(m,i),  brief="wd%d%d"%(m,i),   csr=WhitenessDataCsr, doc="Data from concurrent whiteness monitor %d"%m)
+                   for m in concurrent_monitors for i in range(2) ]
+
+#a Driver
+#f csr_field_offsets
+def csr_field_offsets(csr):
+    """
+    Return a dictionary of field name to bit offset of a Csr class
+    """
+    return {f.name:offset for (offset, f) in csr._fields.items() if type(f) is CsrField}
+
+#c PrngDriver
+class PrngDriver(object):
+    """
+    Firmware-style driver for apb_target_prng over an APB master
+
+    The register addresses and the CSR field offsets are looked up
+    once, and the configuration written is cached so that unchanged
+    values are not rewritten. Random data is read in bursts of the
+    words that the status reports are in the FIFO, back-to-back. When
+    the FIFO is empty, rather than waiting a fixed time, the driver
+    waits for about the time the PRNG takes to produce a word at the
+    current min_valid and then polls the status register
+    back-to-back; the wait is adjusted from the number of polls each
+    word takes, so that the reads track the real data rate of the
+    hardware.
+
+    th is the test harness (for bfm_wait); apb is an ApbMaster (with
+    read(address) and write(address, data)); prng_map is the
+    PrngAddressMap instance within the APB address map.
+    """
+    poll_limit = 100000
+    #f __init__
+    def __init__(self, th, apb, prng_map):
+        self.th = th
+        self.apb = apb
+        self.address = {}
+        for r in ("config", "status", "prng_config", "prng_data",
+                  "whiteness_control", "whiteness_run_length", "whiteness_data_0", "whiteness_data_1",
+                  "whiteness_parameters", "health_entropy_config", "health_prng_config", "health_status"):
+            self.address[r] = getattr(prng_map, r).Address()
+            pass
+        self.config_offsets    = csr_field_offsets(ConfigCsr)
+        self.status_offsets    = csr_field_offsets(StatusCsr)
+        self.prng_offsets      = csr_field_offsets(PrngConfigCsr)
+        self.whiteness_offsets = csr_field_offsets(WhitenessControlCsr)
+        self.parameters_offsets = csr_field_offsets(WhitenessParametersCsr)
+        self.health_offsets     = csr_field_offsets(HealthConfigCsr)
+        for m in concurrent_monitors:
+            for i in range(2):
+                r = "whiteness_data_%d_%d"%(m,i)
+                self.address[r] = getattr(prng_map, r).Address()
+                pass
+            pass
+        self.status_data_valid      = 1<<self.status_offsets["data_valid"]
+        self.status_whiteness_valid = 1<<self.status_offsets["whiteness_valid"]
+        self.status_fifo_low        = 1<<self.status_offsets["fifo_low"]
+        self.status_health_alarm    = 1<<self.status_offsets["health_alarm"]
+        self.status_data_gated      = 1<<self.status_offsets["data_gated"]
+        self.prng_config = None
+        self.run_length = None
+        self.parameters = None
+        self.word_wait = 0
+        self.polls = 0
+        pass
+    #f write
+    def write(self, register, data):
+        self.apb.write(address=self.address[register], data=data)
+        pass
+    #f read
+    def read(self, register):
+        return self.apb.read(address=self.address[register])
+    #f configure
+    def configure(self, min_valid, enable=1, capture=1, lock=0, watermark=0, wide=0):
+        """
+        Configure the PRNG and enable capture of its data; the
+        configuration cannot be changed after it is locked
+        """
+        self.set_min_valid(min_valid, enable, wide)
+        o = self.config_offsets
+        self.write("config", (capture<<o["capture"]) | (lock<<o["locked"]) | (watermark<<o["fifo_watermark"]))
+        pass
+    #f set_min_valid
+    def set_min_valid(self, min_valid, enable=1, wide=0):
+        """
+        Reconfigure the PRNG min_valid (and wide mode), if it has changed
+        """
+        o = self.prng_offsets
+        config = (enable<<o["enable"]) | (min_valid<<o["min_valid"]) | (wide<<o["wide"])
+        if config==self.prng_config: return
+        self.write("prng_config", config)
+        self.prng_config = config
+        # Valid data requires min_valid of the 4 LFSR bits valid, on every other cycle (or in each lane every cycle)
+        p = sum(math.comb(4,k) for k in range(min_valid,5)) / 16.0
+        bits_per_cycle = p * ((0, 4, 8, 8)[wide] or 0.5)
+        self.word_wait = int(32 / bits_per_cycle) if p>0 else 0
+        pass
+    #f wait_status
+    def wait_status(self, mask, wait):
+        """
+        Wait for about wait cycles, then poll the status until any of mask is set
+        """
+        if wait>0: self.th.bfm_wait(wait)
+        polls = 1
+        status = self.read("status")
+        while (status & mask)==0:
+            if polls>=self.poll_limit: raise Exception("Status 0x%x did not have any of 0x%x set after %d polls"%(status, mask, polls))
+            status = self.read("status")
+            polls += 1
+            pass
+        self.polls += polls
+        return (status, polls)
+    #f wait_status_clear
+    def wait_status_clear(self, mask, wait):
+        """
+        Poll the status, waiting for about wait cycles between polls, until all of mask is clear
+        """
+        polls = 1
+        status = self.read("status")
+        while (status & mask)!=0:
+            if polls>=self.poll_limit: raise Exception("Status 0x%x still had 0x%x set after %d polls"%(status, mask, polls))
+            if wait>0: self.th.bfm_wait(wait)
+            status = self.read("status")
+            polls += 1
+            pass
+        self.polls += polls
+        return status
+    #f read_random
+    def read_random(self, n):
+        """
+        Read n 32-bit words of random data; raise an exception if the
+        random data is gated by a health test alarm
+        """
+        words = []
+        level = 0
+        while len(words)<n:
+            if level==0:
+                status = self.read("status")
+                self.polls += 1
+                level = self.fifo_level(status)
+                pass
+            if level==0:
+                (status, polls) = self.wait_status(self.status_data_valid | self.status_data_gated, self.word_wait)
+                if status & self.status_data_gated:
+                    raise Exception("Random data gated by health alarms 0x%x"%self.health_alarms())
+                level = self.fifo_level(status)
+                # Converge on the wait for which the first poll usually succeeds
+                if polls>1: self.word_wait += 2*(polls-1)
+                else:       self.word_wait -= self.word_wait>>4
+                pass
+            for i in range(min(level, n-len(words))):
+                words.append(self.read("prng_data"))
+                level -= 1
+                pass
+            pass
+        return words
+    #f fifo_level
+    def fifo_level(self, status):
+        return (status>>self.status_offsets["fifo_level"]) & 0xff
+    #f wait_fifo
+    def wait_fifo(self):
+        """
+        Wait until the FIFO level is at least the watermark
+        """
+        return self.wait_status_clear(self.status_fifo_low, self.word_wait)
+    #f configure_health
+    def configure_health(self, source, entropy=1.0, enable=1, gate=1, repetition=None, proportion=None):
+        """
+        Configure the health tests of source ("entropy" or "prng"),
+        with cutoffs for the claimed entropy per bit unless given
+        """
+        if repetition is None: repetition = min(repetition_cutoff(entropy), 255)
+        if proportion is None: proportion = min(proportion_cutoff(entropy), 1023)
+        o = self.health_offsets
+        self.write("health_%s_config"%source, ((enable<<o["enable"]) | (gate<<o["gate"]) |
+                                                (repetition<<o["repetition_cutoff"]) | (proportion<<o["proportion_cutoff"])))
+        pass
+    #f health_alarms
+    def health_alarms(self):
+        """
+        Return the sticky alarms of the health tests
+        """
+        return self.read("health_status")
+    #f clear_health_alarms
+    def clear_health_alarms(self, alarms=0xf):
+        """
+        Clear the given sticky alarms of the health tests
+        """
+        self.write("health_status", alarms)
+        pass
+    #f whiteness
+    def whiteness(self, control, run_length, source=0, continuous=0):
+        """
+        Run the whiteness monitor with the 16-bit control (see
+        prng_whiteness.whiteness_control_word) for run_length; return
+        its 64-bit result
+        """
+        if run_length!=self.run_length:
+            self.write("whiteness_run_length", run_length)
+            self.run_length = run_length
+            pass
+        o = self.whiteness_offsets
+        self.write("whiteness_control", (1<<o["enable"]) | (continuous<<o["continuous"]) | (source<<o["source"]) | (control<<o["control"]))
+        self.wait_status(self.status_whiteness_valid, run_length)
+        return self.whiteness_result()
+    #f whiteness_concurrent
+    def whiteness_concurrent(self, run_length, control=0, run_length_parameter=0, template_parameter=0, source=0):
+        """
+        Run all the whiteness monitor types at once for run_length (the
+        hardware must have the concurrent monitors); control supplies
+        the run-only-valid bit and the data of the count bits and max
+        excursions monitors. Return a dictionary of the 64-bit results
+        by monitor number ({type, subtype}, see concurrent_monitors)
+        """
+        if run_length!=self.run_length:
+            self.write("whiteness_run_length", run_length)
+            self.run_length = run_length
+            pass
+        o = self.parameters_offsets
+        parameters = (run_length_parameter<<o["run_length"]) | (template_parameter<<o["template"])
+        if parameters!=self.parameters:
+            self.write("whiteness_parameters", parameters)
+            self.parameters = parameters
+            pass
+        o = self.whiteness_offsets
+        self.write("whiteness_control", (1<<o["enable"]) | (1<<o["concurrent"]) | (source<<o["source"]) | (control<<o["control"]))
+        self.wait_status(self.status_whiteness_valid, run_length)
+        results = {}
+        for m in concurrent_monitors:
+            data_0 = self.read("whiteness_data_%d_0"%m)
+            data_1 = self.read("whiteness_data_%d_1"%m)
+            results[m] = data_0 | (data_1<<32)
+            pass
+        return results
+    #f whiteness_result
+    def whiteness_result(self):
+        """
+        Read a ready whiteness result; reading the top half consumes it
+        """
+        data_0 = self.read("whiteness_data_0")
+        data_1 = self.read("whiteness_data_1")
+        return data_0 | (data_1<<32)
+    pass
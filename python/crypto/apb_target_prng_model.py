@@ -0,0 +1,519 @@
+#a Copyright
+#
+#  This file 'apb_target_prng_model.py' copyright Gavin J Stark 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#a Documentation
+"""
+A register-level software model of apb_target_prng, for testing
+drivers and application code without a simulation.
+
+PrngVirtualDevice has the read(address)/write(address, data) methods
+of an APB master and the bfm_wait(cycles) of a test harness, so it can
+be given to apb_target_prng.PrngDriver (or anything else written
+against those) in place of the simulated device:
+
+  device = PrngVirtualDevice()
+  driver = PrngDriver(device, device, device.prng_map)
+
+The registers are those of PrngAddressMap at the register numbers the
+CDL decodes from paddr (or at the addresses of a given address map),
+with fields placed by the Csr definitions. Time advances by cycles_per_access for each APB access
+and by the cycles of bfm_wait; the device is evaluated lazily when it
+is accessed, with whiteness runs from prng_whiteness.PrngWhitenessModel
+and the prng from prng_hw.PrngHwModel. The prng is run ahead in bulk
+(lookahead_cycles at a time) with the current configuration, and the
+lookahead is discarded if the configuration is changed part way
+through.
+
+The random data register accumulation (including its sbox mixing
+while the FIFO is full) and the FIFO are as the CDL, except that a
+word waiting for space is pushed as soon as a read pops the FIFO. Whiteness runs start the cycle after the
+control register is written with enable set, and their results are
+ready the cycle after the run window; this is register-level rather
+than cycle-exact, which is what the simulation is kept for. If
+concurrent_whiteness is set (as cfg_concurrent_whiteness of the CDL)
+then the concurrent monitors are modelled too, each with its own
+PrngWhitenessModel; otherwise their registers read as zero. The
+whiteness monitors see the first whiteness_lanes lanes of the prng
+wide data (the cfg_lanes of prng_whiteness_monitor, 1 by default).
+
+The health tests are prng_health.PrngHealthModel on entropy_in and
+the valid lanes of the prng wide data; an alarm that gates the random data does so from the
+second cycle after the failing bit, as in the CDL.
+
+entropy_in is zero (as it is in the simulation unless driven) unless
+an entropy function is given, which is called with a number of
+cycles and returns an array of that many entropy_in bits.
+"""
+
+#a Imports
+import copy
+import collections
+import numpy as np
+from .apb_target_prng import ConfigCsr, StatusCsr, PrngConfigCsr, WhitenessControlCsr, WhitenessParametersCsr, csr_field_offsets
+from .apb_target_prng import HealthConfigCsr, HealthStatusCsr
+from .apb_target_prng import concurrent_monitors
+from .prng_hw import PrngHwModel
+from .prng_whiteness import PrngWhitenessModel, concurrent_control_word
+from .prng_health import PrngHealthModel
+from .prng import sbox4
+
+#a Virtual device
+#c RegisterAddress
+class RegisterAddress(object):
+    """
+    The address of a register, as a MapCsr of an address map provides
+    """
+    #f __init__
+    def __init__(self, address):
+        self.address = address
+        pass
+    #f Address
+    def Address(self):
+        return self.address
+    pass
+
+#c PrngRegisterAddresses
+class PrngRegisterAddresses(object):
+    """
+    The registers of the device at their CDL register numbers, for use
+    in place of an address map
+    """
+    #f __init__
+    def __init__(self, registers):
+        for (address, name) in registers.items():
+            setattr(self, name, RegisterAddress(address))
+            pass
+        pass
+    pass
+
+#c PrngVirtualDevice
+class PrngVirtualDevice(object):
+    """
+    Software stand-in for apb_target_prng; see the module documentation
+    """
+    # Register numbers as decoded from paddr[5;0] by the CDL
+    registers = {0:"config", 1:"status", 2:"prng_config", 3:"prng_data",
+                 4:"whiteness_control", 5:"whiteness_run_length", 6:"whiteness_data_0", 7:"whiteness_data_1",
+                 8:"whiteness_parameters", 9:"health_entropy_config", 10:"health_prng_config", 11:"health_status"}
+    registers.update(dict((16+2*m+i, "whiteness_data_%d_%d"%(m,i)) for m in concurrent_monitors for i in range(2)))
+    concurrent_whiteness = 0
+    whiteness_lanes = 1
+    cycles_per_access = 3
+    fifo_depth = 16
+    lookahead_cycles = 4096
+    chunk_cycles = 1<<16
+    #f __init__
+    def __init__(self, entropy=None, prng_map=None, model=None):
+        self.entropy = entropy
+        self.decode_mask = None
+        if prng_map is None:
+            prng_map = PrngRegisterAddresses(self.registers)
+            self.decode_mask = 0x3f
+            pass
+        self.prng_map = prng_map
+        self.decode = dict((getattr(prng_map, r).Address(), r) for r in self.registers.values())
+        if model is None: model = PrngHwModel()
+        self.model = model
+        self.whiteness_model = PrngWhitenessModel(lanes=self.whiteness_lanes)
+        self.config_offsets    = csr_field_offsets(ConfigCsr)
+        self.status_offsets    = csr_field_offsets(StatusCsr)
+        self.prng_offsets      = csr_field_offsets(PrngConfigCsr)
+        self.whiteness_offsets = csr_field_offsets(WhitenessControlCsr)
+        self.parameters_offsets = csr_field_offsets(WhitenessParametersCsr)
+        self.health_offsets     = csr_field_offsets(HealthConfigCsr)
+        self.health_status_offsets = csr_field_offsets(HealthStatusCsr)
+        self.concurrent_registers = dict(("whiteness_data_%d_%d"%(m,i), (m,i)) for m in concurrent_monitors for i in range(2))
+        self.concurrent_models = dict((m, PrngWhitenessModel(lanes=self.whiteness_lanes)) for m in concurrent_monitors if m!=0)
+        self.cycle = 0
+        self.evaluated = 0
+        self.ahead = None
+        self.ahead_model = None
+        self.ahead_start = 0
+        self.ahead_used = 0
+        self.entropy_pending = np.zeros(0, dtype=np.uint8)
+        self.locked = 0
+        self.capture = 0
+        self.enable = 0
+        self.min_valid = 0
+        self.wide = 0
+        self.random_valid = 0
+        self.random_data = 0
+        self.random_counter = 0
+        self.fifo = collections.deque()
+        self.fifo_watermark = 0
+        self.whiteness_request = 0
+        self.whiteness_continuous = 0
+        self.whiteness_source = 0
+        self.whiteness_control = 0
+        self.whiteness_run_length = 0
+        self.whiteness_valid = []
+        self.whiteness_data = []
+        self.whiteness_result_valid = 0
+        self.whiteness_result = 0
+        self.whiteness_concurrent = 0
+        self.run_length_parameter = 0
+        self.template_parameter = 0
+        self.concurrent_valid  = dict((m,0) for m in self.concurrent_models)
+        self.concurrent_result = dict((m,0) for m in self.concurrent_models)
+        self.health_sources = ("entropy", "prng")
+        self.health_models = dict((h, PrngHealthModel()) for h in self.health_sources)
+        self.health_enable = dict((h, 0) for h in self.health_sources)
+        self.health_gate   = dict((h, 0) for h in self.health_sources)
+        self.health_alarms = 0
+        pass
+    #f bfm_wait
+    def bfm_wait(self, cycles):
+        """
+        Let cycles of time pass
+        """
+        self.cycle += cycles
+        pass
+    #f global_cycle
+    def global_cycle(self):
+        return self.cycle
+    #f register
+    def register(self, address):
+        """
+        Return the register name for an APB address; unmapped addresses read as zero
+        """
+        if self.decode_mask is not None: address = address & self.decode_mask
+        return self.decode.get(address)
+    #f read
+    def read(self, address):
+        """
+        Perform an APB read, returning the data
+        """
+        self.cycle += self.cycles_per_access
+        self.evaluate()
+        r = self.register(address)
+        if r=="config":
+            o = self.config_offsets
+            return (self.locked<<o["locked"]) | (self.capture<<o["capture"]) | (self.fifo_watermark<<o["fifo_watermark"])
+        if r=="status":
+            o = self.status_offsets
+            level = len(self.fifo)
+            return ((self.locked<<o["locked"]) | ((level>0)<<o["data_valid"]) |
+                    (self.whiteness_result_valid<<o["whiteness_valid"]) | (self.whiteness_request<<o["whiteness_requested"]) |
+                    ((level<self.fifo_watermark)<<o["fifo_low"]) | (level<<o["fifo_level"]) |
+                    ((self.health_alarms!=0)<<o["health_alarm"]) | (self.health_gated()<<o["data_gated"]))
+        if r=="prng_config":
+            o = self.prng_offsets
+            return (self.enable<<o["enable"]) | (self.min_valid<<o["min_valid"]) | (self.wide<<o["wide"])
+        if r=="prng_data":
+            if not self.fifo or self.health_gated(): return 0
+            data = self.fifo.popleft()
+            self.accumulate(np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=np.uint8))
+            return data
+        if r=="whiteness_control":
+            o = self.whiteness_offsets
+            return ((self.whiteness_request<<o["enable"]) | (self.whiteness_continuous<<o["continuous"]) |
+                    (self.whiteness_source<<o["source"]) | (self.whiteness_concurrent<<o["concurrent"]) |
+                    (self.whiteness_control<<o["control"]))
+        if r=="whiteness_run_length":
+            return self.whiteness_run_length
+        if r in self.concurrent_registers and self.concurrent_whiteness:
+            (m, i) = self.concurrent_registers[r]
+            if m==0: r = "whiteness_data_%d"%i
+            elif i==0:
+                return self.concurrent_result[m] & 0xffffffff
+            else:
+                data = self.concurrent_result[m] >> 32
+                self.concurrent_valid[m] = 0
+                self.concurrent_result[m] = 0
+                return data
+            pass
+        if r=="whiteness_data_0":
+            return self.whiteness_result & 0xffffffff
+        if r=="whiteness_data_1":
+            data = self.whiteness_result >> 32
+            self.whiteness_result_valid = 0
+            self.whiteness_result = 0
+            return data
+        if r=="whiteness_parameters" and self.concurrent_whiteness:
+            o = self.parameters_offsets
+            return (self.run_length_parameter<<o["run_length"]) | (self.template_parameter<<o["template"])
+        if r in ("health_entropy_config", "health_prng_config"):
+            h = r.split("_")[1]
+            o = self.health_offsets
+            return ((self.health_enable[h]<<o["enable"]) | (self.health_gate[h]<<o["gate"]) |
+                    (self.health_models[h].repetition_cutoff<<o["repetition_cutoff"]) |
+                    (self.health_models[h].proportion_cutoff<<o["proportion_cutoff"]))
+        if r=="health_status":
+            return self.health_alarms
+        return 0
+    #f write
+    def write(self, address, data):
+        """
+        Perform an APB write
+        """
+        self.cycle += self.cycles_per_access
+        self.evaluate()
+        r = self.register(address)
+        if r=="config":
+            if not self.locked:
+                o = self.config_offsets
+                self.locked  = (data>>o["locked"])&1
+                self.capture = (data>>o["capture"])&1
+                self.fifo_watermark = (data>>o["fifo_watermark"])&0xff
+                pass
+            pass
+        elif r=="prng_config":
+            if not self.locked:
+                self.discard_ahead()
+                o = self.prng_offsets
+                self.enable    = (data>>o["enable"])&1
+                self.min_valid = (data>>o["min_valid"])&7
+                self.wide      = (data>>o["wide"])&3
+                pass
+            pass
+        elif r=="whiteness_control":
+            o = self.whiteness_offsets
+            self.whiteness_request    = (data>>o["enable"])&1
+            self.whiteness_continuous = (data>>o["continuous"])&1
+            self.whiteness_source     = (data>>o["source"])&1
+            self.whiteness_concurrent = (data>>o["concurrent"])&self.concurrent_whiteness
+            self.whiteness_control    = (data>>o["control"])&0xffff
+            self.whiteness_valid = []
+            self.whiteness_data  = []
+            pass
+        elif r=="whiteness_run_length":
+            self.whiteness_run_length = data & 0xffffffff
+            pass
+        elif r in ("health_entropy_config", "health_prng_config"):
+            if not self.locked:
+                h = r.split("_")[1]
+                o = self.health_offsets
+                self.health_enable[h] = (data>>o["enable"])&1
+                self.health_gate[h]   = (data>>o["gate"])&1
+                self.health_models[h].repetition_cutoff = (data>>o["repetition_cutoff"])&0xff
+                self.health_models[h].proportion_cutoff = (data>>o["proportion_cutoff"])&0x3ff
+                if not self.health_enable[h]: self.health_models[h].reset()
+                pass
+            pass
+        elif r=="health_status":
+            self.health_alarms &= ~data & 0xf
+            pass
+        elif r=="whiteness_parameters":
+            if self.concurrent_whiteness:
+                o = self.parameters_offsets
+                self.run_length_parameter = (data>>o["run_length"])&0xfff
+                self.template_parameter   = (data>>o["template"])&0xfff
+                pass
+            pass
+        pass
+    #f evaluate
+    def evaluate(self):
+        """
+        Bring the device state up to the current cycle, consuming the
+        lookahead of the prng (running more of it as required)
+        """
+        while self.evaluated < self.cycle:
+            if self.ahead is None or self.ahead_used==len(self.ahead["entropy_in"]):
+                self.run_ahead(max(self.lookahead_cycles, min(self.cycle - self.evaluated, self.chunk_cycles)))
+                pass
+            (i, n) = (self.ahead_used, min(self.cycle - self.evaluated, len(self.ahead["entropy_in"]) - self.ahead_used))
+            (wide_valid, wide_data, entropy_in) = (self.ahead[k][i:i+n] for k in ("wide_valid", "wide_data", "entropy_in"))
+            gate_cycle = self.health_run(wide_valid, wide_data, entropy_in)
+            if self.capture:
+                (wide_valid, wide_data) = (self.ahead[k][i:i+gate_cycle] for k in ("wide_valid", "wide_data"))
+                cycles = np.flatnonzero(wide_valid)
+                self.accumulate(wide_valid[cycles], wide_data[cycles])
+                pass
+            if gate_cycle<n:
+                self.fifo.clear()
+                (self.random_valid, self.random_data, self.random_counter) = (0, 0, 31)
+                pass
+            if self.whiteness_request:
+                if self.whiteness_source: self.whiteness_run(np.ones(n, dtype=np.uint8), entropy_in)
+                else:                     self.whiteness_run(self.ahead["wide_valid"][i:i+n] & ((1<<self.whiteness_lanes)-1), self.ahead["wide_data"][i:i+n])
+                pass
+            self.ahead_used += n
+            self.evaluated += n
+            pass
+        pass
+    #f run_ahead
+    def run_ahead(self, n):
+        """
+        Run the prng for the next n cycles with the current configuration;
+        the model state before the run is kept in case the configuration
+        changes part way through
+        """
+        entropy_in = self.entropy_pending
+        if len(entropy_in)<n:
+            if self.entropy is None: more = np.zeros(n-len(entropy_in), dtype=np.uint8)
+            else:                    more = np.asarray(self.entropy(n-len(entropy_in)), dtype=np.uint8) & 1
+            entropy_in = np.concatenate([entropy_in, more])
+            pass
+        (entropy_in, self.entropy_pending) = (entropy_in[:n], entropy_in[n:])
+        self.ahead_model = copy.copy(self.model)
+        self.ahead_model.lfsrs = list(self.model.lfsrs)
+        self.ahead = self.model.run(entropy_in, *self.prng_inputs(n))
+        self.ahead["entropy_in"] = entropy_in
+        self.ahead_start = self.evaluated
+        self.ahead_used = 0
+        pass
+    #f prng_inputs
+    def prng_inputs(self, n, start=None):
+        """
+        Return the seed_request, enable, min_valid and wide inputs of the prng for n cycles
+        """
+        if start is None: start = self.evaluated
+        # seed_request is held high from the first cycle after reset
+        seed_request = np.ones(n, dtype=np.uint8)
+        if start==0 and n>0: seed_request[0] = 0
+        return (seed_request, np.full(n, self.enable, dtype=np.uint8), np.full(n, self.min_valid, dtype=np.uint8), np.full(n, self.wide, dtype=np.uint8))
+    #f discard_ahead
+    def discard_ahead(self):
+        """
+        Discard the prng lookahead beyond the current cycle, before a
+        change of its configuration
+        """
+        if self.ahead is None: return
+        used = self.ahead_used
+        entropy_in = self.ahead["entropy_in"]
+        self.entropy_pending = np.concatenate([entropy_in[used:], self.entropy_pending])
+        if used<len(entropy_in):
+            self.model = self.ahead_model
+            self.model.run(entropy_in[:used], *self.prng_inputs(used, start=self.ahead_start))
+            pass
+        self.ahead = None
+        pass
+    #f accumulate
+    def accumulate(self, wide_valid, wide_data):
+        """
+        Shift the valid bits of the prng wide data, lane 0 first, in to
+        the random data register for each cycle with any valid, pushing
+        it in to the FIFO whenever it is full and there is space
+        """
+        (valid, data, counter) = (self.random_valid, self.random_data, self.random_counter)
+        fifo = self.fifo
+        for (lanes, bits) in zip(wide_valid.tolist(), wide_data.tolist()):
+            if valid and len(fifo)<self.fifo_depth:
+                fifo.append(data)
+                (valid, data, counter) = (0, 0, 31)
+                pass
+            (next_data, n) = (data, 0)
+            for i in range(8):
+                if (lanes>>i)&1:
+                    next_data = ((next_data<<1) | ((bits>>i)&1)) & 0xffffffff
+                    n += 1
+                    pass
+                pass
+            if valid:
+                s = (((data>>31)&1)<<3) | (((data>>19)&1)<<2) | (((data>>11)&1)<<1) | ((data>>4)&1)
+                next_data ^= sbox4[s]
+                pass
+            if counter<n:
+                (valid, counter) = (1, 0)
+                pass
+            else:
+                counter -= n
+                pass
+            data = next_data
+            pass
+        if valid and len(fifo)<self.fifo_depth:
+            fifo.append(data)
+            (valid, data, counter) = (0, 0, 31)
+            pass
+        (self.random_valid, self.random_data, self.random_counter) = (valid, data, counter)
+        pass
+    #f health_gated
+    def health_gated(self):
+        """
+        Return 1 if the random data is gated by a health alarm
+        """
+        gated = (self.health_gate["entropy"] and (self.health_alarms&3)) or (self.health_gate["prng"] and (self.health_alarms&0xc))
+        return 1 if gated else 0
+    #f health_run
+    def health_run(self, wide_valid, wide_data, entropy_in):
+        """
+        Run the enabled health tests on n cycles of input (the prng
+        tests on the valid lanes of the wide data, lane 0 first),
+        setting the alarms; return the cycle (up to n) from which the
+        random data is gated
+        """
+        n = len(wide_valid)
+        gate_cycle = 0 if self.health_gated() else n
+        for (i, h) in enumerate(self.health_sources):
+            if not self.health_enable[h]: continue
+            if h=="entropy": (cycles, bits) = (np.arange(n), entropy_in)
+            else:
+                lanes = np.unpackbits(wide_valid[:,np.newaxis], axis=1, bitorder="little")
+                bits  = np.unpackbits(wide_data[:,np.newaxis],  axis=1, bitorder="little")
+                (cycles, bits) = (np.nonzero(lanes)[0], bits[lanes!=0])
+                pass
+            failures = self.health_models[h].failures(bits)
+            for (j, failed) in enumerate(failures):
+                failed_cycles = cycles[failed]
+                if len(failed_cycles)==0: continue
+                self.health_alarms |= 1<<(2*i+j)
+                # The failure is registered, then sets the alarm, which then gates the data
+                if self.health_gate[h]: gate_cycle = min(gate_cycle, int(failed_cycles[0])+2)
+                pass
+            pass
+        return gate_cycle
+    #f whiteness_ready
+    def whiteness_ready(self, valid):
+        """
+        Return the number of cycles of the run window, or None if valid does not cover it
+        """
+        if not ((self.whiteness_control>>12)&1): n = self.whiteness_run_length+1
+        elif self.whiteness_run_length==0: n = 1
+        else:
+            v = np.flatnonzero(valid)
+            if len(v)<self.whiteness_run_length: return None
+            n = int(v[self.whiteness_run_length-1])+2
+            pass
+        if len(valid)<n: return None
+        return n
+    #f whiteness_run
+    def whiteness_run(self, valid, data):
+        """
+        Add cycles of whiteness monitor input to the current run, completing
+        runs (and starting the next if continuous) as they end
+        """
+        self.whiteness_valid.append(valid)
+        self.whiteness_data.append(data)
+        valid = np.concatenate(self.whiteness_valid)
+        data  = np.concatenate(self.whiteness_data)
+        while self.whiteness_request:
+            n = self.whiteness_ready(valid)
+            if n is None: break
+            control = self.whiteness_control
+            if self.whiteness_concurrent:
+                control = concurrent_control_word(0, control)
+                for (m, model) in self.concurrent_models.items():
+                    c = concurrent_control_word(m, self.whiteness_control, self.run_length_parameter, self.template_parameter)
+                    result = model.run(c, self.whiteness_run_length, valid[:n], data[:n])
+                    if not self.concurrent_valid[m]:
+                        self.concurrent_valid[m] = 1
+                        self.concurrent_result[m] = result
+                        pass
+                    pass
+                pass
+            result = self.whiteness_model.run(control, self.whiteness_run_length, valid[:n], data[:n])
+            if not self.whiteness_result_valid:
+                self.whiteness_result_valid = 1
+                self.whiteness_result = result
+                pass
+            if not self.whiteness_continuous: self.whiteness_request = 0
+            (valid, data) = (valid[n:], data[n:])
+            pass
+        self.whiteness_valid = [valid] if self.whiteness_request else []
+        self.whiteness_data  = [data]  if self.whiteness_request else []
+        pass
+    pass
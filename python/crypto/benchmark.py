@@ -0,0 +1,191 @@
+#a Copyright
+#
+#  This file 'benchmark.py' copyright Gavin J Stark 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#a Documentation
+"""
+Benchmarks of the Python crypto models.
+
+Each benchmark times a call repeatedly until at least min_time seconds
+have elapsed, and reports the time per call in ns; entropy benchmarks
+also report lines/s (lines attempted) and bits/s (bits produced, as
+lines without enough valid bits are dropped). Results are a dictionary of
+benchmark name to measurements, which may be saved as JSON and
+compared against a saved baseline: a benchmark whose time per call
+exceeds the baseline by more than the tolerance is a regression.
+
+python -m crypto.benchmark [--quick] [--filter text]* [--output results.json] [--baseline baseline.json] [--tolerance 0.2]
+"""
+
+#a Imports
+import sys
+import json
+import time
+import platform
+import argparse
+from .prng import Prng, get_entropy, test_sbox, sbox4, sbox_rijndael
+from .prng_numpy import get_entropy_array
+
+#a Timing
+#f time_call
+def time_call(fn, min_time=0.2, min_calls=1):
+    """
+    Return (calls, seconds, output of the first call) of calling fn
+    repeatedly for at least min_time seconds
+    """
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    first = None
+    while (elapsed < min_time) or (calls < min_calls):
+        output = fn()
+        if calls==0: first = output
+        calls += 1
+        elapsed = time.perf_counter() - start
+        pass
+    return (calls, elapsed, first)
+
+#f measure
+def measure(fn, min_time=0.2, lines=None, bits=None):
+    """
+    Return a result dictionary for fn; lines and bits are the output of
+    one call, if any, and bits may be a function of the output of a call
+    """
+    (calls, elapsed, first) = time_call(fn, min_time)
+    if callable(bits): bits = bits(first)
+    r = {"calls":calls, "ns_per_call":1e9*elapsed/calls}
+    if lines is not None: r["lines_per_s"] = lines*calls/elapsed
+    if bits  is not None: r["bits_per_s"]  = bits*calls/elapsed
+    return r
+
+#a Benchmarks
+#v entropy_shapes
+entropy_shapes = ( (32, 64), (32, 128), (8, 16), (8, 64) )
+
+#f benchmarks
+def benchmarks(quick=False):
+    """
+    Return a list of (name, function returning a result) benchmarks
+    """
+    nlines = 200 if quick else 2000
+    seed = "benchmark"
+    r = []
+    def prng(min_valid):
+        p = Prng(min_valid=min_valid)
+        p.seed(seed)
+        return p
+    def add(name, fn, **kwargs):
+        r.append((name, lambda min_time: measure(fn, min_time, **kwargs)))
+        pass
+    add("prng_seed", lambda: prng(2))
+    p = prng(2)
+    add("prng_clock_1",    lambda: p.clock(1))
+    add("prng_clock_64",   lambda: p.clock(64))
+    add("prng_clock_jump_1e6", lambda: p.clock(1000000))
+    add("prng_get_value", lambda: p.get_value())
+    for min_valid in range(1,5):
+        for (bits_per_line, attempts_per_line) in entropy_shapes:
+            def fn(min_valid=min_valid, bits_per_line=bits_per_line, attempts_per_line=attempts_per_line):
+                return get_entropy(seed, min_valid=min_valid, bits_per_line=bits_per_line, attempts_per_line=attempts_per_line, nlines=nlines)
+            add("get_entropy_mv%d_%dof%d"%(min_valid, bits_per_line, attempts_per_line), fn, lines=nlines,
+                bits=lambda output, bits_per_line=bits_per_line: len(output)*bits_per_line)
+            pass
+        pass
+    for min_valid in range(1,5):
+        def fn(min_valid=min_valid):
+            return get_entropy_array(seed, min_valid=min_valid, nlines=nlines*10)
+        add("get_entropy_array_mv%d_32of64"%min_valid, fn, lines=nlines*10, bits=lambda output: len(output)*32)
+        pass
+    add("test_sbox_sbox4",    lambda: test_sbox(sbox4))
+    add("test_sbox_rijndael", lambda: test_sbox(sbox_rijndael))
+    from .kasumi import Kasumi
+    k = Kasumi.of_key(0x0123456789abcdef, 0xfedcba9876543210)
+    add("kasumi_cipher", lambda: k.cipher(0x0011223344556677), bits=64)
+    return r
+
+#f run
+def run(quick=False, filters=(), min_time=None, verbose=True):
+    """
+    Run the benchmarks whose names contain any of filters (all if none);
+    return a results dictionary
+    """
+    if min_time is None: min_time = 0.05 if quick else 0.5
+    results = {}
+    for (name, fn) in benchmarks(quick):
+        if filters and not any(f in name for f in filters): continue
+        results[name] = fn(min_time)
+        if verbose: print(format_result(name, results[name]))
+        pass
+    return {"python":platform.python_version(), "machine":platform.machine(), "quick":quick, "results":results}
+
+#f format_result
+def format_result(name, r):
+    s = "%-32s %14.1f ns/call"%(name, r["ns_per_call"])
+    if "lines_per_s" in r: s += " %12.0f lines/s"%r["lines_per_s"]
+    if "bits_per_s" in r:  s += " %14.0f bits/s"%r["bits_per_s"]
+    return s
+
+#a Baselines
+#f compare
+def compare(results, baseline, tolerance=0.2):
+    """
+    Compare two results dictionaries; return a list of (name,
+    baseline ns, current ns, ratio) for benchmarks more than tolerance
+    slower than the baseline
+    """
+    regressions = []
+    for (name, r) in results["results"].items():
+        if name not in baseline["results"]: continue
+        b = baseline["results"][name]["ns_per_call"]
+        ratio = r["ns_per_call"] / b
+        if ratio > 1+tolerance:
+            regressions.append((name, b, r["ns_per_call"], ratio))
+            pass
+        pass
+    return regressions
+
+#a Toplevel
+#f main
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m crypto.benchmark", description="Benchmarks of the crypto models")
+    parser.add_argument("--quick", action="store_true", help="Smaller workloads and shorter timing")
+    parser.add_argument("--filter", action="append", default=[], help="Run only benchmarks whose names contain this; may be repeated")
+    parser.add_argument("--min-time", type=float, default=None, help="Minimum seconds to time each benchmark")
+    parser.add_argument("--output", default=None, help="JSON file to write results to")
+    parser.add_argument("--baseline", default=None, help="JSON results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Fractional slowdown relative to the baseline that is a regression")
+    args = parser.parse_args(argv)
+    results = run(quick=args.quick, filters=args.filter, min_time=args.min_time)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+            pass
+        pass
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+            pass
+        regressions = compare(results, baseline, args.tolerance)
+        for (name, b, r, ratio) in regressions:
+            print("REGRESSION %-32s %14.1f ns/call baseline %14.1f ns/call (x%.2f)"%(name, r, b, ratio))
+            pass
+        if regressions: sys.exit(1)
+        print("No regressions against %s"%args.baseline)
+        pass
+    pass
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,380 @@
+#a Copyright
+#
+#  This file 'kasumi.py' copyright Gavin J Stark 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#a Documentation
+"""
+A table-driven model of the Kasumi cipher (3GPP TS 35.202) and its f8
+(confidentiality) and f9 (integrity) modes of use (3GPP TS 35.201), as
+implemented by the CDL in cdl/kasumi.
+
+The 128-bit key is given as k0 and k1, as in t_kasumi_input; k0 is
+the most significant 64 bits (K1 to K4 of the specification).
+
+FI is performed with two 65536-entry tables: the first half of FI
+(S9 and S7 of the input) does not depend on the key, and neither
+does the second half given the key-modified intermediate value, so
+FI(x, KI) = fi_t2[fi_t1[x] ^ KI]. A Kasumi block then costs 48 table
+lookups plus the FL logic.
+
+The round subkeys for a key are derived once per key, and f8
+keystreams once per (key, count, bearer, direction); both are held in
+bounded least-recently-used caches (Kasumi.cache and keystream_cache),
+which keep hit and miss statistics and which can be invalidated
+explicitly (see 'invalidate').
+"""
+
+#a Imports
+from collections import OrderedDict
+
+#a Types
+t_kasumi_input  = {"valid":1, "data":64, "k0":64, "k1":64}
+t_kasumi_output = {"valid":1, "data":64}
+t_kasumi_tagged_input  = {"valid":1, "tag":8, "data":64, "k0":64, "k1":64}
+t_kasumi_tagged_output = {"valid":1, "tag":8, "data":64}
+
+#a Sboxes
+#v sbox7 - from kasumi_sbox7.cdl
+sbox7 = [ 54, 50, 62, 56, 22, 34, 94, 96,  38,  6, 63, 93,  2, 18,123, 33,
+          55,113, 39,114, 21, 67, 65, 12,  47, 73, 46, 27, 25,111,124, 81,
+          53,  9,121, 79, 52, 60, 58, 48, 101,127, 40,120,104, 70, 71, 43,
+          20,122, 72, 61, 23,109, 13,100,  77,  1, 16,  7, 82, 10,105, 98,
+         117,116, 76, 11, 89,106,  0,125, 118, 99, 86, 69, 30, 57,126, 87,
+         112, 51, 17,  5, 95, 14, 90, 84,  91,  8, 35,103, 32, 97, 28, 66,
+         102, 31, 26, 45, 75,  4, 85, 92,  37, 74, 80, 49, 68, 29,115, 44,
+          64,107,108, 24,110, 83, 36, 78,  42, 19, 15, 41, 88,119, 59,  3 ]
+
+#f sbox9_fn - the logic of kasumi_sbox9.cdl
+def sbox9_fn(x):
+    (x0,x1,x2,x3,x4,x5,x6,x7,x8) = [(x>>i)&1 for i in range(9)]
+    y0 = x0&x2 ^ x3    ^ x2&x5 ^ x5&x6 ^ x0&x7 ^ x1&x7 ^ x2&x7 ^ x4&x8 ^ x5&x8 ^ x7&x8 ^ 1
+    y1 = x1    ^ x0&x1 ^ x2&x3 ^ x0&x4 ^ x1&x4 ^ x0&x5 ^ x3&x5 ^ x6    ^ x1&x7 ^ x2&x7 ^ x5&x8 ^ 1
+    y2 = x1    ^ x0&x3 ^ x3&x4 ^ x0&x5 ^ x2&x6 ^ x3&x6 ^ x5&x6 ^ x4&x7 ^ x5&x7 ^ x6&x7 ^ x8    ^ x0&x8 ^ 1
+    y3 = x0    ^ x1&x2 ^ x0&x3 ^ x2&x4 ^ x5    ^ x0&x6 ^ x1&x6 ^ x4&x7 ^ x0&x8 ^ x1&x8 ^ x7&x8
+    y4 = x0&x1 ^ x1&x3 ^ x4    ^ x0&x5 ^ x3&x6 ^ x0&x7 ^ x6&x7 ^ x1&x8 ^ x2&x8 ^ x3&x8
+    y5 = x2    ^ x1&x4 ^ x4&x5 ^ x0&x6 ^ x1&x6 ^ x3&x7 ^ x4&x7 ^ x6&x7 ^ x5&x8 ^ x6&x8 ^ x7&x8 ^ 1
+    y6 = x0    ^ x2&x3 ^ x1&x5 ^ x2&x5 ^ x4&x5 ^ x3&x6 ^ x4&x6 ^ x5&x6 ^ x7    ^ x1&x8 ^ x3&x8 ^ x5&x8 ^ x7&x8
+    y7 = x0&x1 ^ x0&x2 ^ x1&x2 ^ x3    ^ x0&x3 ^ x2&x3 ^ x4&x5 ^ x2&x6 ^ x3&x6 ^ x2&x7 ^ x5&x7 ^ x8 ^ 1
+    y8 = x0&x1 ^ x2    ^ x1&x2 ^ x3&x4 ^ x1&x5 ^ x2&x5 ^ x1&x6 ^ x4&x6 ^ x7    ^ x2&x8 ^ x3&x8
+    return sum(y<<i for (i,y) in enumerate((y0,y1,y2,y3,y4,y5,y6,y7,y8)))
+
+#v sbox9
+sbox9 = [sbox9_fn(x) for x in range(512)]
+
+#a FI tables
+_fi_tables = None
+#f fi_tables
+def fi_tables():
+    """
+    Return (fi_t1, fi_t2), built on first use
+
+    fi_t1[x] is the first half of FI (as kasumi_fi.cdl, data_1 before the key)
+    fi_t2[y] is the second half of FI, of data_1 after the key
+    """
+    global _fi_tables
+    if _fi_tables is None:
+        t1 = []
+        t2 = []
+        for x in range(65536):
+            r = sbox9[x>>7] ^ (x&0x7f)
+            l = sbox7[x&0x7f] ^ (r&0x7f)
+            t1.append((l<<9) | r)
+            r = sbox9[x&0x1ff] ^ (x>>9)
+            l = sbox7[x>>9] ^ (r&0x7f)
+            t2.append((l<<9) | r)
+            pass
+        _fi_tables = (t1, t2)
+        pass
+    return _fi_tables
+
+#f fi
+def fi(data, key):
+    (t1, t2) = fi_tables()
+    return t2[t1[data] ^ key]
+
+#a Key schedule
+#f rol16
+def rol16(v, n):
+    return ((v<<n) | (v>>(16-n))) & 0xffff
+
+#f key_schedule
+def key_schedule(k0, k1):
+    """
+    Return the eight round keys (kl1, kl2, ko1, ko2, ko3, ki1, ki2, ki3)
+    as kasumi_cipher_3.cdl derives them
+    """
+    k  = [((k0<<64 | k1) >> (112-16*i)) & 0xffff for i in range(8)]
+    kp = [((k0 ^ 0x0123456789abcdef)<<64 | (k1 ^ 0xfedcba9876543210)) >> (112-16*i) & 0xffff for i in range(8)]
+    round_keys = []
+    for r in range(8):
+        kr  = k[r:]  + k[:r]
+        kpr = kp[r:] + kp[:r]
+        round_keys.append( (rol16(kr[0],1), kpr[2], rol16(kr[1],5), rol16(kr[5],8), rol16(kr[6],13), kpr[4], kpr[3], kpr[7]) )
+        pass
+    return tuple(round_keys)
+
+#a Caches
+#c LruCache
+class LruCache(object):
+    """
+    A dictionary of at most max_size entries, discarding the least
+    recently used entry when full
+    """
+    #f __init__
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        pass
+    #f get
+    def get(self, key):
+        """
+        Return the entry for key (marking it most recently used), or None
+        """
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        return None
+    #f put
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+            pass
+        pass
+    #f resize
+    def resize(self, max_size):
+        self.max_size = max_size
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+            pass
+        pass
+    #f invalidate
+    def invalidate(self, match=None):
+        """
+        Remove all entries, or those whose key satisfies match
+        """
+        if match is None:
+            self.entries.clear()
+            return
+        for key in [k for k in self.entries if match(k)]:
+            del self.entries[key]
+            pass
+        pass
+    #f stats
+    def stats(self):
+        return {"size":len(self.entries), "max_size":self.max_size, "hits":self.hits, "misses":self.misses, "evictions":self.evictions}
+    #f reset_stats
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        pass
+    pass
+
+#a Cipher
+#c Kasumi
+class Kasumi(object):
+    """
+    Kasumi with a given key; use 'of_key' to share instances (and so
+    key schedules) per key, through the LRU cache
+    """
+    cache = LruCache(max_size=1024)
+    #f __init__
+    def __init__(self, k0, k1):
+        self.k0 = k0
+        self.k1 = k1
+        self.round_keys = key_schedule(k0, k1)
+        self.tables = fi_tables()
+        pass
+    #f of_key
+    @classmethod
+    def of_key(cls, k0, k1):
+        key = (k0, k1)
+        k = cls.cache.get(key)
+        if k is None:
+            k = cls(k0, k1)
+            cls.cache.put(key, k)
+            pass
+        return k
+    #f cipher
+    def cipher(self, data):
+        """
+        Encrypt a 64-bit block
+        """
+        (t1, t2) = self.tables
+        l = data >> 32
+        r = data & 0xffffffff
+        odd = True
+        for (kl1, kl2, ko1, ko2, ko3, ki1, ki2, ki3) in self.round_keys:
+            x = l
+            if odd:
+                # FL
+                xl = x>>16
+                xr = (x&0xffff) ^ rol16(xl & kl1, 1)
+                xl ^= rol16(xr | kl2, 1)
+                x = (xl<<16) | xr
+                pass
+            # FO
+            xl = x>>16
+            xr = x&0xffff
+            (xl, xr) = (xr, t2[t1[xl^ko1]^ki1] ^ xr)
+            (xl, xr) = (xr, t2[t1[xl^ko2]^ki2] ^ xr)
+            (xl, xr) = (xr, t2[t1[xl^ko3]^ki3] ^ xr)
+            if not odd:
+                # FL
+                xr ^= rol16(xl & kl1, 1)
+                xl ^= rol16(xr | kl2, 1)
+                pass
+            (l, r) = (r ^ ((xl<<16) | xr), l)
+            odd = not odd
+            pass
+        return (l<<32) | r
+    pass
+
+#f kasumi_cipher
+def kasumi_cipher(data, k0, k1):
+    """
+    Kasumi encryption of data as kasumi_cipher_3 given a t_kasumi_input
+    """
+    return Kasumi.of_key(k0, k1).cipher(data)
+
+#a Modes of use
+f8_key_modifier = 0x5555555555555555
+f9_key_modifier = 0xaaaaaaaaaaaaaaaa
+
+keystream_cache = LruCache(max_size=256)
+keystream_cache_max_blocks = 4096
+
+#f cipher_stream
+def cipher_stream(k0, k1, v, nblocks, ks=0, start=0):
+    """
+    Return nblocks of keystream KS[n] = cipher(v ^ n ^ KS[n-1]) for n
+    from start, given KS[start-1] = ks (kasumi_op_cipher_stream)
+    """
+    k = Kasumi.of_key(k0, k1)
+    r = []
+    for n in range(start, start+nblocks):
+        ks = k.cipher(v ^ n ^ ks)
+        r.append(ks)
+        pass
+    return r
+
+#f f8_iv
+def f8_iv(count, bearer, direction):
+    """
+    The 64-bit input to f8: count || bearer || direction || 26 zero bits
+    """
+    return ((count&0xffffffff)<<32) | ((bearer&0x1f)<<27) | ((direction&1)<<26)
+
+#f f8_keystream
+def f8_keystream(k0, k1, count, bearer, direction, nblocks):
+    """
+    Return nblocks 64-bit blocks of f8 keystream
+
+    The keystream is cached per (key, iv), up to
+    keystream_cache_max_blocks blocks; a longer request extends the
+    cached keystream from its last block
+    """
+    iv = f8_iv(count, bearer, direction)
+    key = (k0, k1, iv)
+    entry = keystream_cache.get(key)
+    if entry is None:
+        a = kasumi_cipher(iv, k0 ^ f8_key_modifier, k1 ^ f8_key_modifier)
+        entry = (a, [])
+        pass
+    (a, ks) = entry
+    if len(ks) < nblocks:
+        ks = ks + cipher_stream(k0, k1, a, nblocks-len(ks), ks=ks[-1] if ks else 0, start=len(ks))
+        pass
+    keystream_cache.put(key, (a, ks[:keystream_cache_max_blocks]))
+    return ks[:nblocks]
+
+#f f8
+def f8(k0, k1, count, bearer, direction, data, length):
+    """
+    Encrypt (or decrypt) length bits of data (bytes, first bit most
+    significant); bits of the last byte beyond length are zero
+    """
+    nbytes = (length+7)//8
+    nblocks = (length+63)//64
+    ks = b"".join(b.to_bytes(8,"big") for b in f8_keystream(k0, k1, count, bearer, direction, nblocks))
+    r = bytearray(a^b for (a,b) in zip(data[:nbytes], ks))
+    if length%8: r[-1] &= (0xff00 >> (length%8)) & 0xff
+    return bytes(r)
+
+#f f9
+def f9(k0, k1, count, fresh, direction, message, length):
+    """
+    Return the 32-bit MAC-I of length bits of message (bytes, first
+    bit most significant)
+    """
+    nbits = 64 + length + 2
+    v = ((count&0xffffffff)<<32) | (fresh&0xffffffff)
+    v = (v<<length) | (int.from_bytes(message[:(length+7)//8], "big") >> ((-length)%8))
+    v = (v<<2) | ((direction&1)<<1) | 1
+    padding = (-nbits)%64
+    v <<= padding
+    nblocks = (nbits+padding)//64
+    k = Kasumi.of_key(k0, k1)
+    a = 0
+    b = 0
+    for i in range(nblocks):
+        a = k.cipher(a ^ ((v>>(64*(nblocks-1-i))) & 0xffffffffffffffff))
+        b ^= a
+        pass
+    return kasumi_cipher(b, k0 ^ f9_key_modifier, k1 ^ f9_key_modifier) >> 32
+
+#a Cache control
+#f invalidate
+def invalidate(k0=None, k1=None):
+    """
+    Invalidate the cached key schedules and keystreams of a key (including
+    the modified keys used by f8 and f9), or of all keys if none is given
+    """
+    if k0 is None:
+        Kasumi.cache.invalidate()
+        keystream_cache.invalidate()
+        return
+    keys = [(k0^m, k1^m) for m in (0, f8_key_modifier, f9_key_modifier)]
+    Kasumi.cache.invalidate(lambda k:k in keys)
+    keystream_cache.invalidate(lambda k:(k[0],k[1])==(k0,k1))
+    pass
+
+#f cache_stats
+def cache_stats():
+    """
+    Return the statistics of the key schedule and keystream caches
+    """
+    return {"key_schedule":Kasumi.cache.stats(), "keystream":keystream_cache.stats()}
+
+#f set_cache_sizes
+def set_cache_sizes(key_schedules=None, keystreams=None, keystream_blocks=None):
+    global keystream_cache_max_blocks
+    if key_schedules is not None: Kasumi.cache.resize(key_schedules)
+    if keystreams is not None: keystream_cache.resize(keystreams)
+    if keystream_blocks is not None:
+        keystream_cache_max_blocks = keystream_blocks
+        keystream_cache.invalidate()
+        pass
+    pass
@@ -0,0 +1,346 @@
+#a Copyright
+#
+#  This file 'kasumi_accelerator.py' copyright Gavin J Stark 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#a Documentation
+"""
+Transaction-level model of the kasumi_accelerator CDL module, which
+runs the f8 and f9 modes of use of Kasumi for up to num_streams
+independent streams through a single Kasumi cipher.
+
+Requests are t_kasumi_acceleration_request words; the stream is
+selected by the bottom bits of the tag. An operation is a header word
+(op, tag, length in bits, and 64 bits of data) followed, for the
+operations that take data, by (length+63)//64 data words for the same
+tag, most significant bit first; bits of the last word beyond the
+length are ignored. The header data is:
+
+  shift_key          the next 64 bits of key (shifted in to k1, k1 to k0)
+  set_auth_data      count || fresh for the f9 of the f8_f9 operations
+  cipher_stream      V, the initial value of the keystream (no data words)
+  f8_cipher          count || bearer || direction || 26b0
+  f9_mac_0/1         count || fresh
+  f8_f9_*            count || bearer || direction || 26b0 for the f8
+  f9                 ignored; the data words are the padded f9 message
+
+The responses (t_kasumi_acceleration_response) for an operation are
+the keystream or ciphered data words, followed for operations with an
+f9 by the 32-bit MAC-I in the top of a final word; the last response
+word of an operation has 'last' set. shift_key and set_auth_data have
+no response.
+
+Each stream has at most one cipher operation in progress, which is
+issued by the stream state machine (see KasumiStream) - this model
+processes the streams in round-robin order, one cipher operation at a
+time, which is also what the hardware does; the responses for a tag
+are the same for any interleaving.
+"""
+
+#a Imports
+from .kasumi import Kasumi, f8_key_modifier, f9_key_modifier
+
+#a Types
+t_kasumi_acceleration_request  = {"valid":1, "op":4, "tag":4, "length":16, "data":64}
+t_kasumi_acceleration_response = {"valid":1, "tag":4, "last":1, "data":64}
+
+#v Operations - as t_kasumi_op
+kasumi_op_shift_key        = 0
+kasumi_op_set_auth_data    = 1
+kasumi_op_cipher_stream    = 2
+kasumi_op_f8_cipher        = 3
+kasumi_op_f9_mac_0         = 4
+kasumi_op_f9_mac_1         = 5
+kasumi_op_f8_f9_encrypt_0  = 6
+kasumi_op_f8_f9_encrypt_1  = 7
+kasumi_op_f8_f9_decrypt_0  = 8
+kasumi_op_f8_f9_decrypt_1  = 9
+kasumi_op_f9               = 10
+
+#v Operation properties
+op_has_f8     = (kasumi_op_cipher_stream, kasumi_op_f8_cipher, kasumi_op_f8_f9_encrypt_0, kasumi_op_f8_f9_encrypt_1, kasumi_op_f8_f9_decrypt_0, kasumi_op_f8_f9_decrypt_1)
+op_has_f8_iv  = (kasumi_op_f8_cipher, kasumi_op_f8_f9_encrypt_0, kasumi_op_f8_f9_encrypt_1, kasumi_op_f8_f9_decrypt_0, kasumi_op_f8_f9_decrypt_1)
+op_has_f9     = (kasumi_op_f9_mac_0, kasumi_op_f9_mac_1, kasumi_op_f8_f9_encrypt_0, kasumi_op_f8_f9_encrypt_1, kasumi_op_f8_f9_decrypt_0, kasumi_op_f8_f9_decrypt_1, kasumi_op_f9)
+op_f9_padded  = (kasumi_op_f9_mac_0, kasumi_op_f9_mac_1, kasumi_op_f8_f9_encrypt_0, kasumi_op_f8_f9_encrypt_1, kasumi_op_f8_f9_decrypt_0, kasumi_op_f8_f9_decrypt_1)
+op_f9_first   = (kasumi_op_f8_f9_decrypt_0, kasumi_op_f8_f9_decrypt_1)
+op_direction  = (kasumi_op_f9_mac_1, kasumi_op_f8_f9_encrypt_1, kasumi_op_f8_f9_decrypt_1)
+
+all_ones = 0xffffffffffffffff
+
+#a Functions
+#f data_mask
+def data_mask(bits):
+    """
+    Mask of the valid bits of a data word with bits (1 to 64 or more) remaining
+    """
+    if bits>=64: return all_ones
+    return all_ones ^ ((1<<(64-bits))-1)
+
+#f operation_requests
+def operation_requests(op, tag, length=0, data=0, words=()):
+    """
+    Return the list of (op, tag, length, data) request words for an operation
+    """
+    return [(op, tag, length, data)] + [(op, tag, length, w) for w in words]
+
+#f words_of_bytes
+def words_of_bytes(data, length):
+    """
+    Return the 64-bit data words of length bits of data (bytes, first
+    bit most significant)
+    """
+    nwords = (length+63)//64
+    data = bytes(data[:(length+7)//8]) + bytes(8*nwords)
+    return [int.from_bytes(data[8*i:8*i+8], "big") for i in range(nwords)]
+
+#a Classes
+#c KasumiStream
+class KasumiStream(object):
+    """
+    The state machine of one stream of the accelerator
+
+    phase is one of:
+
+      idle    waiting for an operation header
+      f8_iv   needs A = cipher(IV) with the f8 modified key
+      f9_init needs A = cipher(count||fresh)
+      data    for each data word, needs the keystream block (f8) and
+              the next f9 A (f9); the f9 uses the data word after the
+              f8 for encryption, and before it for decryption
+      tail    needs the next f9 A for the block holding direction||1
+      mac     needs cipher(B) with the f9 modified key
+    """
+    #f __init__
+    def __init__(self):
+        self.k0 = 0
+        self.k1 = 0
+        self.auth_f9 = 0
+        self.op = 0
+        self.tag = 0
+        self.phase = "idle"
+        self.bits_remaining = 0
+        self.block = 0
+        self.data_valid = False
+        self.data = 0
+        self.f8_done = False
+        self.f9_done = False
+        self.f8_a = 0
+        self.ks = 0
+        self.f9_a = 0
+        self.f9_b = 0
+        self.busy = False
+        self.responses = []
+        pass
+    #f takes_request
+    def takes_request(self):
+        """
+        Return True if the stream can take a request word
+        """
+        if self.phase=="idle": return True
+        if self.phase not in ("f8_iv", "f9_init", "data"): return False
+        return (self.op!=kasumi_op_cipher_stream) and (self.bits_remaining!=0) and not self.data_valid
+    #f request
+    def request(self, op, tag, length, data):
+        """
+        Take a request word - a header if idle, else the next data word
+        """
+        if self.phase!="idle":
+            self.data = data & data_mask(self.bits_remaining)
+            self.data_valid = True
+            return
+        if op==kasumi_op_shift_key:
+            (self.k0, self.k1) = (self.k1, data)
+            return
+        if op==kasumi_op_set_auth_data:
+            self.auth_f9 = data
+            return
+        (self.op, self.tag, self.bits_remaining, self.block) = (op, tag, length, 0)
+        (self.data_valid, self.data, self.f8_done, self.f9_done) = (False, 0, False, False)
+        (self.f8_a, self.ks) = (data, 0)
+        self.f9_a = data
+        if op in op_has_f8: self.f9_a = self.auth_f9
+        if op==kasumi_op_f9: self.f9_a = 0
+        self.f9_b = 0
+        self.phase = "data"
+        if op in op_f9_padded: self.phase = "f9_init"
+        if op in op_has_f8_iv: self.phase = "f8_iv"
+        pass
+    #f f9_block
+    def f9_block(self):
+        """
+        The f9 block of the current data word, with direction||1 appended if they fit
+        """
+        block = self.data
+        if self.op in op_f9_padded:
+            r = self.bits_remaining
+            d = 1 if self.op in op_direction else 0
+            if r<=63: block |= d<<(63-r)
+            if r<=62: block |= 1<<(62-r)
+            pass
+        return block
+    #f cipher_request
+    def cipher_request(self):
+        """
+        Return the cipher operation (kind, data, key modifier) the stream
+        needs next, or None
+        """
+        if self.busy: return None
+        if self.phase=="f8_iv":   return ("f8_iv", self.f8_a, f8_key_modifier)
+        if self.phase=="f9_init": return ("f9", self.f9_a, 0)
+        if self.phase=="tail":    return ("f9", self.f9_a ^ self.data, 0)
+        if self.phase=="mac":     return ("mac", self.f9_b, f9_key_modifier)
+        if self.phase!="data": return None
+        if not self.data_valid and self.op!=kasumi_op_cipher_stream: return None
+        has_f8 = self.op in op_has_f8
+        has_f9 = self.op in op_has_f9
+        f9_first = self.op in op_f9_first
+        if has_f8 and not self.f8_done and not (f9_first and not self.f9_done):
+            return ("ks", self.f8_a ^ self.block ^ self.ks, 0)
+        if has_f9 and not self.f9_done:
+            return ("f9", self.f9_a ^ self.f9_block(), 0)
+        return None
+    #f respond
+    def respond(self, data, last):
+        self.responses.append((self.tag, last, data))
+        pass
+    #f cipher_result
+    def cipher_result(self, kind, result):
+        """
+        Handle the result of the stream's cipher operation
+        """
+        self.busy = False
+        if kind=="f8_iv":
+            self.f8_a = result
+            self.phase = "f9_init" if self.op in op_f9_padded else "data"
+            pass
+        elif kind=="mac":
+            self.respond((result>>32)<<32, True)
+            self.phase = "idle"
+            pass
+        elif kind=="ks":
+            self.ks = result
+            self.data = (self.data ^ result) & data_mask(self.bits_remaining)
+            self.respond(self.data, (self.bits_remaining<=64) and (self.op not in op_has_f9))
+            self.f8_done = True
+            pass
+        elif self.phase=="f9_init":
+            (self.f9_a, self.f9_b) = (result, self.f9_b ^ result)
+            self.phase = "data"
+            pass
+        elif self.phase=="tail":
+            (self.f9_a, self.f9_b) = (result, self.f9_b ^ result)
+            self.phase = "mac"
+            pass
+        else:
+            (self.f9_a, self.f9_b) = (result, self.f9_b ^ result)
+            self.f9_done = True
+            pass
+        self.word_complete()
+        pass
+    #f word_complete
+    def word_complete(self):
+        """
+        Move on to the next data word (or the tail, mac or idle) once the current one is done
+        """
+        if self.phase!="data": return
+        if self.bits_remaining!=0:
+            if (self.op in op_has_f8) and not self.f8_done: return
+            if (self.op in op_has_f9) and not self.f9_done: return
+            r = self.bits_remaining
+            self.bits_remaining = max(r-64, 0)
+            self.block += 1
+            (self.data_valid, self.data, self.f8_done, self.f9_done) = (False, 0, False, False)
+            if self.bits_remaining!=0: return
+            pass
+        else:
+            r = 64
+            pass
+        self.phase = "idle"
+        if self.op in op_has_f9: self.phase = "mac"
+        if (self.op in op_f9_padded) and (r>=63):
+            d = 1 if self.op in op_direction else 0
+            self.data = (1<<63) if r==63 else ((d<<63) | (1<<62))
+            self.phase = "tail"
+            pass
+        pass
+    pass
+
+#c KasumiAcceleratorModel
+class KasumiAcceleratorModel(object):
+    """
+    Model of the kasumi_accelerator; requests are given with 'request',
+    and 'run' performs all the cipher operations that are possible,
+    returning the responses
+    """
+    #f __init__
+    def __init__(self, num_streams=4):
+        self.num_streams = num_streams
+        self.streams = [KasumiStream() for i in range(num_streams)]
+        self.next_stream = 0
+        self.cipher_operations = 0
+        pass
+    #f stream
+    def stream(self, tag):
+        return self.streams[tag % self.num_streams]
+    #f request
+    def request(self, op, tag, length=0, data=0):
+        """
+        Present a request word; return False if the stream cannot take it (yet)
+        """
+        s = self.stream(tag)
+        if not s.takes_request(): return False
+        s.request(op, tag, length, data)
+        s.word_complete()
+        return True
+    #f step
+    def step(self):
+        """
+        Perform one cipher operation for the next stream (round-robin)
+        that needs one; return False if none does
+        """
+        for i in range(self.num_streams):
+            n = (self.next_stream+i) % self.num_streams
+            s = self.streams[n]
+            c = s.cipher_request()
+            if c is None: continue
+            (kind, data, modifier) = c
+            result = Kasumi.of_key(s.k0^modifier, s.k1^modifier).cipher(data)
+            s.cipher_result(kind, result)
+            self.next_stream = (n+1) % self.num_streams
+            self.cipher_operations += 1
+            return True
+        return False
+    #f run
+    def run(self, requests):
+        """
+        Present a list of (op, tag, length, data) request words in order,
+        performing cipher operations whenever the next word cannot be
+        taken, and return the list of (tag, last, data) responses
+        """
+        requests = list(requests)
+        while True:
+            while requests and self.request(*requests[0]):
+                requests.pop(0)
+                pass
+            if self.step(): continue
+            if requests: raise Exception("Kasumi accelerator cannot take request %s"%str(requests[0]))
+            break
+        responses = []
+        for s in self.streams:
+            responses += s.responses
+            s.responses = []
+            pass
+        return responses
+    pass
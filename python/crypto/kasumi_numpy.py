@@ -0,0 +1,204 @@
+#a Copyright
+#
+#  This file 'kasumi_numpy.py' copyright Gavin J Stark 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#a Documentation
+"""
+NumPy versions of the Kasumi model of kasumi.py, for many independent
+streams at once.
+
+A single f8 keystream (or f9 MAC chain) is serial, as each block
+depends on the last; but independent streams (different keys, counts,
+bearers) are not. KasumiBatch holds one key per stream, and ciphers
+one block of every stream at a time, with each FL, FO and FI step
+performed as an array operation across all the streams; FI uses the
+same pair of 16-bit tables as kasumi.py.
+
+The results are identical to the functions of kasumi.py.
+"""
+
+#a Imports
+import numpy as np
+from .kasumi import fi_tables, f8_iv, f8_key_modifier, f9_key_modifier
+
+#a Support
+#f as_uint64
+def as_uint64(values, n):
+    """
+    Return values (an integer, or a sequence of n integers) as a uint64 array of length n
+    """
+    return np.broadcast_to(np.array(values, dtype=np.uint64), (n,)).copy()
+
+#f rol16
+def rol16(v, n):
+    return ((v<<n) | (v>>(16-n))) & 0xffff
+
+#a Batch cipher
+#c KasumiBatch
+class KasumiBatch(object):
+    """
+    Kasumi with a key per stream; keys are given as k0 and k1 arrays
+    (or sequences of integers) of the same length
+    """
+    _tables = None
+    #f __init__
+    def __init__(self, k0, k1):
+        k0 = np.asarray(np.array(k0, dtype=np.uint64)).reshape(-1)
+        k1 = as_uint64(k1, len(k0))
+        self.n = len(k0)
+        self.round_keys = self.key_schedule(k0, k1)
+        if KasumiBatch._tables is None:
+            (t1, t2) = fi_tables()
+            KasumiBatch._tables = (np.array(t1, dtype=np.uint32), np.array(t2, dtype=np.uint32))
+            pass
+        self.tables = KasumiBatch._tables
+        pass
+    #f key_schedule
+    @staticmethod
+    def key_schedule(k0, k1):
+        """
+        Return a list of eight round keys, each a tuple of eight
+        (kl1, kl2, ko1, ko2, ko3, ki1, ki2, ki3) uint32 arrays, as kasumi.key_schedule
+        """
+        def words(a, b):
+            return [((a >> np.uint64(48-16*i)) & np.uint64(0xffff)).astype(np.uint32) for i in range(4)] + \
+                   [((b >> np.uint64(48-16*i)) & np.uint64(0xffff)).astype(np.uint32) for i in range(4)]
+        k  = words(k0, k1)
+        kp = words(k0 ^ np.uint64(0x0123456789abcdef), k1 ^ np.uint64(0xfedcba9876543210))
+        round_keys = []
+        for r in range(8):
+            kr  = k[r:]  + k[:r]
+            kpr = kp[r:] + kp[:r]
+            round_keys.append( (rol16(kr[0],1), kpr[2], rol16(kr[1],5), rol16(kr[5],8), rol16(kr[6],13), kpr[4], kpr[3], kpr[7]) )
+            pass
+        return round_keys
+    #f cipher
+    def cipher(self, data):
+        """
+        Encrypt one 64-bit block per stream, given a uint64 array (or integer)
+        """
+        (t1, t2) = self.tables
+        data = as_uint64(data, self.n)
+        l = (data >> np.uint64(32)).astype(np.uint32)
+        r = (data & np.uint64(0xffffffff)).astype(np.uint32)
+        odd = True
+        for (kl1, kl2, ko1, ko2, ko3, ki1, ki2, ki3) in self.round_keys:
+            xl = l >> 16
+            xr = l & 0xffff
+            if odd:
+                # FL
+                xr = xr ^ rol16(xl & kl1, 1)
+                xl = xl ^ rol16(xr | kl2, 1)
+                pass
+            # FO
+            (xl, xr) = (xr, t2[t1[xl^ko1]^ki1] ^ xr)
+            (xl, xr) = (xr, t2[t1[xl^ko2]^ki2] ^ xr)
+            (xl, xr) = (xr, t2[t1[xl^ko3]^ki3] ^ xr)
+            if not odd:
+                # FL
+                xr = xr ^ rol16(xl & kl1, 1)
+                xl = xl ^ rol16(xr | kl2, 1)
+                pass
+            (l, r) = (r ^ ((xl<<16) | xr), l)
+            odd = not odd
+            pass
+        return (l.astype(np.uint64) << np.uint64(32)) | r.astype(np.uint64)
+    pass
+
+#a Modes of use
+#f f8_keystream_batch
+def f8_keystream_batch(k0, k1, count, bearer, direction, nblocks):
+    """
+    Return an (nstreams x nblocks) uint64 array of f8 keystream; k0 and
+    k1 give the number of streams, and count, bearer and direction may
+    be an integer for all streams or a sequence of one per stream
+    """
+    kasumi = KasumiBatch(k0, k1)
+    n = kasumi.n
+    km = np.uint64(f8_key_modifier)
+    iv = np.array([f8_iv(c, b, d) for (c,b,d) in zip(as_uint64(count,n).tolist(), as_uint64(bearer,n).tolist(), as_uint64(direction,n).tolist())], dtype=np.uint64)
+    a = KasumiBatch(as_uint64(k0,n) ^ km, as_uint64(k1,n) ^ km).cipher(iv)
+    ks = np.zeros((n, nblocks), dtype=np.uint64)
+    last = np.zeros(n, dtype=np.uint64)
+    for i in range(nblocks):
+        last = kasumi.cipher(a ^ np.uint64(i) ^ last)
+        ks[:, i] = last
+        pass
+    return ks
+
+#f f8_batch
+def f8_batch(k0, k1, count, bearer, direction, data, length):
+    """
+    Encrypt (or decrypt) a list of byte strings, one per stream, each
+    of length bits (an integer or sequence of one per stream), as kasumi.f8
+    """
+    n = len(data)
+    length = as_uint64(length, n).tolist()
+    nblocks = max([(l+63)//64 for l in length] + [0])
+    ks = f8_keystream_batch(as_uint64(k0,n), k1, count, bearer, direction, nblocks)
+    ks = ks.astype(">u8").view(np.uint8).reshape(n, nblocks*8)
+    r = []
+    for (i, (d, l)) in enumerate(zip(data, length)):
+        nbytes = (l+7)//8
+        b = np.frombuffer(bytes(d[:nbytes]), dtype=np.uint8) ^ ks[i, :nbytes]
+        if l%8: b[-1] &= (0xff00 >> (l%8)) & 0xff
+        r.append(b.tobytes())
+        pass
+    return r
+
+#f f9_batch
+def f9_batch(k0, k1, count, fresh, direction, message, length):
+    """
+    Return a uint32 array of the MAC-I of each of a list of messages
+    (byte strings, one per stream) of length bits (an integer or
+    sequence of one per stream), as kasumi.f9
+
+    Streams with fewer blocks than the longest hold their chain values
+    once their blocks are exhausted.
+    """
+    n = len(message)
+    k0 = as_uint64(k0, n)
+    k1 = as_uint64(k1, n)
+    count     = as_uint64(count, n).tolist()
+    fresh     = as_uint64(fresh, n).tolist()
+    direction = as_uint64(direction, n).tolist()
+    length    = as_uint64(length, n).tolist()
+    streams = []
+    for i in range(n):
+        l = length[i]
+        nbits = 64 + l + 2
+        v = (count[i]<<32) | fresh[i]
+        v = (v<<l) | (int.from_bytes(message[i][:(l+7)//8], "big") >> ((-l)%8))
+        v = (v<<2) | ((direction[i]&1)<<1) | 1
+        padding = (-nbits)%64
+        streams.append((v<<padding, (nbits+padding)//64))
+        pass
+    nblocks = max([s[1] for s in streams] + [0])
+    blocks = np.zeros((n, nblocks), dtype=np.uint64)
+    for (i, (v, nb)) in enumerate(streams):
+        blocks[i, :nb] = [(v>>(64*(nb-1-j))) & 0xffffffffffffffff for j in range(nb)]
+        pass
+    nb = np.array([s[1] for s in streams], dtype=np.int64)
+    kasumi = KasumiBatch(k0, k1)
+    a = np.zeros(n, dtype=np.uint64)
+    b = np.zeros(n, dtype=np.uint64)
+    for j in range(nblocks):
+        active = nb > j
+        a = np.where(active, kasumi.cipher(a ^ blocks[:, j]), a)
+        b = np.where(active, b ^ a, b)
+        pass
+    km = np.uint64(f9_key_modifier)
+    return (KasumiBatch(k0 ^ km, k1 ^ km).cipher(b) >> np.uint64(32)).astype(np.uint32)
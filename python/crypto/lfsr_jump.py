@@ -0,0 +1,210 @@
+#a Copyright
+#
+#  This file 'lfsr_jump.py' copyright Gavin J Stark 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#a Documentation
+"""
+Jump-ahead support for LFSRs.
+
+An LFSR is a linear map over GF(2) from its state to its next state;
+clocking it N times is applying the transition matrix M to the power
+N. The matrix is derived by clocking each basis vector once, so it
+matches whatever stepping the LFSR implementation actually does.
+
+Powers M^(2^k) are cached per LFSR description, so that advancing by N
+steps costs one matrix-vector product per set bit of N - O(log N)
+rather than O(N).
+
+Matrix-vector products are table driven: the state is split into
+bytes, and each byte indexes a 256-entry table of the XOR of the
+matrix columns it selects.
+"""
+
+#a Classes
+#c Gf2Map
+class Gf2Map(object):
+    """
+    A linear map over GF(2) from an n-bit value, given as the image of
+    each basis vector (the columns of the matrix); applying it uses one
+    table lookup per byte of the input.
+    """
+    #f __init__
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.tables = []
+        for i in range(0, len(self.columns), 8):
+            cols = self.columns[i:i+8]
+            table = [0]
+            for c in cols:
+                table = table + [t ^ c for t in table]
+                pass
+            self.tables.append(table)
+            pass
+        pass
+    #f __call__
+    def __call__(self, v):
+        r = 0
+        for t in self.tables:
+            r ^= t[v & 0xff]
+            v >>= 8
+            pass
+        return r
+    #f compose
+    def compose(self, other):
+        """
+        Return the map (self . other), i.e. apply other first
+        """
+        return Gf2Map([self(c) for c in other.columns])
+    pass
+
+#c LfsrJump
+class LfsrJump(object):
+    """
+    Transition matrix of an LFSR with a cache of its powers M^(2^k).
+
+    Instances are shared through 'of_lfsr' and 'of_galois', keyed on the
+    LFSR description, so the power tables are built once per polynomial.
+    """
+    _cache = {}
+    #f __init__
+    def __init__(self, nbits, step):
+        self.nbits = nbits
+        self.powers = [Gf2Map([step(1<<i) for i in range(nbits)])]
+        pass
+    #f of_lfsr
+    @classmethod
+    def of_lfsr(cls, lfsr_class, nbits, poly):
+        """
+        Jump table for an LFSR of lfsr_class (such as utils.lfsr.Lfsr)
+        with nbits and poly, derived by clocking a scratch instance
+        """
+        key = (lfsr_class, nbits, poly)
+        if key not in cls._cache:
+            l = lfsr_class(nbits=nbits, poly=poly)
+            def step(v):
+                l.set(v)
+                l.clk_once()
+                return l.get()
+            cls._cache[key] = cls(nbits, step)
+            pass
+        return cls._cache[key]
+    #f of_galois
+    @classmethod
+    def of_galois(cls, nbits, feedback):
+        """
+        Jump table for a Galois LFSR as used in the CDL: shift left,
+        and if the top bit was set then XOR in the feedback
+        """
+        key = ("galois", nbits, feedback)
+        if key not in cls._cache:
+            mask = (1<<nbits)-1
+            top = nbits-1
+            def step(v):
+                n = (v<<1) & mask
+                if (v>>top)&1: n ^= feedback
+                return n
+            cls._cache[key] = cls(nbits, step)
+            pass
+        return cls._cache[key]
+    #f power
+    def power(self, k):
+        """
+        Map for M^(2^k)
+        """
+        while len(self.powers)<=k:
+            m = self.powers[-1]
+            self.powers.append(m.compose(m))
+            pass
+        return self.powers[k]
+    #f map
+    def map(self, n):
+        """
+        Map for M^n - worth building if a state is to be advanced by
+        the same n many times
+        """
+        r = None
+        k = 0
+        while n>0:
+            if n&1:
+                p = self.power(k)
+                r = p if r is None else p.compose(r)
+                pass
+            n >>= 1
+            k += 1
+            pass
+        if r is None: r = Gf2Map([1<<i for i in range(self.nbits)])
+        return r
+    #f advance
+    def advance(self, v, n):
+        """
+        Return the state v advanced by n steps
+        """
+        k = 0
+        while n>0:
+            if n&1: v = self.power(k)(v)
+            n >>= 1
+            k += 1
+            pass
+        return v
+    pass
+
+#c LfsrSampler
+class LfsrSampler(Gf2Map):
+    """
+    Linear map from an LFSR state to a word of sampled state bits;
+    bit s of the word is bit points[s][1] of the state after
+    points[s][0] steps.
+
+    Sampled bits are linear in the state, so the word for a state is
+    the XOR of the words for its basis vectors; these are found by
+    stepping the rows of M^t (row_b(M^(t+1)) = row_b(M^t).M), which
+    needs one map application per step for each sampled bit.
+    """
+    #f __init__
+    def __init__(self, jump, points):
+        m = jump.power(0)
+        rows = []
+        for k in range(jump.nbits):
+            r = 0
+            for i in range(jump.nbits):
+                r |= ((m.columns[i]>>k)&1)<<i
+                pass
+            rows.append(r)
+            pass
+        row_map = Gf2Map(rows)
+        samples = {}
+        for (s,(t,b)) in enumerate(points):
+            if b not in samples: samples[b] = []
+            samples[b].append((t,s))
+            pass
+        columns = [0] * jump.nbits
+        for (b, ts) in samples.items():
+            ts.sort()
+            r = 1<<b
+            step = 0
+            for (t,s) in ts:
+                while step<t:
+                    r = row_map(r)
+                    step += 1
+                    pass
+                for i in range(jump.nbits):
+                    if (r>>i)&1: columns[i] |= 1<<s
+                    pass
+                pass
+            pass
+        Gf2Map.__init__(self, columns)
+        pass
+    pass
@@ -19,24 +19,39 @@
 """
 This file includes an operating model of the PRNG from the CDL to generate bitstreams to run through assess.
 """
+import os
+import json
+import argparse
 from random import Random
-from ..utils.lfsr import Lfsr
+try:
+    from ..utils.lfsr import Lfsr
+except ImportError:
+    # When run as 'python -m crypto.prng', utils is a toplevel package
+    from utils.lfsr import Lfsr
+from .lfsr_jump import LfsrJump, LfsrSampler
 
 t_prng_whiteness_control = {"request":1, "control":16, "run_length":32}
 t_prng_whiteness_result  = {"ack":1, "valid":1, "data":64}
-t_prng_config = {"enable":1, "min_valid":3, "seed_request":1}
+t_prng_config = {"enable":1, "min_valid":3, "seed_request":1, "wide":2}
 t_prng_data   = {"valid":1, "data":1}
-t_prng_status = {"data":t_prng_data, "seed_complete":1}
+t_prng_wide_data = {"valid":8, "data":8}
+t_prng_status = {"data":t_prng_data, "seed_complete":1, "wide_data":t_prng_wide_data}
 
 class Prng(object):
-    
+    """
+    Clocks of more than jump_threshold are performed with the LFSR
+    jump-ahead tables, in O(log n) rather than O(n)
+    """
+    lfsr_descs = ( (47, (1<<46)|1),
+                   (53, (1<<52)|(1<<51)|(1<<47)|1),
+                   (59, (1<<57)|(1<<55)|(1<<52)|1),
+                   (61, (1<<60)|(1<<59)|(1<<56)|1),
+    )
+    jump_threshold = 64
     def __init__(self, min_valid):
         self.min_valid = min_valid
-        l0 = Lfsr(nbits=47, poly=(1<<46)|1)
-        l1 = Lfsr(nbits=53, poly=(1<<52)|(1<<51)|(1<<47)|1)
-        l2 = Lfsr(nbits=59, poly=(1<<57)|(1<<55)|(1<<52)|1)
-        l3 = Lfsr(nbits=61, poly=(1<<60)|(1<<59)|(1<<56)|1)
-        self.lfsrs = (l0, l1, l2, l3)
+        self.lfsrs = tuple(Lfsr(nbits=nbits, poly=poly) for (nbits, poly) in self.lfsr_descs)
+        self.jumps = tuple(LfsrJump.of_lfsr(Lfsr, nbits, poly) for (nbits, poly) in self.lfsr_descs)
         for l in self.lfsrs:
             l.set(1)
             pass
@@ -54,10 +69,22 @@ class Prng(object):
         pass
     #f clock
     def clock(self, n):
+        if n>self.jump_threshold:
+            self.jump(n)
+            return
         for l in self.lfsrs:
             l.clk(n)
             pass
         pass
+    #f jump
+    def jump(self, n):
+        """
+        Advance all the LFSRs by n steps using the jump-ahead tables
+        """
+        for (l,j) in zip(self.lfsrs, self.jumps):
+            l.set(j.advance(l.get(), n))
+            pass
+        pass
     #f get_value
     def get_value(self):
         v=0
@@ -70,13 +97,170 @@ class Prng(object):
                 pass
             pass
         return (nv>=self.min_valid, v)
+    #f get_wide_value
+    def get_wide_value(self, lanes=8):
+        """
+        Return (valid mask, data) of the lanes of wide mode - the Von
+        Neumann extraction of bits 2k+1 and 2k of the LFSRs for lane k;
+        clock by 2*lanes between values
+        """
+        (valid, data) = (0, 0)
+        lvs = [l.get((1<<(2*lanes))-1) for l in self.lfsrs]
+        for k in range(lanes):
+            (v, nv) = (0, 0)
+            for lv in lvs:
+                if ((lv>>(2*k))&3) in [1,2]:
+                    v ^= (lv>>(2*k)) & 1
+                    nv = nv + 1
+                    pass
+                pass
+            if nv>=self.min_valid:
+                valid |= 1<<k
+                data  |= v<<k
+                pass
+            pass
+        return (valid, data)
     pass
 
+#f popcount
+def popcount(v):
+    return bin(v).count("1")
+
+#f at_least
+def at_least(valids, n, full):
+    """
+    Bit-sliced count of the four LFSR valid words; returns the mask of
+    positions where at least n are valid
+    """
+    (a,b,c,d) = valids
+    if n<=0: return full
+    if n==1: return a|b|c|d
+    if n==2: return (a&b) | (c&d) | ((a|b)&(c|d))
+    if n==3: return (a&b&(c|d)) | (c&d&(a|b))
+    if n==4: return a&b&c&d
+    return 0
+
+#c PrngWordEngine
+class PrngWordEngine(object):
+    """
+    Word-at-a-time generation of the Prng output.
+
+    Each word covers 'samples' consecutive get_value/clock(2) attempts,
+    with attempt i in bit i; next_word returns the mask of valid
+    attempts and their data, and advances the LFSRs by 2*samples.
+
+    For each LFSR the bottom two bits at every attempt are linear in
+    the LFSR state, so they are produced by table-driven GF(2) maps
+    (see lfsr_jump.LfsrSampler); the Von Neumann valid/data words, the
+    count of valid LFSRs against min_valid, and the XOR of the data are
+    then plain bitwise operations across the whole word.
+    """
+    _samplers = {}
+    #f __init__
+    def __init__(self, prng, samples=128):
+        self.prng = prng
+        self.samples = samples
+        self.full = (1<<samples)-1
+        self.samplers = []
+        for (nbits, poly) in prng.lfsr_descs:
+            key = (nbits, poly, samples)
+            if key not in self._samplers:
+                j = LfsrJump.of_lfsr(Lfsr, nbits, poly)
+                self._samplers[key] = ( LfsrSampler(j, [(2*i,0) for i in range(samples)]),
+                                        LfsrSampler(j, [(2*i,1) for i in range(samples)]),
+                                        j.map(2*samples) )
+                pass
+            self.samplers.append(self._samplers[key])
+            pass
+        pass
+    #f next_word
+    def next_word(self):
+        """
+        Return (valid mask, data) for the next 'samples' attempts; data is zero where not valid
+        """
+        valids = []
+        data = 0
+        for (l, (bit0, bit1, advance)) in zip(self.prng.lfsrs, self.samplers):
+            v = l.get()
+            b0 = bit0(v)
+            lv = b0 ^ bit1(v)
+            valids.append(lv)
+            data ^= b0 & lv
+            l.set(advance(v))
+            pass
+        mask = at_least(valids, self.prng.min_valid, self.full)
+        return (mask, data & mask)
+    #f next_valid_bits
+    def next_valid_bits(self):
+        """
+        Return (bits, count) of the valid bits from the next word, in
+        the order get_value would produce them (first is most significant)
+        """
+        (mask, data) = self.next_word()
+        return compact_valid_bits(mask, data)
+    pass
+
+#f compact_valid_bits
+_compact_table = None
+def compact_valid_bits(mask, data, n=None):
+    """
+    Return (bits, count) of the first n (or all) valid data bits,
+    taking bit 0 first and packing the first as the most significant;
+    count is less than n if there are not enough valid bits
+    """
+    global _compact_table
+    if _compact_table is None:
+        _compact_table = []
+        for m in range(256):
+            for d in range(256):
+                r = 0
+                for i in range(8):
+                    if (m>>i)&1: r = (r<<1) | ((d>>i)&1)
+                    pass
+                _compact_table.append(r)
+                pass
+            pass
+        pass
+    r = 0
+    nr = 0
+    while (mask!=0) and ((n is None) or (nr<n)):
+        m = mask & 0xff
+        nm = popcount(m)
+        r = (r<<nm) | _compact_table[(m<<8) | (data&0xff)]
+        nr += nm
+        mask >>= 8
+        data >>= 8
+        pass
+    if (n is not None) and (nr>n):
+        r >>= (nr-n)
+        nr = n
+        pass
+    return (r, nr)
+
 seed =  "It was the best of times"
 seed =  "The quick brown fox jumps over the lazy dog"
 def get_entropy(seed, min_valid=2, bits_per_line=32, attempts_per_line=64, nlines=10000):
     """
     From the discussion in prng.cdl, then min_valid should be 1 or 2 really
+
+    Each line uses attempts_per_line attempts; it yields the first
+    bits_per_line valid bits, or nothing if there are not enough.
+    The result is identical to get_entropy_by_value.
+    """
+    p = Prng(min_valid=min_valid)
+    p.seed(seed)
+    engine = PrngWordEngine(p, samples=attempts_per_line)
+    result = []
+    for j in range(nlines):
+        (mask, data) = engine.next_word()
+        (r, n) = compact_valid_bits(mask, data, bits_per_line)
+        if n==bits_per_line: result.append(r)
+        pass
+    return result
+
+def get_entropy_by_value(seed, min_valid=2, bits_per_line=32, attempts_per_line=64, nlines=10000):
+    """
+    Reference version of get_entropy using get_value one attempt at a time
     """
     p = Prng(min_valid=min_valid)
     p.seed(seed)
@@ -101,23 +285,77 @@ def get_entropy(seed, min_valid=2, bits_per_line=32, attempts_per_line=64, nline
         pass
     return result
 
-import struct
+#a Entropy files
 entropy_data = {"one_per_four_32":    (1,4,32),
                 "one_per_six_32":     (2,6,32),
                 "one_per_sixteen_32": (2,16,32),
                 }
-entropy_data = {}
 total_bits = 1000*1000
-for (filename, (min_valid, cycles_per_bit, bits_per_line)) in entropy_data.items():                
-    entropy = get_entropy(seed=seed, min_valid=min_valid, bits_per_line=bits_per_line, attempts_per_line=bits_per_line*cycles_per_bit//2, nlines = (total_bits+100*bits_per_line) // bits_per_line)
-    with open(filename,"wb") as f:
-        for r in entropy:
-            f.write(struct.pack("I",r))
+
+#f write_entropy_file
+def write_entropy_file(filename, seed, min_valid, cycles_per_bit, bits_per_line, total_bits=total_bits, resume=False, lines_per_chunk=65536, processes=1, verbose=True):
+    """
+    Generate an entropy file (for assess) of native uint32 words, one
+    per line of get_entropy, enough to hold total_bits.
+
+    The file is preallocated and memory-mapped, and chunks of entropy
+    are streamed straight in to it. A progress file (filename.progress)
+    records the number of lines consumed and words written after each
+    chunk; with resume, generation continues from there by jumping the
+    Prng past the lines already consumed.
+
+    With processes>1 the chunks are generated by a pool of processes
+    (see prng_parallel); the file contents are the same.
+    """
+    import numpy as np
+    from .prng_numpy import entropy_chunks, chunk_shape
+    attempts_per_line = bits_per_line*cycles_per_bit//2
+    nwords = (total_bits+bits_per_line-1) // bits_per_line
+    config = {"seed":seed, "min_valid":min_valid, "bits_per_line":bits_per_line, "attempts_per_line":attempts_per_line, "nwords":nwords}
+    progress_filename = filename+".progress"
+    progress = {"config":config, "lines":0, "words":0, "complete":False}
+    if resume and os.path.exists(progress_filename) and os.path.exists(filename):
+        with open(progress_filename) as f:
+            p = json.load(f)
             pass
+        if p["config"]==config: progress = p
         pass
+    if progress["complete"]:
+        if verbose: print("%s: already complete"%filename)
+        return
+    mode = "r+" if progress["words"]>0 else "w+"
+    out = np.memmap(filename, dtype=np.uint32, mode=mode, shape=(nwords,))
+    if processes>1:
+        from .prng_parallel import parallel_entropy_chunks
+        chunks = parallel_entropy_chunks(seed, min_valid=min_valid, bits_per_line=bits_per_line, attempts_per_line=attempts_per_line,
+                                         start_line=progress["lines"], lines_per_chunk=lines_per_chunk, processes=processes)
+        chunk_lines = lines_per_chunk
+        pass
+    else:
+        p = Prng(min_valid=min_valid)
+        p.seed(seed)
+        p.jump(2*attempts_per_line*progress["lines"])
+        chunks = entropy_chunks(p, bits_per_line=bits_per_line, attempts_per_line=attempts_per_line, lines_per_chunk=lines_per_chunk)
+        (lines_per_word, words_per_chunk) = chunk_shape(attempts_per_line, lines_per_chunk)
+        chunk_lines = lines_per_word * words_per_chunk
+        pass
+    for c in chunks:
+        n = min(len(c), nwords-progress["words"])
+        out[progress["words"]:progress["words"]+n] = c[:n]
+        progress["words"] += n
+        progress["lines"] += chunk_lines
+        progress["complete"] = (progress["words"]==nwords)
+        out.flush()
+        with open(progress_filename,"w") as f:
+            json.dump(progress, f)
+            pass
+        if verbose: print("%s: %d of %d words"%(filename, progress["words"], nwords))
+        if progress["complete"]: break
+        pass
+    chunks.close()
+    del out
     pass
 
-
 def test_sbox(sbox):
     # For a nonlinear sbox, we know that
     #   For any W, {f(W+x)-f(x) | x in S} = half of S
@@ -156,28 +394,87 @@ sbox_rijndael = [0x63, 0x7C, 0x77, 0x7B, 0xF2, 0x6B, 0x6F, 0xC5, 0x30, 0x01, 0x6
             0xE1, 0xF8, 0x98, 0x11, 0x69, 0xD9, 0x8E, 0x94, 0x9B, 0x1E, 0x87, 0xE9, 0xCE, 0x55, 0x28, 0xDF,
             0x8C, 0xA1, 0x89, 0x0D, 0xBF, 0xE6, 0x42, 0x68, 0x41, 0x99, 0x2D, 0x0F, 0xB0, 0x54, 0xBB, 0x16]
 sbox4 = [3,7,6,4,13,8,9,5,14,15,10,1,2,11,0,12]
-sbox_in = sbox_not
 sbox_in = sbox4
-sbox = {}
-for i in range(len(sbox_in)):
-    sbox[i] = sbox_in[i]
-    pass
-for k in range(len(sbox)):
-  break
-  min=16
-  for i in range(16):
-    sbox_test = dict(sbox)
-    (sbox_test[i], sbox_test[k]) = (sbox_test[k], sbox_test[i])
-    l=test_sbox(sbox_test)
-    if l<min:
-        min=l
-        min_i = i
+
+#f search_sbox_swaps
+def search_sbox_swaps(sbox_in):
+    """
+    For each entry of the sbox, find the swap with another entry that
+    gives the lowest test_sbox result
+    """
+    sbox = {}
+    for i in range(len(sbox_in)):
+        sbox[i] = sbox_in[i]
+        pass
+    for k in range(len(sbox)):
+        min_l = len(sbox)
+        min_i = k
+        for i in range(len(sbox)):
+            sbox_test = dict(sbox)
+            (sbox_test[i], sbox_test[k]) = (sbox_test[k], sbox_test[i])
+            l=test_sbox(sbox_test)
+            if l<min_l:
+                min_l = l
+                min_i = i
+                pass
+            pass
+        print(min_l,k,min_i,sbox[k],sbox[min_i])
         pass
     pass
-  print(min,k,min_i,sbox[k],sbox[min_i])
-#import sys
-#sys.exit(0)
 
-        
+#a Toplevel
+#f main
+def main(argv=None):
+    """
+    Command line entry point:
+
+    python -m crypto.prng generate [--config name:min_valid:cycles_per_bit:bits_per_line]* [--bits N] [--resume] [--processes N]
+    python -m crypto.prng sbox [--sbox sbox4|sbox_rijndael|sbox_not]
+    """
+    parser = argparse.ArgumentParser(prog="python -m crypto.prng", description="PRNG model entropy file generation")
+    subparsers = parser.add_subparsers(dest="command")
+    gen = subparsers.add_parser("generate", help="Generate entropy files for assess")
+    gen.add_argument("--config", action="append", default=[],
+                     help="Entropy file to generate: a name from %s, or name:min_valid:cycles_per_bit:bits_per_line; may be repeated (default all)"%(",".join(entropy_data.keys())))
+    gen.add_argument("--bits",  type=int, default=total_bits, help="Number of bits per file")
+    gen.add_argument("--seed",  default=seed, help="Seed for the PRNG")
+    gen.add_argument("--output-dir", default=".", help="Directory for the entropy files")
+    gen.add_argument("--resume", action="store_true", help="Resume partially generated files")
+    gen.add_argument("--lines-per-chunk", type=int, default=65536, help="Lines generated per chunk")
+    gen.add_argument("--processes", type=int, default=1, help="Number of processes generating chunks (0 for one per CPU)")
+    sb = subparsers.add_parser("sbox", help="Search swaps of sbox entries")
+    sb.add_argument("--sbox", default="sbox4", choices=["sbox4", "sbox_rijndael", "sbox_not"], help="Sbox to search")
+    args = parser.parse_args(argv)
+
+    if args.command=="generate":
+        configs = []
+        for c in (args.config if args.config else entropy_data.keys()):
+            fields = c.split(":")
+            if len(fields)==1:
+                if c not in entropy_data: parser.error("Unknown entropy configuration '%s'"%c)
+                configs.append((c, entropy_data[c]))
+                pass
+            elif len(fields)==4:
+                configs.append((fields[0], tuple(int(f) for f in fields[1:])))
+                pass
+            else:
+                parser.error("Bad entropy configuration '%s'"%c)
+                pass
+            pass
+        for (filename, (min_valid, cycles_per_bit, bits_per_line)) in configs:
+            write_entropy_file(os.path.join(args.output_dir, filename), seed=args.seed,
+                               min_valid=min_valid, cycles_per_bit=cycles_per_bit, bits_per_line=bits_per_line,
+                               total_bits=args.bits, resume=args.resume, lines_per_chunk=args.lines_per_chunk,
+                               processes=(args.processes if args.processes>0 else (os.cpu_count() or 1)))
+            pass
+        pass
+    elif args.command=="sbox":
+        search_sbox_swaps({"sbox4":sbox4, "sbox_rijndael":sbox_rijndael, "sbox_not":sbox_not}[args.sbox])
+        pass
+    else:
+        parser.print_help()
+        pass
+    pass
 
-        
+if __name__=="__main__":
+    main()
@@ -0,0 +1,271 @@
+#a Copyright
+#
+#  This file 'prng_entropy_mux.py' copyright Gavin J Stark 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#a Documentation
+"""
+A cycle-exact model of prng_entropy_mux_4 for long traces of entropy_in.
+
+The module's last_entropy is always the previous cycle's entropy_in
+(it only fails to update when no input has changed), so the entropy
+detected on every cycle is known up front from the trace. The
+LFSRs then only clock on cycles where the mux is active or an input
+changes; they are idle for most of a sparse trace, and while active
+between input changes they free-run.
+
+The model therefore steps from event to event (cycles with an input
+change), and through the free-running spans between them 64 cycles at
+a time: for each LFSR there are tables of the next 64 output bits
+(bit 0 of the LFSR) and of the state 64 (or 2^k) clocks on from any
+state, so the combined entropy of 64 cycles is the XOR of four table
+lookups. The sixteenth zero of the combined entropy after the last
+event, which deactivates the mux, is found within each 64-bit word.
+
+The result of a trace is a set of arrays, one entry per cycle:
+
+  clocked     - the LFSRs clock (active or an input changed) - the cycles with an entropy_out log event
+  active      - state.active at the start of the cycle (the log's 'active')
+  counter     - state.counter at the start of the cycle (the log's 'count')
+  entropy     - combs.next_entropy_out (the log's 'entropy'); zero when not clocked
+  entropy_out - the entropy_out output during the cycle
+
+EntropyLogChecker compares a whole recording of entropy_out log
+events against a model result in one linear pass.
+"""
+
+#a Imports
+import numpy as np
+
+#a LFSR tables
+#c MuxLfsr
+class MuxLfsr(object):
+    """
+    Tables for one of the LFSRs of the mux: bundle(lfsr[n-1;0], entropy) ^ (lfsr[n-1] ? feedback : 0)
+    """
+    word_bits = 64
+    #f __init__
+    def __init__(self, nbits, feedback):
+        self.nbits = nbits
+        self.feedback = feedback
+        size = 1<<nbits
+        mask = size-1
+        self.step = [[((s<<1)&mask) ^ e ^ (feedback if (s>>(nbits-1))&1 else 0) for s in range(size)] for e in range(2)]
+        # advance[k][s] is s clocked 2^k times without entropy
+        self.advance = [self.step[0]]
+        for k in range(6):
+            a = self.advance[-1]
+            self.advance.append([a[a[s]] for s in range(size)])
+            pass
+        # word[s] has bit i as bit 0 of s clocked i times
+        self.word = []
+        for s in range(size):
+            (w, x) = (0, s)
+            for i in range(self.word_bits):
+                w |= (x&1)<<i
+                x = self.step[0][x]
+                pass
+            self.word.append(w)
+            pass
+        pass
+    #f clock
+    def clock(self, s, n):
+        """
+        Return s clocked n times without entropy
+        """
+        k = 0
+        while n:
+            if n&1: s = self.advance[k][s]
+            n >>= 1
+            k += 1
+            pass
+        return s
+    pass
+
+#a Model
+#c EntropyMux4Model
+class EntropyMux4Model(object):
+    """
+    Model of prng_entropy_mux_4 from reset; 'run' may be called with
+    successive parts of a trace
+    """
+    lfsr_descs = ( (8, 0x71), (7, 0x41), (6, 0x09), (5, 0x09) )
+    inactive_zeros = 16
+    _lfsrs = None
+    #f __init__
+    def __init__(self):
+        if EntropyMux4Model._lfsrs is None:
+            EntropyMux4Model._lfsrs = tuple(MuxLfsr(nbits, feedback) for (nbits, feedback) in self.lfsr_descs)
+            pass
+        self.lfsrs = EntropyMux4Model._lfsrs
+        self.reset()
+        pass
+    #f reset
+    def reset(self):
+        self.state = [0, 0, 0, 0]
+        self.last_entropy = 0
+        self.active = False
+        self.counter = 0
+        self.entropy_out = 0
+        self.cycle = 0
+        pass
+    #f run
+    def run(self, entropy_in):
+        """
+        Run a trace of entropy_in values (one per cycle), returning the
+        dictionary of per-cycle arrays described above
+        """
+        entropy_in = np.asarray(entropy_in, dtype=np.uint8) & 0xf
+        n = len(entropy_in)
+        if n==0: return {"clocked":np.zeros(0, dtype=bool), "active":np.zeros(0, dtype=bool), "counter":np.zeros(0, dtype=np.int64),
+                         "entropy":np.zeros(0, dtype=np.uint8), "entropy_out":np.zeros(0, dtype=np.uint8)}
+        detected = entropy_in ^ np.concatenate([np.array([self.last_entropy], dtype=np.uint8), entropy_in[:-1]])
+        events = np.flatnonzero(detected).tolist()
+        (l0, l1, l2, l3) = self.lfsrs
+        state = self.state
+        active = self.active
+        counter = self.counter
+        # Spans of clocked cycles: (start, length, entropy bits)
+        starts  = []
+        lengths = []
+        words   = []
+        t = 0
+        for end in events + [n]:
+            # Free-run from t to end (exclusive) while active
+            while active and t<end:
+                m = min(64, end-t)
+                w = (l0.word[state[0]] ^ l1.word[state[1]] ^ l2.word[state[2]] ^ l3.word[state[3]]) & ((1<<m)-1)
+                zeros = ~w & ((1<<m)-1)
+                needed = self.inactive_zeros - counter
+                if bin(zeros).count("1") >= needed:
+                    for i in range(needed-1): zeros &= zeros-1
+                    m = (zeros & -zeros).bit_length()
+                    w &= (1<<m)-1
+                    active = False
+                    counter = self.inactive_zeros
+                    pass
+                else:
+                    counter += bin(zeros).count("1")
+                    pass
+                starts.append(t)
+                lengths.append(m)
+                words.append(w)
+                state = [l.clock(s, m) for (l, s) in zip(self.lfsrs, state)]
+                t += m
+                pass
+            if end==n: break
+            # Entropy detected at cycle 'end'
+            d = int(detected[end])
+            e = (state[0] ^ state[1] ^ state[2] ^ state[3]) & 1
+            starts.append(end)
+            lengths.append(1)
+            words.append(e)
+            state = [l.step[(d>>i)&1][s] for (i, (l, s)) in enumerate(zip(self.lfsrs, state))]
+            active = True
+            counter = 0
+            t = end+1
+            pass
+        r = self.expand(n, starts, lengths, words, detected!=0)
+        self.state = state
+        self.active = active
+        self.counter = counter
+        if n>0: self.last_entropy = int(entropy_in[-1])
+        if r["clocked"].any(): self.entropy_out = int(r["entropy"][np.flatnonzero(r["clocked"])[-1]])
+        self.cycle += n
+        return r
+    #f expand
+    def expand(self, n, starts, lengths, words, event):
+        """
+        Expand the clocked spans to per-cycle arrays
+        """
+        starts  = np.array(starts,  dtype=np.int64)
+        lengths = np.array(lengths, dtype=np.int64)
+        words   = np.array(words,   dtype=np.uint64)
+        total = int(lengths.sum())
+        span = np.repeat(np.arange(len(starts)), lengths)
+        offset = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        cycles = starts[span] + offset
+        clocked = np.zeros(n, dtype=bool)
+        clocked[cycles] = True
+        entropy = np.zeros(n, dtype=np.uint8)
+        entropy[cycles] = ((words[span] >> offset.astype(np.uint64)) & np.uint64(1)).astype(np.uint8)
+        # The counter counts zeros of entropy on clocked cycles without an event, from the last event
+        zero = (clocked & ~event & (entropy==0)).astype(np.int64)
+        zeros_before = np.cumsum(zero) - zero
+        last_event = np.maximum.accumulate(np.where(event, np.arange(n), -1))
+        reset_at = np.concatenate([[-1], last_event[:-1]])
+        had_event = reset_at>=0
+        counter = np.where(had_event, zeros_before - zeros_before[np.maximum(reset_at,0)], zeros_before)
+        counter = np.where(had_event, counter, self.counter + counter)
+        active = np.where(had_event, counter<self.inactive_zeros, self.active & (counter<self.inactive_zeros))
+        # entropy_out is the entropy of the last clocked cycle before this one
+        last_clocked = np.maximum.accumulate(np.where(clocked, np.arange(n), -1))
+        prev = np.concatenate([[-1], last_clocked[:-1]])
+        entropy_out = np.where(prev>=0, entropy[np.maximum(prev,0)], self.entropy_out).astype(np.uint8)
+        return {"clocked":clocked, "active":active, "counter":counter, "entropy":entropy, "entropy_out":entropy_out}
+    pass
+
+#f entropy_mux_4
+def entropy_mux_4(entropy_in):
+    """
+    Model a whole trace of entropy_in from reset
+    """
+    return EntropyMux4Model().run(entropy_in)
+
+#a Checking
+#c EntropyLogChecker
+class EntropyLogChecker(object):
+    """
+    Check the entropy_out log events of a run against the model
+
+    The events are (cycle, active, count, entropy) tuples in order;
+    the first event is aligned with the first clocked cycle of the
+    model, and every event thereafter must be the next clocked cycle,
+    with the same cycle offset and values.
+    """
+    #f __init__
+    def __init__(self, result, cycles_per_tick=1):
+        self.cycles = np.flatnonzero(result["clocked"])
+        self.active  = result["active"][self.cycles]
+        self.counter = result["counter"][self.cycles]
+        self.entropy = result["entropy"][self.cycles]
+        self.cycles_per_tick = cycles_per_tick
+        pass
+    #f check
+    def check(self, events):
+        """
+        Return None if the events match the model, else a string describing the first mismatch
+        """
+        if len(events)==0:
+            if len(self.cycles)==0: return None
+            return "No entropy_out events, expected %d"%len(self.cycles)
+        if len(events)!=len(self.cycles):
+            mismatch = "Expected %d entropy_out events, got %d"%(len(self.cycles), len(events))
+            pass
+        else:
+            mismatch = None
+            pass
+        ev = np.array(events, dtype=np.int64).reshape(-1,4)
+        n = min(len(ev), len(self.cycles))
+        cycle_offset = (ev[:n,0] - ev[0,0]) // self.cycles_per_tick
+        expected = np.stack([self.cycles[:n] - self.cycles[0], self.active[:n], self.counter[:n], self.entropy[:n]], axis=1)
+        got = np.stack([cycle_offset, ev[:n,1], ev[:n,2], ev[:n,3]], axis=1)
+        bad = np.flatnonzero((expected!=got).any(axis=1))
+        if len(bad)>0:
+            i = int(bad[0])
+            return "Event %d (model cycle %d): expected (cycle offset, active, count, entropy) %s got %s"%(
+                i, self.cycles[i], tuple(expected[i].tolist()), tuple(got[i].tolist()))
+        return mismatch
+    pass
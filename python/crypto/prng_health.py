@@ -0,0 +1,208 @@
+#a Copyright
+#
+#  This file 'prng_health.py' copyright Gavin J Stark 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#a Documentation
+"""
+Cutoffs for, and software models of, the prng_health_monitor CDL
+module, which performs the continuous health tests of NIST SP800-90B
+section 4.4 on a stream of bits.
+
+repetition_cutoff and proportion_cutoff give the cutoffs of the
+repetition count and adaptive proportion tests for a claimed
+(min-)entropy per bit and a false positive probability alpha, as
+SP800-90B sections 4.4.1 and 4.4.2 describe.
+
+PrngHealthMonitorRef is a cycle-by-cycle transliteration of the CDL,
+which tests the valid lanes of its data lane 0 first; PrngHealthModel
+produces the same failures from NumPy arrays of the valid data bits
+(in that order), for use in the virtual device.
+"""
+
+#a Imports
+import math
+import numpy as np
+
+#a Constants
+window_size = 1024
+repetition_saturate = 255
+
+#a Cutoffs
+#f repetition_cutoff
+def repetition_cutoff(entropy=1.0, alpha=2.0**-20):
+    """
+    Cutoff C of the repetition count test: 1 + ceil(-log2(alpha)/H)
+    """
+    return 1 + int(math.ceil(-math.log2(alpha) / entropy))
+
+#f proportion_cutoff
+def proportion_cutoff(entropy=1.0, alpha=2.0**-20, window=window_size):
+    """
+    Cutoff C of the adaptive proportion test: 1 + CRITBINOM(W, 2^-H,
+    1-alpha), the critical value of the binomial distribution
+    """
+    p = 2.0**-entropy
+    n = window
+    total = 0.0
+    for k in range(n+1):
+        if p<1:
+            log_pmf = (math.lgamma(n+1) - math.lgamma(k+1) - math.lgamma(n-k+1) +
+                       k*math.log(p) + (n-k)*math.log1p(-p))
+            total += math.exp(log_pmf)
+            pass
+        else:
+            total = 1.0 if k==n else 0.0
+            pass
+        if total >= 1-alpha: return k+1
+        pass
+    return window
+
+#a Reference model
+#c PrngHealthMonitorRef
+class PrngHealthMonitorRef(object):
+    """
+    Cycle-by-cycle model of prng_health_monitor, following the CDL
+    statement by statement; clock() is one rising edge of the clock
+    """
+    #f __init__
+    def __init__(self, repetition_cutoff=0, proportion_cutoff=0):
+        self.repetition_cutoff = repetition_cutoff
+        self.proportion_cutoff = proportion_cutoff
+        self.last_data = 0
+        self.repetition_count = 0
+        self.window_count = 0
+        self.window_data = 0
+        self.proportion_count = 0
+        self.status = (0, 0)
+        pass
+    #f step
+    def step(self, data):
+        """
+        Test one valid data bit, updating the state; return the
+        (repetition_failure, proportion_failure) of the bit
+        """
+        repeated = (self.repetition_count!=0) and (data==self.last_data)
+        repetition_count = 1
+        if repeated: repetition_count = min(self.repetition_count+1, repetition_saturate)
+        window_start = (self.window_count==0)
+        proportion_count = self.proportion_count + (1 if data==self.window_data else 0)
+        if window_start: proportion_count = 1
+        rf = ((self.repetition_cutoff!=0) and (repetition_count==self.repetition_cutoff) and
+              not (repeated and self.repetition_count==repetition_saturate))
+        pf = ((self.proportion_cutoff!=0) and (proportion_count==self.proportion_cutoff) and
+              (window_start or proportion_count!=self.proportion_count))
+        self.last_data = data
+        self.repetition_count = repetition_count
+        self.window_count = (self.window_count+1) % window_size
+        self.proportion_count = proportion_count
+        if window_start: self.window_data = data
+        return (int(rf), int(pf))
+    #f clock
+    def clock(self, valid, data, enable=1):
+        """
+        Clock the monitor with the inputs for this cycle; valid and
+        data are lane masks, whose valid bits are tested lane 0 first
+        (a single bit source is lane 0). Return the
+        (repetition_failure, proportion_failure) output after the clock
+        """
+        status = (0, 0)
+        for i in range(8):
+            if (valid>>i)&1:
+                (rf, pf) = self.step((data>>i)&1)
+                status = (status[0] | rf, status[1] | pf)
+                pass
+            pass
+        if not enable:
+            self.repetition_count = 0
+            self.window_count = 0
+            self.proportion_count = 0
+            status = (0, 0)
+            pass
+        self.status = status
+        return status
+    pass
+
+#a Vectorized model
+#c PrngHealthModel
+class PrngHealthModel(object):
+    """
+    Vectorized model of prng_health_monitor for an enabled monitor;
+    the run and window state persists from one call of failures() to
+    the next, and reset() restarts the tests as disabling the monitor
+    does
+    """
+    #f __init__
+    def __init__(self, repetition_cutoff=0, proportion_cutoff=0):
+        self.repetition_cutoff = repetition_cutoff
+        self.proportion_cutoff = proportion_cutoff
+        self.last_data = 0
+        self.reset()
+        pass
+    #f reset
+    def reset(self):
+        self.repetition_count = 0
+        self.window_count = 0
+        self.window_data = 0
+        self.proportion_count = 0
+        pass
+    #f failures
+    def failures(self, bits):
+        """
+        Return arrays of (repetition failure, proportion failure) for
+        each of the valid data bits, updating the state
+        """
+        bits = np.asarray(bits, dtype=np.int8) & 1
+        n = len(bits)
+        if n==0: return (np.zeros(0, dtype=bool), np.zeros(0, dtype=bool))
+        index = np.arange(n)
+
+        # Runs start at a toggle, or at the first bit if the previous run is not continued
+        continued = (self.repetition_count!=0) and (int(bits[0])==self.last_data)
+        starts = np.flatnonzero(np.diff(bits, prepend=np.int8(1-bits[0])))
+        start_of = starts[np.searchsorted(starts, index, side="right")-1]
+        unsaturated = index - start_of + 1
+        if continued: unsaturated = np.where(start_of==0, unsaturated + self.repetition_count, unsaturated)
+        counts = np.minimum(unsaturated, repetition_saturate)
+        # A saturated count continues at or above the saturation value, so a cutoff (at most 255) is reached once per run
+        c = self.repetition_cutoff
+        repetition = (c!=0) & (unsaturated==c)
+
+        # Windows; window 0 may be the continuation of the current window
+        position = self.window_count + index
+        window = position // window_size
+        window_start = (position % window_size)==0
+        first_bits = bits[window_start]
+        if self.window_count==0: window_data = first_bits
+        else:                    window_data = np.concatenate(([self.window_data], first_bits))
+        matches = (bits==window_data[window]).astype(np.int64)
+        cumulative = np.cumsum(matches)
+        window_base = np.zeros(window[-1]+1, dtype=np.int64)
+        starts = np.flatnonzero(window_start)
+        window_base[window[starts]] = cumulative[starts] - 1
+        proportion_counts = cumulative - window_base[window]
+        if self.window_count!=0:
+            proportion_counts = np.where(window==0, proportion_counts + self.proportion_count, proportion_counts)
+            pass
+        c = self.proportion_cutoff
+        proportion = (c!=0) & (proportion_counts==c) & (window_start | (matches!=0))
+
+        self.last_data = int(bits[-1])
+        self.repetition_count = int(counts[-1])
+        self.window_count = int((self.window_count + n) % window_size)
+        self.window_data = int(window_data[window[-1]])
+        self.proportion_count = int(proportion_counts[-1])
+        return (repetition, proportion)
+    pass
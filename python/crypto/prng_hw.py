@@ -0,0 +1,575 @@
+#a Copyright
+#
+#  This file 'prng_hw.py' copyright Gavin J Stark 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#a Documentation
+"""
+Cycle-exact software models of the prng CDL module, including its
+configuration register, reseeding from entropy_in and the Von Neumann
+extractor, driven by a trace of its inputs.
+
+A trace is four equal-length arrays, one entry per cycle, of the
+inputs presented in that cycle (and registered at its end):
+entropy_in, prng_config.seed_request, prng_config.enable and
+prng_config.min_valid. The result of a trace is a dictionary of arrays
+of the prng_status outputs during each cycle ('data_valid', 'data',
+'seed_complete') and a list of the 'seeding' log events as (cycle,
+lfsr, entropy, (lfsr_0, lfsr_1, lfsr_2, lfsr_3)) tuples.
+
+PrngHwRef is a cycle-by-cycle transliteration of the CDL; it is slow,
+and is the reference for PrngHwModel.
+
+PrngHwModel replays a trace without per-cycle work for the LFSRs:
+
+  the registered configuration is a forward-fill of the inputs
+
+  the reseed state machine is stepped in Python only while collecting
+  entropy; it jumps directly to the next seed request, and from a
+  request to the next cycle in which entropy_in was high
+
+  the LFSRs clock on every enabled cycle (8 or 16 times in wide mode),
+  so LFSR state is a function of the number of enabled cycles; between
+  seedings each LFSR runs free, and bit 0 of its state is produced a
+  word of clocks at a time by an LfsrSampler map, with the state at
+  the next seeding found by jump-ahead; as the taps are all well
+  above bit 16, the other low bits of the state (bit 1, and the lanes
+  of wide mode) are bit 0 of earlier clocks, corrected for seedings
+
+  the Von Neumann extraction, min_valid comparison and data register
+  are then array operations across all cycles
+
+The LFSRs use the feedback of prng.cdl, which for lfsr_0 is not that
+of the Prng model in prng.py. Both models may be given a trace in
+successive parts.
+"""
+
+#a Imports
+import numpy as np
+from .lfsr_jump import LfsrJump, LfsrSampler
+
+#a Constants
+#v lfsr_descs - (nbits, feedback) from prng.cdl
+lfsr_descs = ( (47, (1<<42) | 1),
+               (53, (1<<52) | (1<<51) | (1<<47) | 1),
+               (59, (1<<57) | (1<<55) | (1<<52) | 1),
+               (61, (1<<60) | (1<<59) | (1<<56) | 1),
+)
+
+#f lfsr_step
+def lfsr_step(nbits, feedback, v):
+    """
+    One clock of a prng.cdl LFSR; an all-zero LFSR becomes 1
+    """
+    if v==0: return 1
+    n = (v<<1) & ((1<<nbits)-1)
+    if (v>>(nbits-1))&1: n ^= feedback
+    return n
+
+#f vn_extract
+def vn_extract(lfsrs, min_valid, ready):
+    """
+    Return (valid, data) of the Von Neumann extractor for LFSR values
+    """
+    nv = 0
+    data = 0
+    for l in lfsrs:
+        if (l ^ (l>>1)) & 1:
+            nv += 1
+            data ^= l & 1
+            pass
+        pass
+    return (ready and (nv>=min_valid), data)
+
+#f wide_lanes
+def wide_lanes(wide):
+    """
+    Return the number of lanes of the wide output for prng_config.wide (0 for normal mode)
+    """
+    return (0, 4, 8, 8)[wide&3]
+
+#f wide_extract
+def wide_extract(lfsrs, min_valid, lanes):
+    """
+    Return (valid mask, data) of the Von Neumann extractors of the lanes
+    (bit pairs 2k+1, 2k) of LFSR values; data bits are zero if not valid
+    """
+    (valid, data) = (0, 0)
+    for k in range(lanes):
+        (nv, d) = (0, 0)
+        for l in lfsrs:
+            if (l ^ (l>>1)) & (1<<(2*k)):
+                nv += 1
+                d ^= (l>>(2*k)) & 1
+                pass
+            pass
+        if nv>=min_valid:
+            valid |= 1<<k
+            data  |= d<<k
+            pass
+        pass
+    return (valid, data)
+
+#f trace_of_changes
+def trace_of_changes(changes, ncycles):
+    """
+    Return a trace (entropy_in, seed_request, enable, min_valid[, wide])
+    of ncycles cycles from a list of (cycle, entropy_in, seed_request,
+    enable, min_valid[, wide]) input changes in order; each change holds
+    from its cycle until the next, and inputs are zero before the first
+    """
+    ninputs = len(changes[0])-1 if changes else 4
+    trace = np.zeros((ninputs, ncycles), dtype=np.uint8)
+    for (k, (cycle, *values)) in enumerate(changes):
+        end = changes[k+1][0] if k+1<len(changes) else ncycles
+        if cycle>=ncycles: break
+        trace[:, cycle:end] = np.array(values, dtype=np.uint8)[:,None]
+        pass
+    return tuple(trace)
+
+#a Reference model
+#c PrngHwRef
+class PrngHwRef(object):
+    """
+    Cycle-by-cycle model of prng, following the CDL statement by statement
+    """
+    #f __init__
+    def __init__(self):
+        self.config = (0, 0, 0, 0) # enable, seed_request, min_valid, wide
+        self.reseed_requested = 0
+        self.seed_complete = 0
+        self.collecting_entropy = 0
+        self.entropy_in = 0
+        self.counter = 0
+        self.entropy_sr = 0
+        self.lfsr_to_seed = 0
+        self.lfsrs = [0, 0, 0, 0]
+        self.von_neumann_ready = 0
+        self.data_out = 0
+        self.data_valid = 0
+        self.wide_valid = 0
+        self.wide_data = 0
+        self.cycle = 0
+        pass
+    #f status
+    def status(self):
+        return (self.data_valid, self.data_out, self.seed_complete)
+    #f wide_status
+    def wide_status(self):
+        return (self.wide_valid, self.wide_data)
+    #f clock
+    def clock(self, entropy_in, seed_request, enable, min_valid, wide=0):
+        """
+        One cycle with the given inputs; returns a seeding log event or None
+        """
+        (cfg_enable, cfg_seed_request, cfg_min_valid, cfg_wide) = self.config
+        log = None
+        if cfg_enable and self.seed_complete:
+            log = (self.cycle, self.lfsr_to_seed, self.entropy_sr, tuple(self.lfsrs))
+            pass
+        # Entropy control
+        start_collecting = self.entropy_in and self.reseed_requested
+        reseed_requested   = self.reseed_requested
+        collecting_entropy = self.collecting_entropy
+        counter            = self.counter
+        entropy_sr         = self.entropy_sr
+        seed_complete      = 0
+        if self.collecting_entropy:
+            counter = (self.counter+1) & 0xf
+            entropy_sr = ((self.entropy_sr<<1) | entropy_in) & 0xffff
+            if self.counter==0xf:
+                collecting_entropy = 0
+                seed_complete = 1
+                pass
+            pass
+        else:
+            if cfg_seed_request: reseed_requested = 1
+            if start_collecting:
+                reseed_requested = 0
+                collecting_entropy = 1
+                counter = 0
+                pass
+            if self.seed_complete: entropy_sr = 0
+            pass
+        state_entropy_in = entropy_in
+        if not cfg_enable:
+            reseed_requested = 0
+            collecting_entropy = 0
+            seed_complete = 0
+            state_entropy_in = 0
+            entropy_sr = self.entropy_sr
+            counter = self.counter
+            pass
+        # LFSRs
+        lfsrs = self.lfsrs
+        lfsr_to_seed = self.lfsr_to_seed
+        if cfg_enable:
+            lfsrs = list(self.lfsrs)
+            for k in range(2*wide_lanes(cfg_wide) or 1):
+                lfsrs = [lfsr_step(nbits, feedback, l) for ((nbits, feedback), l) in zip(lfsr_descs, lfsrs)]
+                pass
+            if self.seed_complete:
+                lfsrs[self.lfsr_to_seed] ^= self.entropy_sr
+                lfsr_to_seed = (self.lfsr_to_seed+1) & 3
+                pass
+            pass
+        # Von Neumann extractor
+        (vn_valid, vn_data) = vn_extract(self.lfsrs, cfg_min_valid, self.von_neumann_ready)
+        if cfg_wide:
+            (lanes_valid, lanes_data) = wide_extract(self.lfsrs, cfg_min_valid, wide_lanes(cfg_wide))
+            (vn_valid, vn_data) = (lanes_valid & 1, lanes_data & 1)
+            pass
+        else:
+            (lanes_valid, lanes_data) = (1 if vn_valid else 0, vn_data if vn_valid else 0)
+            pass
+        data_valid = 0
+        data_out = self.data_out
+        (wide_valid, wide_data) = (0, 0)
+        von_neumann_ready = self.von_neumann_ready
+        if cfg_enable:
+            if vn_valid: data_out = vn_data
+            data_valid = vn_valid
+            (wide_valid, wide_data) = (lanes_valid, lanes_data)
+            von_neumann_ready = not self.von_neumann_ready
+            pass
+        # Configuration
+        if cfg_enable or enable: self.config = (enable, seed_request, min_valid, wide)
+        # Commit
+        self.reseed_requested = reseed_requested
+        self.collecting_entropy = collecting_entropy
+        self.counter = counter
+        self.entropy_sr = entropy_sr
+        self.seed_complete = seed_complete
+        self.entropy_in = state_entropy_in
+        self.lfsrs = lfsrs
+        self.lfsr_to_seed = lfsr_to_seed
+        self.data_out = data_out
+        self.data_valid = 1 if data_valid else 0
+        (self.wide_valid, self.wide_data) = (wide_valid, wide_data)
+        self.von_neumann_ready = 1 if von_neumann_ready else 0
+        self.cycle += 1
+        return log
+    #f run
+    def run(self, entropy_in, seed_request, enable, min_valid, wide=None):
+        """
+        Run a trace, returning its result as PrngHwModel.run
+        """
+        n = len(entropy_in)
+        if wide is None: wide = np.zeros(n, dtype=np.uint8)
+        r = {"data_valid":np.zeros(n, dtype=np.uint8), "data":np.zeros(n, dtype=np.uint8), "seed_complete":np.zeros(n, dtype=np.uint8), "seedings":[],
+             "wide_valid":np.zeros(n, dtype=np.uint8), "wide_data":np.zeros(n, dtype=np.uint8)}
+        for t in range(n):
+            (r["data_valid"][t], r["data"][t], r["seed_complete"][t]) = self.status()
+            (r["wide_valid"][t], r["wide_data"][t]) = self.wide_status()
+            log = self.clock(int(entropy_in[t]), int(seed_request[t]), int(enable[t]), int(min_valid[t]), int(wide[t]))
+            if log is not None: r["seedings"].append(log)
+            pass
+        return r
+    pass
+
+#a Fast model
+#c PrngHwModel
+class PrngHwModel(object):
+    """
+    Trace-driven model of prng; see the module documentation
+
+    The LFSR descriptions may be given, to model a variant of the hardware
+    """
+    word_clocks = 512
+    _samplers = {}
+    #f __init__
+    def __init__(self, lfsr_descs=lfsr_descs):
+        self.lfsr_descs = lfsr_descs
+        self.samplers = []
+        for (nbits, feedback) in lfsr_descs:
+            key = (nbits, feedback, self.word_clocks)
+            if key not in self._samplers:
+                j = LfsrJump.of_galois(nbits, feedback)
+                self._samplers[key] = ( j,
+                                        LfsrSampler(j, [(i,0) for i in range(self.word_clocks)]),
+                                        j.map(self.word_clocks) )
+                pass
+            self.samplers.append(self._samplers[key])
+            pass
+        self.config = (0, 0, 0, 0)
+        self.reseed_requested = 0
+        self.seed_complete = 0
+        self.collecting_entropy = 0
+        self.entropy_in = 0
+        self.counter = 0
+        self.entropy_sr = 0
+        self.lfsr_to_seed = 0
+        self.lfsrs = [0, 0, 0, 0]
+        self.von_neumann_ready = 0
+        self.data_out = 0
+        self.data_valid = 0
+        self.wide_valid = 0
+        self.wide_data = 0
+        self.cycle = 0
+        pass
+    #f registered_config
+    def registered_config(self, enable, seed_request, min_valid, wide):
+        """
+        Return arrays of state.prng_config (enable, seed_request, min_valid, wide) for each cycle
+        """
+        n = len(enable)
+        cfg_enable = np.concatenate([[self.config[0]], enable[:-1]]).astype(np.uint8)
+        # The configuration is written at the end of any cycle in which it was or will be enabled
+        written = (cfg_enable | enable) != 0
+        last = np.maximum.accumulate(np.where(written, np.arange(n), -1))
+        prev = np.concatenate([[-1], last[:-1]])
+        cfg_seed_request = np.where(prev>=0, seed_request[np.maximum(prev,0)], self.config[1]).astype(np.uint8)
+        cfg_min_valid    = np.where(prev>=0, min_valid[np.maximum(prev,0)],    self.config[2]).astype(np.uint8)
+        cfg_wide         = np.where(prev>=0, wide[np.maximum(prev,0)],         self.config[3]).astype(np.uint8)
+        return (cfg_enable, cfg_seed_request, cfg_min_valid, cfg_wide)
+    #f reseed
+    def reseed(self, entropy_in, cfg_enable, cfg_seed_request):
+        """
+        Run the reseed state machine; return the seed_complete array and
+        a list of (cycle, entropy_sr) of seedings
+        """
+        n = len(entropy_in)
+        seed_complete = np.zeros(n, dtype=np.uint8)
+        seedings = []
+        state_entropy_in = np.concatenate([[self.entropy_in], entropy_in[:-1] & cfg_enable[:-1]]).astype(np.uint8)
+        requests = np.flatnonzero(cfg_seed_request & cfg_enable)
+        starts   = np.flatnonzero(state_entropy_in | (cfg_enable==0))
+        (rr, collecting, sc, counter, sr) = (self.reseed_requested, self.collecting_entropy, self.seed_complete, self.counter, self.entropy_sr)
+        t = 0
+        while t<n:
+            if not (rr or collecting or sc):
+                # Idle until the next enabled seed request
+                k = np.searchsorted(requests, t)
+                if k==len(requests): break
+                t = int(requests[k])
+                rr = 1
+                t += 1
+                continue
+            if rr and not (collecting or sc):
+                # Requested until entropy_in was high, or disabled
+                k = np.searchsorted(starts, t)
+                if k==len(starts): break
+                t = int(starts[k])
+                if cfg_enable[t]:
+                    collecting = 1
+                    counter = 0
+                    pass
+                rr = 0
+                t += 1
+                continue
+            en = cfg_enable[t]
+            seed_complete[t] = sc
+            if sc and en: seedings.append((t, sr))
+            (n_rr, n_col, n_sc, n_cnt, n_sr) = (rr, collecting, 0, counter, sr)
+            if collecting:
+                n_cnt = (counter+1) & 0xf
+                n_sr = ((sr<<1) | int(entropy_in[t])) & 0xffff
+                if counter==0xf:
+                    n_col = 0
+                    n_sc = 1
+                    pass
+                pass
+            else:
+                if cfg_seed_request[t]: n_rr = 1
+                if state_entropy_in[t] and rr:
+                    n_rr = 0
+                    n_col = 1
+                    n_cnt = 0
+                    pass
+                if sc: n_sr = 0
+                pass
+            if not en:
+                (n_rr, n_col, n_sc, n_cnt, n_sr) = (0, 0, 0, counter, sr)
+                pass
+            (rr, collecting, sc, counter, sr) = (n_rr, n_col, n_sc, n_cnt, n_sr)
+            t += 1
+            pass
+        (self.reseed_requested, self.collecting_entropy, self.seed_complete, self.counter, self.entropy_sr) = (rr, collecting, sc, counter, sr)
+        if n>0: self.entropy_in = int(entropy_in[-1] & cfg_enable[-1])
+        return (seed_complete, seedings)
+    #f lfsr_bits
+    def lfsr_bits(self, i, state, nclocks):
+        """
+        Return (bit 0 array, state after) for nclocks of LFSR i from state
+        """
+        (j, bit0, advance) = self.samplers[i]
+        if nclocks<=16:
+            (nbits, feedback) = self.lfsr_descs[i]
+            b0 = np.zeros(nclocks, dtype=np.uint8)
+            for k in range(nclocks):
+                b0[k] = state&1
+                state = lfsr_step(nbits, feedback, state)
+                pass
+            return (b0, state)
+        w0 = []
+        head = []
+        if state==0 and nclocks>0:
+            head = [0]
+            state = 1
+            nclocks -= 1
+            pass
+        (nwords, remainder) = divmod(nclocks, self.word_clocks)
+        for k in range(nwords):
+            w0.append(bit0(state))
+            state = advance(state)
+            pass
+        if remainder>0:
+            w0.append(bit0(state))
+            state = j.advance(state, remainder)
+            pass
+        nbytes = self.word_clocks//8
+        b = np.frombuffer(b"".join(w.to_bytes(nbytes, "little") for w in w0), dtype=np.uint8)
+        return (np.concatenate([np.array(head, dtype=np.uint8), np.unpackbits(b, bitorder="little")[:nclocks]]), state)
+    #f run
+    def run(self, entropy_in, seed_request, enable, min_valid, wide=None):
+        """
+        Run a trace; returns the dictionary described in the module documentation
+        """
+        entropy_in   = np.asarray(entropy_in,   dtype=np.uint8) & 1
+        seed_request = np.asarray(seed_request, dtype=np.uint8) & 1
+        enable       = np.asarray(enable,       dtype=np.uint8) & 1
+        min_valid    = np.asarray(min_valid,    dtype=np.uint8) & 7
+        n = len(entropy_in)
+        if wide is None: wide = np.zeros(n, dtype=np.uint8)
+        wide = np.asarray(wide, dtype=np.uint8) & 3
+        if n==0: return {"data_valid":np.zeros(0, dtype=np.uint8), "data":np.zeros(0, dtype=np.uint8), "seed_complete":np.zeros(0, dtype=np.uint8), "seedings":[],
+                         "wide_valid":np.zeros(0, dtype=np.uint8), "wide_data":np.zeros(0, dtype=np.uint8)}
+        (cfg_enable, cfg_seed_request, cfg_min_valid, cfg_wide) = self.registered_config(enable, seed_request, min_valid, wide)
+        (seed_complete, seed_cycles) = self.reseed(entropy_in, cfg_enable, cfg_seed_request)
+        # clocks[t] is the number of LFSR clocks before cycle t (one per enabled cycle, or 8 or 16 in wide mode);
+        # the LFSRs run free between seedings
+        lanes = np.array([wide_lanes(w) for w in range(4)], dtype=np.int64)[cfg_wide]
+        steps = np.where(lanes>0, 2*lanes, 1) * cfg_enable
+        clocks = np.cumsum(steps, dtype=np.int64) - steps
+        total = int(clocks[-1]) + int(steps[-1])
+        seedings = []
+        for (t, sr) in seed_cycles:
+            seedings.append([int(clocks[t]), int(steps[t]), t, (self.lfsr_to_seed+len(seedings)) & 3, sr, [0,0,0,0]])
+            pass
+        wide_cycles = np.flatnonzero(lanes * cfg_enable)
+        bits = []
+        words = []
+        for i in range(4):
+            state = self.lfsrs[i]
+            initial = state
+            b0 = []
+            c = 0
+            for (cs, ns, t, l, sr, states) in seedings:
+                (s0, state) = self.lfsr_bits(i, state, cs-c)
+                b0.append(s0)
+                states[i] = state
+                (s0, state) = self.lfsr_bits(i, state, ns)
+                b0.append(s0)
+                if l==i: state ^= sr
+                c = cs+ns
+                pass
+            (s0, state) = self.lfsr_bits(i, state, total-c)
+            b0.extend([s0, np.array([state&1], dtype=np.uint8)])
+            b0 = np.concatenate(b0)
+            seeds = [(cs+ns, sr) for (cs, ns, t, l, sr, states) in seedings if l==i]
+            # Bit 1 at a clock is bit 0 at the previous clock, other than at clock 0 and at seedings
+            b1 = np.concatenate([[(initial>>1)&1], b0[:-1]]).astype(np.uint8)
+            for (sc, sr) in seeds: b1[sc] ^= (sr>>1)&1
+            bits.append((b0, b1))
+            if len(wide_cycles)>0: words.append(self.lfsr_words(b0, initial, seeds, clocks[wide_cycles]))
+            self.lfsrs[i] = state
+            pass
+        # Von Neumann extraction for each cycle
+        nvalid = np.zeros(n, dtype=np.uint8)
+        vn_data = np.zeros(n, dtype=np.uint8)
+        for (b0, b1) in bits:
+            v = b0[clocks] ^ b1[clocks]
+            nvalid += v
+            vn_data ^= b0[clocks] & v
+            pass
+        enabled = np.cumsum(cfg_enable, dtype=np.int64) - cfg_enable
+        ready = (self.von_neumann_ready ^ (enabled & 1)).astype(np.uint8)
+        vn_valid = ready & (nvalid >= cfg_min_valid) & cfg_enable
+        lanes_valid = vn_valid.copy()
+        lanes_data  = vn_data & vn_valid
+        if len(wide_cycles)>0:
+            (wv, wd) = self.wide_extract(words, clocks[wide_cycles], cfg_min_valid[wide_cycles], lanes[wide_cycles])
+            (lanes_valid[wide_cycles], lanes_data[wide_cycles]) = (wv, wd)
+            vn_valid[wide_cycles] = wv & 1
+            vn_data[wide_cycles]  = wd & 1
+            pass
+        data_valid = np.concatenate([[self.data_valid], vn_valid[:-1]]).astype(np.uint8)
+        last = np.maximum.accumulate(np.where(vn_valid!=0, np.arange(n), -1))
+        prev = np.concatenate([[-1], last[:-1]])
+        data = np.where(prev>=0, vn_data[np.maximum(prev,0)], self.data_out).astype(np.uint8)
+        (lanes_valid, lanes_data) = (lanes_valid * cfg_enable, lanes_data * cfg_enable)
+        wide_valid = np.concatenate([[self.wide_valid], lanes_valid[:-1]]).astype(np.uint8)
+        wide_data  = np.concatenate([[self.wide_data],  lanes_data[:-1]]).astype(np.uint8)
+        # Commit state
+        result = {"data_valid":data_valid, "data":data, "seed_complete":seed_complete,
+                  "seedings":[(self.cycle+t, l, sr, tuple(states)) for (cs, ns, t, l, sr, states) in seedings],
+                  "wide_valid":wide_valid, "wide_data":wide_data}
+        self.lfsr_to_seed = (self.lfsr_to_seed + len(seedings)) & 3
+        self.von_neumann_ready = int(self.von_neumann_ready ^ ((int(enabled[-1]) + int(cfg_enable[-1])) & 1))
+        self.data_valid = int(vn_valid[-1])
+        (self.wide_valid, self.wide_data) = (int(lanes_valid[-1]), int(lanes_data[-1]))
+        if last[-1]>=0: self.data_out = int(vn_data[last[-1]])
+        if cfg_enable[-1] or enable[-1]:
+            self.config = (int(enable[-1]), int(seed_request[-1]), int(min_valid[-1]), int(wide[-1]))
+            pass
+        else:
+            self.config = (0, int(cfg_seed_request[-1]), int(cfg_min_valid[-1]), int(cfg_wide[-1]))
+            pass
+        self.cycle += n
+        return result
+    #f lfsr_words
+    def lfsr_words(self, b0, initial, seeds, clocks):
+        """
+        Return an array of bits 0 to 15 of the state of an LFSR at each of
+        the given clocks, given the bit 0 array, the initial state and the
+        list of (clock, entropy) at which the LFSR was seeded
+
+        Below the LFSR taps (other than bit 0), bit j at clock c is bit 0
+        at clock c-j (with bits of the initial state before clock 0),
+        except that a seeding at clock s < c XORs in its entropy bits
+        above bit 0 shifted up by c-s.
+        """
+        ext = np.concatenate([np.array([(initial>>j)&1 for j in range(15,0,-1)], dtype=np.uint8), b0])
+        bits = ext[clocks[:,None] + 15 - np.arange(16)[None,:]]
+        words = np.packbits(bits, axis=1, bitorder="little").view("<u2").reshape(-1).astype(np.uint16)
+        for (c, sr) in seeds:
+            (lo, hi) = np.searchsorted(clocks, [c, c+15])
+            m = clocks[lo:hi] - c
+            words[lo:hi] ^= ((sr & 0xfffe) << m).astype(np.uint16)
+            pass
+        return words
+    #f wide_extract
+    def wide_extract(self, words, clocks, min_valid, lanes):
+        """
+        Return (valid mask, data) arrays of the wide output for cycles at
+        the given clocks, from the lfsr_words of the LFSRs at those clocks
+        """
+        n = len(clocks)
+        (valid, data) = (np.zeros(n, dtype=np.uint8), np.zeros(n, dtype=np.uint8))
+        states = [w.astype(np.int64) for w in words]
+        for k in range(8):
+            nv = np.zeros(n, dtype=np.uint8)
+            d  = np.zeros(n, dtype=np.uint8)
+            for st in states:
+                v = ((st ^ (st>>1)) >> (2*k)) & 1
+                nv += v.astype(np.uint8)
+                d  ^= (((st>>(2*k)) & 1) & v).astype(np.uint8)
+                pass
+            lane_valid = ((nv >= min_valid) & (k < lanes)).astype(np.uint8)
+            valid |= lane_valid << k
+            data  |= (d & lane_valid) << k
+            pass
+        return (valid, data)
+    pass
@@ -0,0 +1,130 @@
+#a Copyright
+#
+#  This file 'prng_numpy.py' copyright Gavin J Stark 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#a Documentation
+"""
+NumPy versions of the PRNG entropy generation of prng.py.
+
+The LFSR attempts are generated by the PrngWordEngine a word at a time,
+with each word covering a whole number of lines; the words are
+unpacked to a (lines x attempts_per_line) array of valid and data bits,
+and the selection of the first bits_per_line valid bits of each line
+and their packing in to a uint32 is performed across all the lines of
+a chunk at once.
+
+The results are identical to prng.get_entropy.
+"""
+
+#a Imports
+import numpy as np
+from .prng import Prng, PrngWordEngine
+
+#a Entropy generation
+#f unpack_words
+def unpack_words(words, nbits):
+    """
+    Unpack a list of nbits-wide integers to a (len(words) x nbits) array of bits, bit 0 first
+    """
+    nbytes = (nbits+7)//8
+    b = np.frombuffer(b"".join(w.to_bytes(nbytes, "little") for w in words), dtype=np.uint8)
+    b = np.unpackbits(b.reshape(len(words), nbytes), axis=1, bitorder="little")
+    return b[:, :nbits]
+
+#f pack_lines
+def pack_lines(valid, data, bits_per_line):
+    """
+    Given (nlines x attempts) arrays of valid and data bits, return a
+    uint32 array of the first bits_per_line valid bits of each line
+    that has enough (first bit most significant), dropping lines that
+    do not have enough valid bits
+    """
+    counts = np.cumsum(valid, axis=1, dtype=np.int32)
+    complete = counts[:, -1] >= bits_per_line
+    select = (valid!=0) & (counts <= bits_per_line) & complete[:, None]
+    shifts = np.where(select, bits_per_line - counts, 0).astype(np.uint64)
+    bits = np.where(select, data, 0).astype(np.uint64)
+    r = np.bitwise_or.reduce(np.left_shift(bits, shifts), axis=1)
+    return r[complete].astype(np.uint32)
+
+#f chunk_shape
+def chunk_shape(attempts_per_line, lines_per_chunk):
+    """
+    Return (lines per engine word, engine words per chunk) for entropy_chunks;
+    a chunk is lines_per_chunk rounded down to a whole number of words
+    """
+    lines_per_word = max(1, 1024 // attempts_per_line)
+    return (lines_per_word, max(1, lines_per_chunk // lines_per_word))
+
+#f entropy_chunks
+def entropy_chunks(prng, bits_per_line=32, attempts_per_line=64, lines_per_chunk=4096, nlines=None):
+    """
+    Generator of uint32 arrays of entropy from a Prng, as per
+    get_entropy; each array is the result of the lines_per_chunk lines
+    (rounded as per chunk_shape; fewer for the last chunk if nlines is
+    given)
+    """
+    (lines_per_word, words_per_chunk) = chunk_shape(attempts_per_line, lines_per_chunk)
+    samples = lines_per_word * attempts_per_line
+    engine = PrngWordEngine(prng, samples=samples)
+    lines_done = 0
+    while (nlines is None) or (lines_done<nlines):
+        nwords = words_per_chunk
+        if nlines is not None:
+            nwords = min(nwords, (nlines - lines_done + lines_per_word - 1) // lines_per_word)
+            pass
+        masks = []
+        datas = []
+        for i in range(nwords):
+            (m, d) = engine.next_word()
+            masks.append(m)
+            datas.append(d)
+            pass
+        valid = unpack_words(masks, samples).reshape(-1, attempts_per_line)
+        data  = unpack_words(datas, samples).reshape(-1, attempts_per_line)
+        if nlines is not None:
+            valid = valid[:nlines-lines_done]
+            data  = data[:nlines-lines_done]
+            pass
+        lines_done += valid.shape[0]
+        yield pack_lines(valid, data, bits_per_line)
+        pass
+    pass
+
+#f get_entropy_array
+def get_entropy_array(seed, min_valid=2, bits_per_line=32, attempts_per_line=64, nlines=10000, out=None, lines_per_chunk=4096):
+    """
+    Vectorized prng.get_entropy, returning a NumPy uint32 array
+
+    If out is given then the entropy is written in to it (up to its
+    length) and the number of words written is returned; note that
+    lines without enough valid bits produce no word, so this may be
+    fewer than nlines
+    """
+    if bits_per_line>32: raise Exception("bits_per_line of %d does not fit in uint32"%bits_per_line)
+    p = Prng(min_valid=min_valid)
+    p.seed(seed)
+    chunks = entropy_chunks(p, bits_per_line=bits_per_line, attempts_per_line=attempts_per_line, lines_per_chunk=lines_per_chunk, nlines=nlines)
+    if out is None:
+        return np.concatenate([np.zeros(0, dtype=np.uint32)] + list(chunks))
+    n = 0
+    for c in chunks:
+        c = c[:len(out)-n]
+        out[n:n+len(c)] = c
+        n += len(c)
+        if n==len(out): break
+        pass
+    return n
@@ -0,0 +1,138 @@
+#a Copyright
+#
+#  This file 'prng_parallel.py' copyright Gavin J Stark 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#a Documentation
+"""
+Multi-process generation of PRNG entropy streams.
+
+Every line of get_entropy consumes exactly 2*attempts_per_line clocks
+of the LFSRs, whether or not it produces a word; so line L of a stream
+starts from the seeded state advanced by 2*attempts_per_line*L, which
+Prng.jump reaches in O(log L).
+
+A stream is therefore split in to contiguous segments of lines; each
+worker process seeds its own Prng, jumps to the start of its segment,
+and generates the segment with prng_numpy. The parent concatenates
+the segments in order, so the result is bit-identical to a serial run.
+"""
+
+#a Imports
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from .prng import Prng
+from .prng_numpy import get_entropy_array, entropy_chunks
+
+#a Segments
+#f generate_segment
+def generate_segment(seed, min_valid, bits_per_line, attempts_per_line, start_line, nlines, lines_per_chunk=4096):
+    """
+    Generate lines start_line to start_line+nlines-1 of the stream of
+    get_entropy_array(seed, ...) - run in a worker process
+    """
+    p = Prng(min_valid=min_valid)
+    p.seed(seed)
+    p.jump(2*attempts_per_line*start_line)
+    chunks = entropy_chunks(p, bits_per_line=bits_per_line, attempts_per_line=attempts_per_line, lines_per_chunk=lines_per_chunk, nlines=nlines)
+    return np.concatenate([np.zeros(0, dtype=np.uint32)] + list(chunks))
+
+#f segment_lines
+def segment_lines(nlines, nsegments):
+    """
+    Split nlines in to nsegments contiguous (start_line, nlines) segments
+    """
+    nsegments = max(1, min(nsegments, nlines))
+    segments = []
+    start = 0
+    for i in range(nsegments):
+        end = (nlines * (i+1)) // nsegments
+        segments.append((start, end-start))
+        start = end
+        pass
+    return segments
+
+#a Parallel generation
+#f default_processes
+def default_processes():
+    return os.cpu_count() or 1
+
+#f get_entropy_parallel
+def get_entropy_parallel(seed, min_valid=2, bits_per_line=32, attempts_per_line=64, nlines=10000, processes=None, segments_per_process=4):
+    """
+    Parallel get_entropy_array; the stream is split in to
+    segments_per_process segments for each process, to balance the load
+    """
+    if processes is None: processes = default_processes()
+    if processes<=1: return get_entropy_array(seed, min_valid=min_valid, bits_per_line=bits_per_line, attempts_per_line=attempts_per_line, nlines=nlines)
+    return sweep([{"seed":seed, "min_valid":min_valid, "bits_per_line":bits_per_line, "attempts_per_line":attempts_per_line, "nlines":nlines}],
+                 processes=processes, segments_per_process=segments_per_process)[0]
+
+#f sweep
+def sweep(configs, processes=None, segments_per_process=4):
+    """
+    Generate a stream for each of a list of configurations, sharing one
+    pool of processes across all of them
+
+    Each configuration is a dictionary with 'seed' and 'min_valid', and
+    optionally 'bits_per_line', 'attempts_per_line' and 'nlines' (as
+    get_entropy_array). Returns a list of uint32 arrays, one per
+    configuration in order.
+    """
+    if processes is None: processes = default_processes()
+    jobs = []
+    for (i, c) in enumerate(configs):
+        args = (c["seed"], c["min_valid"], c.get("bits_per_line",32), c.get("attempts_per_line",64))
+        for (start, n) in segment_lines(c.get("nlines",10000), processes*segments_per_process):
+            jobs.append((i, args+(start, n)))
+            pass
+        pass
+    results = [[] for c in configs]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [(i, executor.submit(generate_segment, *args)) for (i, args) in jobs]
+        for (i, f) in futures:
+            results[i].append(f.result())
+            pass
+        pass
+    return [np.concatenate([np.zeros(0, dtype=np.uint32)] + r) for r in results]
+
+#f parallel_entropy_chunks
+def parallel_entropy_chunks(seed, min_valid=2, bits_per_line=32, attempts_per_line=64, start_line=0, lines_per_chunk=65536, processes=None):
+    """
+    Generator of uint32 arrays of entropy, each the result of
+    lines_per_chunk lines of the stream starting at start_line, as per
+    prng_numpy.entropy_chunks; the chunks are generated by a pool of
+    processes, with at most two chunks per process outstanding
+    """
+    if processes is None: processes = default_processes()
+    executor = ProcessPoolExecutor(max_workers=processes)
+    try:
+        pending = deque()
+        line = start_line
+        while True:
+            while len(pending)<2*processes:
+                pending.append(executor.submit(generate_segment, seed, min_valid, bits_per_line, attempts_per_line, line, lines_per_chunk))
+                line += lines_per_chunk
+                pass
+            yield pending.popleft().result()
+            pass
+        pass
+    finally:
+        # The consumer may stop at any point; do not complete the lookahead
+        executor.shutdown(wait=True, cancel_futures=True)
+        pass
+    pass
@@ -0,0 +1,188 @@
+#a Copyright
+#
+#  This file 'prng_scoreboard.py' copyright Gavin J Stark 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#a Documentation
+"""
+Scoreboard checking a simulation of the prng module against
+prng_hw.PrngHwModel in bulk.
+
+The simulation records, without any per-cycle checking, the cycles in
+which prng_status has data valid or seed complete (the prng 'status'
+log event) and the 'seeding' log events, which carry the state of all
+four LFSRs. After the run (or every so many cycles) the scoreboard is
+given the trace of inputs for the cycles since it last checked; it
+replays them through the model and compares:
+
+  data_valid and seed_complete for every cycle (a cycle with no
+  status event has both low)
+
+  data for every cycle with data valid
+
+  every seeding event, including the LFSR states
+
+and reports the first divergence. A seeding whose LFSR state differs
+identifies the LFSR at fault; an LFSR whose feedback taps differ
+between the hardware and the model will usually first show in the data
+output, and the LFSR is then identified by the next seeding. The
+report also gives the last seeding at which all the LFSRs agreed.
+
+Cycle numbers of the recorded events are those of the trace, less
+cycle_offset.
+"""
+
+#a Imports
+import numpy as np
+from .prng_hw import PrngHwModel
+
+#a Classes
+#c PrngDivergence
+class PrngDivergence(object):
+    """
+    The first difference between a simulation and the model
+    """
+    #f __init__
+    def __init__(self, cycle, signal, expected, got, lfsr=None, last_agreed=None):
+        self.cycle = cycle
+        self.signal = signal
+        self.expected = expected
+        self.got = got
+        self.lfsr = lfsr
+        self.last_agreed = last_agreed
+        pass
+    #f __str__
+    def __str__(self):
+        s = "Divergence at cycle %d in %s: expected %s got %s"%(self.cycle, self.signal, str(self.expected), str(self.got))
+        if self.lfsr is not None: s += " (lfsr_%d differs)"%self.lfsr
+        elif self.last_agreed is not None: s += " (all LFSRs agreed at seeding in cycle %d)"%self.last_agreed
+        return s
+    pass
+
+#c PrngScoreboard
+class PrngScoreboard(object):
+    """
+    Bulk scoreboard for the prng module; see the module documentation
+    """
+    #f __init__
+    def __init__(self, model=None, cycle_offset=0):
+        if model is None: model = PrngHwModel()
+        self.model = model
+        self.cycle_offset = cycle_offset
+        self.statuses = []
+        self.seedings = []
+        self.checked = 0
+        self.last_agreed = None
+        self.divergence = None
+        pass
+    #f add_status
+    def add_status(self, cycle, valid, data, seed_complete):
+        """
+        Record a cycle of the simulation with data valid or seed complete
+        """
+        self.statuses.append((cycle+self.cycle_offset, valid, data, seed_complete))
+        pass
+    #f add_seeding
+    def add_seeding(self, cycle, lfsr, entropy, lfsrs):
+        """
+        Record a seeding log event of the simulation
+        """
+        self.seedings.append((cycle+self.cycle_offset, lfsr, entropy, tuple(lfsrs)))
+        pass
+    #f take
+    def take(self, events, end):
+        """
+        Remove and return the events before cycle end
+        """
+        taken = [e for e in events if e[0]<end]
+        events[:] = [e for e in events if e[0]>=end]
+        return taken
+    #f check
+    def check(self, entropy_in, seed_request, enable, min_valid, wide=None):
+        """
+        Check the recorded events for the next len(entropy_in) cycles,
+        given their input trace; return the first PrngDivergence (also
+        kept in self.divergence), or None
+        """
+        if self.divergence is not None: return self.divergence
+        start = self.checked
+        n = len(entropy_in)
+        expected = self.model.run(entropy_in, seed_request, enable, min_valid, wide)
+        self.checked += n
+        statuses = self.take(self.statuses, self.checked)
+        seedings = self.take(self.seedings, self.checked)
+        divergences = []
+        # Status: rebuild the simulation's per-cycle status from its events
+        got_valid = np.zeros(n, dtype=np.uint8)
+        got_sc    = np.zeros(n, dtype=np.uint8)
+        got_data  = np.zeros(n, dtype=np.uint8)
+        early = [s for s in statuses if s[0]<start]
+        if early: divergences.append(PrngDivergence(early[0][0], "status", "no event", early[0][1:]))
+        statuses = [s for s in statuses if s[0]>=start]
+        if statuses:
+            s = np.array(statuses, dtype=np.int64)
+            t = s[:,0] - start
+            got_valid[t] = s[:,1]
+            got_data[t]  = s[:,2]
+            got_sc[t]    = s[:,3]
+            pass
+        for (name, exp, got, mask) in (("prng_status.data.valid",    expected["data_valid"],    got_valid, None),
+                                       ("prng_status.seed_complete", expected["seed_complete"], got_sc,    None),
+                                       ("prng_status.data.data",     expected["data"],          got_data,  expected["data_valid"]!=0)):
+            bad = (exp!=got)
+            if mask is not None: bad &= mask
+            bad = np.flatnonzero(bad)
+            if len(bad)>0:
+                t = int(bad[0])
+                divergences.append(PrngDivergence(start+t, name, int(exp[t]), int(got[t])))
+                pass
+            pass
+        # Seedings, in order; the first whose LFSR states differ identifies the LFSR
+        exp_seedings = expected["seedings"]
+        agreed = []
+        lfsr = None
+        for i in range(max(len(seedings), len(exp_seedings))):
+            if i>=len(seedings):
+                divergences.append(PrngDivergence(exp_seedings[i][0], "seeding", exp_seedings[i], None))
+                break
+            if i>=len(exp_seedings):
+                divergences.append(PrngDivergence(seedings[i][0], "seeding", None, seedings[i]))
+                break
+            (e, g) = (exp_seedings[i], seedings[i])
+            if e==g:
+                agreed.append(e[0])
+                continue
+            if e[0]!=g[0]:
+                divergences.append(PrngDivergence(min(e[0],g[0]), "seeding cycle", e[0], g[0]))
+                break
+            if e[1:3]!=g[1:3]:
+                divergences.append(PrngDivergence(e[0], "seeding lfsr and entropy", e[1:3], g[1:3]))
+                break
+            lfsr = [l for l in range(4) if e[3][l]!=g[3][l]][0]
+            divergences.append(PrngDivergence(e[0], "seeding lfsr_%d"%lfsr, "0x%x"%e[3][lfsr], "0x%x"%g[3][lfsr], lfsr=lfsr))
+            break
+        if divergences:
+            d = min(divergences, key=lambda d:d.cycle)
+            # A status divergence is attributed to the LFSR that differs at the next seeding, if any
+            d.lfsr = lfsr
+            agreed = [c for c in agreed if c<d.cycle]
+            d.last_agreed = agreed[-1] if agreed else self.last_agreed
+            self.divergence = d
+            pass
+        elif agreed:
+            self.last_agreed = agreed[-1]
+            pass
+        return self.divergence
+    pass
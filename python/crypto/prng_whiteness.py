@@ -0,0 +1,498 @@
+#a Copyright
+#
+#  This file 'prng_whiteness.py' copyright Gavin J Stark 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#a Documentation
+"""
+Software models of the prng_whiteness_monitor CDL module.
+
+PrngWhitenessMonitorRef is a cycle-by-cycle transliteration of the
+CDL, including its request/ack handling; it is slow, and is the
+reference for the vectorized model.
+
+PrngWhitenessModel produces the same results from NumPy arrays of the
+per-cycle valid and data inputs, without per-cycle Python:
+
+  count bits     - sums of ones or of toggles
+  run length     - run boundaries by diff, and run lengths from them
+  template match - a sliding window hash of the last 10 bits; matches
+                   are all positions whose hash matches (overlapping),
+                   or a walk of the eligible matches (non-overlapping)
+  max excursions - the random walk by cumulative sum
+
+Only valid data bits within the run window change the monitor state.
+The valid and data inputs of a cycle are the lane masks of the
+t_prng_wide_data input (so one-bit data is lane 0 alone). Both models
+take the number of lanes that are monitored, which is the cfg_lanes of
+the CDL (1 by default, or 8 for prng_whiteness_monitor_8); the valid
+bits of those lanes in a cycle are monitored in turn, lane 0 first.
+The window starts in the cycle in which whiteness_result.ack is high,
+and is run_length+1 cycles long; if only valid data is counted, it
+ends with the cycle after the run_length'th valid cycle.
+
+The counters, internal counter and shift register are reset for each
+run, but the two status bits and the last data bit are not; the
+model keeps these between runs in the same way as the hardware.
+
+Some behaviours of the hardware are modelled as they are, rather
+than as the documentation of the CDL describes:
+
+  In count bits mode counter 3 is always zero (its 'inc_ext' loads
+  counter 2 plus one, which is zero when counter 2 is 0xffff)
+
+  In run length mode, for a run of L bits that ends in a toggle,
+  counter 0 is incremented if L-2 equals the configured counter
+  (modulo 4096) and counter 1 if L-3 is at least that; counters 2
+  and 3 are one less than the longest run of zeros and ones
+
+  Template matching is performed on the shift register before the
+  current bit is shifted in
+"""
+
+#a Imports
+import numpy as np
+
+#a Constants
+monitor_type_count_bits      = 0
+monitor_type_run_length      = 1
+monitor_type_template_match  = 2
+monitor_type_max_excursions  = 3
+
+#f whiteness_control_word
+def whiteness_control_word(mode, subtype=0, only_valid=0, data=0):
+    """
+    Build the 16-bit t_prng_whiteness_control.control value
+    """
+    return ((mode&3)<<14) | ((subtype&1)<<13) | ((only_valid&1)<<12) | (data&0xfff)
+
+#f concurrent_control_word
+def concurrent_control_word(monitor, control, run_length_parameter=0, template_parameter=0):
+    """
+    Return the 16-bit control used by concurrent monitor 'monitor' of
+    apb_target_prng, given the whiteness control and parameters it
+    was configured with; the monitor number is {type, subtype}, and
+    the run length and template match monitors take their data from
+    the parameters
+    """
+    data = control&0xfff
+    if monitor==2:      data = run_length_parameter&0xfff
+    if monitor in (4,5): data = template_parameter&0xfff
+    return ((monitor&7)<<13) | (control&0x1000) | data
+
+#f pack_result
+def pack_result(counters):
+    """
+    Pack four 16-bit counters in to the 64-bit whiteness result data
+    """
+    r = 0
+    for i in range(4):
+        r |= (counters[i]&0xffff) << (16*i)
+        pass
+    return r
+
+#f unpack_result
+def unpack_result(data):
+    """
+    Unpack 64-bit whiteness result data in to four 16-bit counters
+    """
+    return tuple((data>>(16*i))&0xffff for i in range(4))
+
+#a Reference model
+#c PrngWhitenessMonitorRef
+class PrngWhitenessMonitorRef(object):
+    """
+    Cycle-by-cycle model of prng_whiteness_monitor, following the CDL
+    statement by statement; clock() is one rising edge of the clock
+    """
+    #f __init__
+    def __init__(self, lanes=1):
+        self.lanes = lanes
+        self.last_data = 0
+        self.internal_counter = 0
+        self.status = 0
+        self.run_time_remaining = 0
+        self.ack = 0
+        self.active = 0
+        self.completed = 0
+        self.counters = [0,0,0,0]
+        self.control = 0
+        pass
+    #f result
+    def result(self):
+        """
+        Return (ack, valid, data) of the whiteness_result output
+        """
+        if self.completed: return (self.ack, 1, pack_result(self.counters))
+        return (self.ack, 0, 0)
+    #f actions
+    def actions(self, data):
+        """
+        Return (internal counter action, [counter actions], status_write, status_data)
+        for a valid data bit in the current state
+        """
+        control = self.control
+        monitor_type = (control>>14)&3
+        subtype      = (control>>13)&1
+        template     = (control>>4)&0xff
+        divider      = control&0xf
+        counter      = control&0xfff
+        ictr         = self.internal_counter
+        ctrs         = self.counters
+        status       = self.status
+        toggle       = (self.last_data != data)
+        ictr_eq_cfg      = (counter == (ictr&0xfff))
+        neg_ictr_eq_cfg  = (counter == ((~ictr)&0xfff))
+        ictr_eq_ctr2     = (ctrs[2] == ictr)
+        ictr_eq_ctr3     = (ctrs[3] == ictr)
+        neg_ictr_eq_ctr3 = (ctrs[3] == ((~ictr)&0xffff))
+        zero_crossing = (ictr==0)
+        sr = (ictr>>4)&0x3ff
+        mask = ((2<<divider)-1) if (1<=divider<=7) else 1
+        matches = 0
+        if ((sr>>2)&mask) == template: matches = 1<<(sr&3)
+        divide_by_N = ((ictr&0xf)==divider)
+        ictr_action = "hold"
+        ctr_actions = ["hold"]*4
+        status_write = 0
+        status_data = 0
+        if monitor_type==monitor_type_count_bits:
+            ctr_actions[0] = "inc"
+            ctr_actions[1] = "inc_ext"
+            if (toggle if subtype else data):
+                ctr_actions[2] = "inc"
+                ctr_actions[3] = "inc_ext"
+                pass
+            pass
+        elif monitor_type==monitor_type_run_length:
+            if toggle:
+                status_write = 3
+                status_data  = 0
+                if status&1: ctr_actions[0] = "inc"
+                if status&2: ctr_actions[1] = "inc"
+                ictr_action = "reset"
+                pass
+            else:
+                ictr_action = "inc"
+                status_write = 1
+                status_data  = 2
+                if ictr_eq_cfg: status_data |= 1
+                if status&1:    status_write |= 2
+                if ictr_eq_ctr2 and not data: ctr_actions[2] = "inc"
+                if ictr_eq_ctr3 and data:     ctr_actions[3] = "inc"
+                pass
+            pass
+        elif monitor_type==monitor_type_template_match:
+            ictr_action = "shift_and_divide"
+            if divide_by_N:
+                status_write |= 1
+                status_data  |= 1
+                pass
+            if status&1:
+                for i in range(4):
+                    if (matches>>i)&1: ctr_actions[i] = "inc"
+                    pass
+                if subtype and matches!=0:
+                    ctr_actions[0] = "inc"
+                    ictr_action = "shift_and_reset"
+                    status_write |= 1
+                    status_data  &= ~1
+                    pass
+                pass
+            pass
+        else:
+            ictr_action = "inc" if data else "dec"
+            if zero_crossing:
+                ctr_actions[0] = "inc"
+                ctr_actions[1] = "inc_ext"
+                status_write = 3
+                status_data  = 0
+                pass
+            if not subtype:
+                if ictr_eq_ctr2: ctr_actions[2] = "inc"
+                if neg_ictr_eq_ctr3 and not data: ctr_actions[3] = "inc"
+                pass
+            else:
+                if ictr_eq_cfg:
+                    status_write |= 1
+                    status_data  |= 1
+                    if not (status&1): ctr_actions[2] = "inc"
+                    pass
+                if neg_ictr_eq_cfg and not data:
+                    status_write |= 2
+                    status_data  |= 2
+                    if not (status&2): ctr_actions[3] = "inc"
+                    pass
+                pass
+            pass
+        return (ictr_action, ctr_actions, status_write, status_data)
+    #f step
+    def step(self, data):
+        """
+        Update the monitor state with one valid data bit
+        """
+        (ictr_action, ctr_actions, status_write, status_data) = self.actions(data)
+        ctrs = list(self.counters)
+        for i in range(4):
+            a = ctr_actions[i]
+            if a=="inc":   ctrs[i] = (self.counters[i]+1) & 0xffff
+            if a=="reset": ctrs[i] = 0
+            if a=="inc_ext" and self.counters[i-1]==0xffff:
+                # Counter 3 loads counter 2 plus one, as the CDL does
+                ctrs[i] = ((self.counters[1]+1) if i==1 else (self.counters[2]+1)) & 0xffff
+                pass
+            pass
+        ictr = self.internal_counter
+        if ictr_action=="reset": ictr = 0
+        if ictr_action=="inc":   ictr = (ictr+1) & 0xffff
+        if ictr_action=="dec":   ictr = (ictr-1) & 0xffff
+        if ictr_action in ["shift_and_divide", "shift_and_reset"]:
+            sr = ((((ictr>>4)&0x3ff)<<1) & 0x3fe) | (data&1)
+            cnt = ((ictr+1)&0xf) if ictr_action=="shift_and_divide" else 0
+            ictr = (ictr & 0xc000) | (sr<<4) | cnt
+            pass
+        self.status = (self.status & ~status_write) | (status_data & status_write)
+        self.counters = ctrs
+        self.internal_counter = ictr
+        self.last_data = data
+        pass
+    #f clock
+    def clock(self, valid, data, request=0, control=0, run_length=0):
+        """
+        Clock the monitor with the inputs for this cycle; valid and
+        data are lane masks, whose valid bits are monitored lane 0 first
+        """
+        valid &= (1<<self.lanes)-1
+        if valid and self.active:
+            for i in range(self.lanes):
+                if (valid>>i)&1: self.step((data>>i)&1)
+                pass
+            pass
+        if self.completed: self.completed = 0
+        if self.active:
+            if (not ((self.control>>12)&1)) or valid:
+                next_rtr = (self.run_time_remaining-1) & 0xffffffff
+                pass
+            else:
+                next_rtr = self.run_time_remaining
+                pass
+            self.ack = 0
+            self.completed = 0
+            if self.run_time_remaining==0:
+                next_rtr = 0
+                self.completed = 1
+                self.active = 0
+                pass
+            self.run_time_remaining = next_rtr
+            pass
+        elif request:
+            self.control = control
+            self.run_time_remaining = run_length
+            self.ack = 1
+            self.active = 1
+            self.internal_counter = 0
+            self.counters = [0,0,0,0]
+            pass
+        pass
+    pass
+
+#a Vectorized model
+#c PrngWhitenessModel
+class PrngWhitenessModel(object):
+    """
+    Vectorized model of prng_whiteness_monitor; status and last_data
+    are the state that persists from one run to the next
+    """
+    #f __init__
+    def __init__(self, status=0, last_data=0, lanes=1):
+        self.lanes = lanes
+        self.status = status
+        self.last_data = last_data
+        pass
+    #f window
+    @staticmethod
+    def window(control, run_length, valid):
+        """
+        Return the number of cycles in the run, given the valid array
+        of the cycles from the one with ack high
+        """
+        if not ((control>>12)&1): n = run_length+1
+        elif run_length==0: n = 1
+        else:
+            v = np.flatnonzero(valid)
+            if len(v)<run_length: raise Exception("Only %d valid cycles provided for run_length of %d"%(len(v), run_length))
+            n = int(v[run_length-1])+2
+            pass
+        if len(valid)<n: raise Exception("Run requires %d cycles but only %d provided"%(n, len(valid)))
+        return n
+    #f run
+    def run(self, control, run_length, valid, data):
+        """
+        Return the 64-bit result data of a run, given the valid and
+        data arrays (of lane masks) of the cycles starting with the one
+        with ack high
+        """
+        valid = np.asarray(valid).astype(np.uint8) & ((1<<self.lanes)-1)
+        data  = np.asarray(data).astype(np.uint8)
+        n = self.window(control, run_length, valid)
+        lanes = np.unpackbits(valid[:n,np.newaxis], axis=1, bitorder="little")
+        bits  = np.unpackbits(data[:n,np.newaxis],  axis=1, bitorder="little")
+        return pack_result(self.counters(control, bits[lanes!=0]))
+    #f counters
+    def counters(self, control, bits):
+        """
+        Return the four counters for a run over the valid data bits,
+        updating status and last_data
+        """
+        bits = np.asarray(bits, dtype=np.int8) & 1
+        if len(bits)==0: return (0,0,0,0)
+        monitor_type = (control>>14)&3
+        subtype      = (control>>13)&1
+        if monitor_type==monitor_type_count_bits:        r = self.count_bits(subtype, bits)
+        elif monitor_type==monitor_type_run_length:      r = self.run_length(control&0xfff, bits)
+        elif monitor_type==monitor_type_template_match:  r = self.template_match(subtype, (control>>4)&0xff, control&0xf, bits)
+        else:                                            r = self.max_excursions(subtype, control&0xfff, bits)
+        self.last_data = int(bits[-1])
+        return tuple(int(c)&0xffff for c in r)
+    #f count_bits
+    def count_bits(self, subtype, bits):
+        n = len(bits)
+        if subtype:
+            c = int(np.count_nonzero(np.diff(bits, prepend=np.int8(self.last_data))))
+            pass
+        else:
+            c = int(np.count_nonzero(bits))
+            pass
+        return (n, n>>16, c, 0)
+    #f run_length
+    def run_length(self, cfg, bits):
+        """
+        A run starts at a toggle; if the first bit matches last_data
+        then the first run continues from the previous run, with its
+        internal counter reset, so it acts as if it were one bit longer
+        """
+        starts = np.flatnonzero(np.diff(bits, prepend=np.int8(self.last_data)))
+        continued = (len(starts)==0) or (starts[0]!=0)
+        if continued: starts = np.concatenate(([0], starts))
+        lengths = np.diff(np.append(starts, len(bits)))
+        if continued: lengths[0] += 1
+        if lengths.max()>0xffff:
+            # Internal counter and counter 2/3 wrapping - not worth vectorizing
+            return self.counters_by_sample(monitor_type_run_length<<14 | cfg, bits)
+        status_0 = (lengths>=2) & (((lengths-2)&0xfff)==cfg)
+        status_1 = (lengths-3)>=cfg
+        if continued: status_1[0] |= (self.status!=0)
+        c0 = int(np.count_nonzero(status_0[:-1]))
+        c1 = int(np.count_nonzero(status_1[:-1]))
+        if not continued:
+            c0 += self.status&1
+            c1 += (self.status>>1)&1
+            pass
+        run_bits = bits[starts]
+        c2 = int(max(0, (lengths[run_bits==0]-1).max(initial=0)))
+        c3 = int(max(0, (lengths[run_bits==1]-1).max(initial=0)))
+        self.status = int(status_0[-1]) | (int(status_1[-1])<<1)
+        return (c0, c1, c2, c3)
+    #f template_match
+    def template_match(self, subtype, template, divider, bits):
+        """
+        The shift register before bit i holds bits i-1 (at bit 0) back
+        to i-10; it is a hash of the last ten bits, built by shifting
+        the bits padded with the zeros of the reset shift register
+        """
+        n = len(bits)
+        padded = np.concatenate((np.zeros(10, dtype=np.int32), bits.astype(np.int32)))
+        sr = np.zeros(n, dtype=np.int32)
+        for b in range(10):
+            sr |= padded[9-b:9-b+n] << b
+            pass
+        mask = ((2<<divider)-1) if (1<=divider<=7) else 1
+        matched = ((sr>>2)&mask) == template
+        matches = np.flatnonzero(matched)
+        status_0 = self.status&1
+        first = 0 if status_0 else divider+1
+        if not subtype:
+            counted = matches[matches>=first]
+            self.status |= 1 if (status_0 or n>=divider+1) else 0
+            pass
+        else:
+            # Walk the matches; after a counted match at r, the next is eligible at r+2+divider
+            positions = matches.tolist()
+            following = np.searchsorted(matches, matches+2+divider).tolist()
+            i = int(np.searchsorted(matches, first))
+            counted = []
+            while i<len(positions):
+                counted.append(positions[i])
+                i = following[i]
+                pass
+            counted = np.array(counted, dtype=np.int64)
+            eligible = (counted[-1]+2+divider) if len(counted)>0 else first
+            self.status = (self.status & ~1) | (1 if n>=eligible else 0)
+            if (len(counted)==0) and status_0: self.status |= 1
+            pass
+        j = sr[counted]&3
+        c = [int(np.count_nonzero(j==i)) for i in range(4)]
+        if subtype: c[0] = len(counted)
+        return tuple(c)
+    #f max_excursions
+    def max_excursions(self, subtype, cfg, bits):
+        """
+        The walk before bit i is the sum of +1/-1 of bits 0 to i-1
+        """
+        steps = 2*bits.astype(np.int64)-1
+        post = np.cumsum(steps)
+        pre = np.concatenate(([0], post[:-1]))
+        if max(int(post.max()), -int(post.min()), 1) >= 0x7ff0:
+            # Internal counter wrapping - not worth vectorizing
+            return self.counters_by_sample(monitor_type_max_excursions<<14 | subtype<<13 | cfg, bits)
+        zero = (pre==0)
+        nzero = int(np.count_nonzero(zero))
+        if not subtype:
+            c2 = int(pre.max()) + 1
+            c3 = max(0, -int(post.min()) - 1)
+            self.status = 0
+            return (nzero, nzero>>16, c2, c3)
+        hits_pos = (pre&0xfff)==cfg
+        hits_neg = ((pre&0xfff)==((~cfg)&0xfff)) & (bits==0)
+        counts = []
+        status = 0
+        for (i, hits) in enumerate((hits_pos, hits_neg)):
+            # Status bit is set by a hit, cleared by a zero crossing that is not a hit
+            events = hits | zero
+            index = np.where(events, np.arange(len(bits)), -1)
+            last_event = np.maximum.accumulate(index)
+            before = np.concatenate(([-1], last_event[:-1]))
+            set_before = np.where(before>=0, hits[np.maximum(before,0)], (self.status>>i)&1!=0)
+            counts.append(int(np.count_nonzero(hits & ~set_before)))
+            final = hits[last_event[-1]] if last_event[-1]>=0 else ((self.status>>i)&1)!=0
+            status |= int(final)<<i
+            pass
+        self.status = status
+        return (nzero, nzero>>16, counts[0], counts[1])
+    #f counters_by_sample
+    def counters_by_sample(self, control, bits):
+        """
+        Counters using the reference model one valid bit at a time
+        """
+        m = PrngWhitenessMonitorRef()
+        m.status = self.status
+        m.last_data = self.last_data
+        m.control = control
+        for b in bits.tolist():
+            m.step(b)
+            pass
+        self.status = m.status
+        return tuple(m.counters)
+    pass
@@ -0,0 +1,249 @@
+#a Copyright
+#
+#  This file 'sbox_search.py' copyright Gavin J Stark 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#a Documentation
+"""
+Search for good bijective sboxes by swapping pairs of entries, with
+simulated annealing (or hill climbing, at zero temperature).
+
+The score of an sbox is (differential uniformity, number of DDT
+entries at that value, linearity, number of Walsh entries at that
+magnitude), as per sbox_analysis; lower is better. A swap search
+needs the score of every candidate, so rather than rebuild the tables
+IncrementalSbox keeps the DDT and Walsh spectrum, and histograms of
+their values, up to date across each swap:
+
+* swapping S(i) and S(j) only changes the DDT contributions of the
+  pairs (x, x^a) with x in {i, i^a, j, j^a}, which is four entries per
+  difference a - O(2^n) rather than O(2^2n)
+
+* it changes W[a][b] by ((-1)^(a.i) - (-1)^(a.j)) ((-1)^(b.S(j)) -
+  (-1)^(b.S(i))), which is nonzero in only a quarter of the table
+
+and the histograms give the maxima and their counts directly. A
+rejected swap is undone by swapping back.
+
+Independent restarts (each from its own random permutation, or from a
+given sbox) are spread across a pool of processes.
+"""
+
+#a Imports
+import os
+import math
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from .sbox_analysis import ddt, walsh_spectrum, parity
+
+#a Incremental scoring
+#c IncrementalSbox
+class IncrementalSbox(object):
+    """
+    A bijective n-bit sbox with its DDT and Walsh spectrum maintained across swaps
+    """
+    #f __init__
+    def __init__(self, sbox):
+        self.s = np.array(list(sbox), dtype=np.int64)
+        self.size = len(self.s)
+        self.n = (self.size-1).bit_length()
+        if self.size != (1<<self.n): raise Exception("Sbox has %d entries, which is not a power of two"%self.size)
+        if sorted(self.s.tolist()) != list(range(self.size)): raise Exception("Sbox is not a permutation")
+        x = np.arange(self.size)
+        self.signs = (1 - 2*parity(x[:,None] & x[None,:])).astype(np.int64)
+        self.a = x[1:]
+        self.ddt = ddt(self.s, self.n)
+        self.walsh = walsh_spectrum(self.s, self.n)
+        self.ddt_hist   = np.bincount(self.ddt[1:,:].reshape(-1), minlength=self.size+1)
+        self.walsh_hist = np.bincount(np.abs(self.walsh[:,1:]).reshape(-1), minlength=self.size+1)
+        pass
+    #f sbox
+    def sbox(self):
+        return self.s.tolist()
+    #f score
+    def score(self):
+        """
+        Return (differential uniformity, count, linearity, count)
+        """
+        du  = int(np.flatnonzero(self.ddt_hist)[-1])
+        lin = int(np.flatnonzero(self.walsh_hist)[-1])
+        return (du, int(self.ddt_hist[du]), lin, int(self.walsh_hist[lin]))
+    #f ddt_pairs
+    def ddt_pairs(self, i, j):
+        """
+        Return (a, x) arrays of the pairs (x, x^a) whose DDT contribution a swap of i and j changes
+        """
+        a = self.a
+        xs = np.stack([np.full(len(a), i), i^a, np.full(len(a), j), j^a])
+        keep = np.ones(xs.shape, dtype=bool)
+        keep[2:, a==(i^j)] = False
+        aa = np.broadcast_to(a, xs.shape)
+        return (aa[keep], xs[keep])
+    #f update
+    def update(self, table, hist, rows, cols, delta):
+        """
+        Add delta to table[rows, cols] (which may repeat), keeping the value
+        histogram (of the absolute values) up to date
+        """
+        cells = rows*table.shape[1] + cols
+        (cells, inverse) = np.unique(cells, return_inverse=True)
+        delta = np.bincount(inverse, weights=delta).astype(np.int64)
+        changed = delta!=0
+        (cells, delta) = (cells[changed], delta[changed])
+        flat = table.reshape(-1)
+        old = flat[cells]
+        new = old + delta
+        flat[cells] = new
+        np.subtract.at(hist, np.abs(old), 1)
+        np.add.at(hist, np.abs(new), 1)
+        pass
+    #f swap
+    def swap(self, i, j):
+        """
+        Swap entries i and j of the sbox, updating the tables and histograms
+        """
+        if i==j: return
+        s = self.s
+        (a, x) = self.ddt_pairs(i, j)
+        old = s[x] ^ s[x^a]
+        (si, sj) = (int(s[i]), int(s[j]))
+        # Walsh terms change for rows where a.i != a.j, columns where b.S(i) != b.S(j)
+        rows = np.flatnonzero(self.signs[:,i] != self.signs[:,j])
+        cols = np.flatnonzero(self.signs[1:,si] != self.signs[1:,sj]) + 1
+        wdelta = 2 * (self.signs[rows,i][:,None] * (self.signs[cols,sj] - self.signs[cols,si])[None,:])
+        (s[i], s[j]) = (sj, si)
+        new = s[x] ^ s[x^a]
+        self.update(self.ddt, self.ddt_hist,
+                    np.concatenate([a, a]), np.concatenate([old, new]),
+                    np.concatenate([-np.ones(len(a)), np.ones(len(a))]))
+        (r, c) = np.meshgrid(rows, cols, indexing="ij")
+        self.update(self.walsh, self.walsh_hist, r.reshape(-1), c.reshape(-1), wdelta.reshape(-1))
+        pass
+    pass
+
+#a Search
+#f scalar_score
+def scalar_score(score, size, linear_weight=1.0):
+    """
+    Reduce a score tuple to a single cost for annealing; a step in
+    uniformity or linearity outweighs any change in the counts
+    """
+    (du, ndu, lin, nlin) = score
+    scale = size*size*2
+    return (du*scale + ndu) + linear_weight*(lin*scale + nlin)
+
+#f anneal
+def anneal(sbox=None, bits=8, iterations=10000, seed=0, temperature=0.0, cooling=0.999, linear_weight=1.0):
+    """
+    Run one annealing search from sbox (or a random permutation of
+    2^bits entries, from seed); returns (best score, best sbox)
+
+    The temperature is in units of the cost of scalar_score, and
+    decays by cooling per iteration; a temperature of zero is a
+    first-improvement hill climb.
+    """
+    rng = random.Random(seed)
+    if sbox is None:
+        sbox = list(range(1<<bits))
+        rng.shuffle(sbox)
+        pass
+    inc = IncrementalSbox(sbox)
+    size = inc.size
+    score = inc.score()
+    cost = scalar_score(score, size, linear_weight)
+    best = (score, inc.sbox())
+    best_cost = cost
+    for it in range(iterations):
+        i = rng.randrange(size)
+        j = rng.randrange(size-1)
+        if j>=i: j+=1
+        inc.swap(i, j)
+        new_score = inc.score()
+        new_cost = scalar_score(new_score, size, linear_weight)
+        accept = new_cost <= cost
+        if not accept and temperature>0:
+            accept = rng.random() < math.exp((cost-new_cost)/temperature)
+            pass
+        if accept:
+            (score, cost) = (new_score, new_cost)
+            if cost < best_cost:
+                best = (score, inc.sbox())
+                best_cost = cost
+                pass
+            pass
+        else:
+            inc.swap(i, j)
+            pass
+        temperature *= cooling
+        pass
+    return best
+
+#f search
+def search(sbox=None, bits=8, restarts=4, iterations=10000, seed=0, temperature=0.0, cooling=0.999, linear_weight=1.0, processes=None):
+    """
+    Run restarts independent anneal searches (with seeds seed, seed+1, ...)
+    across a pool of processes; return the list of their (score, sbox)
+    results, best first
+    """
+    if processes is None: processes = os.cpu_count() or 1
+    args = [(sbox, bits, iterations, seed+r, temperature, cooling, linear_weight) for r in range(restarts)]
+    if processes<=1:
+        results = [anneal(*a) for a in args]
+        pass
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(anneal, *zip(*args)))
+            pass
+        pass
+    results.sort(key=lambda r:scalar_score(r[0], len(r[1]), linear_weight))
+    return results
+
+#a Toplevel
+#f main
+def main(argv=None):
+    """
+    Command line entry point:
+
+    python -m crypto.sbox_search [--bits N | --start name] [--restarts N] [--iterations N] [--temperature T] [--processes N]
+    """
+    from .sbox_analysis import known_sboxes
+    sboxes = known_sboxes()
+    parser = argparse.ArgumentParser(prog="python -m crypto.sbox_search", description="Swap search for bijective sboxes")
+    parser.add_argument("--bits", type=int, default=8, help="Sbox width for random starting permutations")
+    parser.add_argument("--start", default=None, choices=list(sboxes.keys()), help="Start every restart from this sbox")
+    parser.add_argument("--restarts", type=int, default=4, help="Number of independent searches")
+    parser.add_argument("--iterations", type=int, default=10000, help="Swaps tried per search")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first search")
+    parser.add_argument("--temperature", type=float, default=0.0, help="Initial annealing temperature (0 for hill climbing)")
+    parser.add_argument("--cooling", type=float, default=0.999, help="Temperature decay per iteration")
+    parser.add_argument("--linear-weight", type=float, default=1.0, help="Weight of linearity relative to differential uniformity")
+    parser.add_argument("--processes", type=int, default=0, help="Number of processes (0 for one per CPU)")
+    args = parser.parse_args(argv)
+    results = search(sbox=(sboxes[args.start] if args.start else None), bits=args.bits,
+                     restarts=args.restarts, iterations=args.iterations, seed=args.seed,
+                     temperature=args.temperature, cooling=args.cooling, linear_weight=args.linear_weight,
+                     processes=(args.processes if args.processes>0 else None))
+    for (score, sbox) in results:
+        print("differential uniformity %d (%d entries) linearity %d (%d entries) nonlinearity %d"%(
+            score[0], score[1], score[2], score[3], (len(sbox)>>1)-(score[2]>>1)))
+        pass
+    (score, sbox) = results[0]
+    print("Best:", sbox)
+    pass
+
+if __name__=="__main__":
+    main()
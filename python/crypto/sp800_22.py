@@ -0,0 +1,565 @@
+#a Copyright
+#
+#  This file 'sp800_22.py' copyright Gavin J Stark 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#a Documentation
+"""
+Streaming NIST SP800-22r1a statistical tests.
+
+The tests are those that the whiteness monitor supports in hardware
+(see the comments in TbPrng_Base of test_prng_entropy.py):
+
+  frequency (monobit), frequency within a block, runs, longest run of
+  ones in a block, non-overlapping and overlapping template matching,
+  and cumulative sums (forward and reverse)
+
+Each test consumes a stream of bits as a sequence of NumPy arrays of
+0/1 values, in chunks of any size, and keeps only its running
+statistics plus at most one partial block; so memory use does not
+depend on the stream length. Each chunk is processed with NumPy.
+
+Where SP800-22 derives a block size from the total length, the block
+size is instead a parameter here (as the length of a stream is not
+known in advance).
+
+Bits may be provided from get_entropy words (words_bits), entropy or
+'01' files (file_bit_chunks), the PRNG model directly
+(prng_bit_chunks), the status log events of a simulation of the prng
+module (status_event_bits, as recorded by Prng_Base of
+test_prng_entropy.py), or any other source by calling update() on a
+Battery.
+"""
+
+#a Imports
+import math
+import argparse
+import numpy as np
+
+#a Special functions
+#f igamc
+def igamc(a, x):
+    """
+    Regularized upper incomplete gamma function Q(a,x), as used for
+    chi-squared p-values; series for x<a+1, continued fraction otherwise
+    """
+    if (x<=0) or (a<=0): return 1.0
+    lg = a*math.log(x) - x - math.lgamma(a)
+    if x<a+1:
+        term = 1.0/a
+        total = term
+        n = a
+        while True:
+            n += 1
+            term *= x/n
+            total += term
+            if abs(term)<abs(total)*1E-15: break
+            pass
+        return max(0.0, 1.0 - total*math.exp(lg))
+    tiny = 1E-300
+    b = x+1-a
+    c = 1/tiny
+    d = 1/b
+    h = d
+    i = 1
+    while True:
+        an = -i*(i-a)
+        b += 2
+        d = an*d + b
+        if abs(d)<tiny: d = tiny
+        c = b + an/c
+        if abs(c)<tiny: c = tiny
+        d = 1/d
+        delta = d*c
+        h *= delta
+        if abs(delta-1)<1E-15: break
+        i += 1
+        pass
+    return math.exp(lg)*h
+
+#f normal_cdf
+def normal_cdf(x):
+    return 0.5*math.erfc(-x/math.sqrt(2))
+
+#f chi_squared_p
+def chi_squared_p(counts, probabilities):
+    """
+    Return (chi^2, p) for observed category counts against probabilities
+    """
+    n = sum(counts)
+    if n==0: return (0.0, 1.0)
+    chi2 = 0.0
+    for (c,p) in zip(counts, probabilities):
+        chi2 += (c-n*p)**2 / (n*p)
+        pass
+    return (chi2, igamc((len(counts)-1)/2, chi2/2))
+
+#f sliding_windows
+def sliding_windows(bits, m):
+    """
+    Return the m-bit values (first bit most significant) of every
+    window of m bits in bits
+    """
+    n = len(bits)-m+1
+    w = np.zeros(max(n,0), dtype=np.int64)
+    for k in range(m):
+        w = (w<<1) | bits[k:k+n]
+        pass
+    return w
+
+#a Tests
+#c StreamTest
+class StreamTest(object):
+    """
+    Base class for a streaming test; update() is invoked with each chunk
+    of bits, and result() returns a dictionary including 'p_value'
+    (or 'p_values' for tests with more than one)
+    """
+    name = "test"
+    #f __init__
+    def __init__(self):
+        self.n = 0
+        pass
+    #f update
+    def update(self, bits):
+        self.n += len(bits)
+        pass
+    #f result
+    def result(self):
+        return {"n":self.n}
+    pass
+
+#c BlockStreamTest
+class BlockStreamTest(StreamTest):
+    """
+    Test operating on whole blocks of block_bits bits, carrying any
+    partial block on to the next chunk
+    """
+    block_bits = 128
+    #f __init__
+    def __init__(self, block_bits=None):
+        StreamTest.__init__(self)
+        if block_bits is not None: self.block_bits = block_bits
+        self.nblocks = 0
+        self.partial = np.zeros(0, dtype=np.uint8)
+        pass
+    #f update
+    def update(self, bits):
+        StreamTest.update(self, bits)
+        if len(self.partial)>0: bits = np.concatenate((self.partial, bits))
+        nblocks = len(bits) // self.block_bits
+        if nblocks>0:
+            self.update_blocks(bits[:nblocks*self.block_bits].reshape(nblocks, self.block_bits))
+            self.nblocks += nblocks
+            pass
+        self.partial = bits[nblocks*self.block_bits:].copy()
+        pass
+    #f update_blocks
+    def update_blocks(self, blocks):
+        pass
+    pass
+
+#c Frequency
+class Frequency(StreamTest):
+    """
+    SP800-22 2.1: frequency (monobit) test
+    """
+    name = "frequency"
+    #f __init__
+    def __init__(self):
+        StreamTest.__init__(self)
+        self.ones = 0
+        pass
+    #f update
+    def update(self, bits):
+        StreamTest.update(self, bits)
+        self.ones += int(np.count_nonzero(bits))
+        pass
+    #f result
+    def result(self):
+        s = 2*self.ones - self.n
+        s_obs = abs(s)/math.sqrt(max(self.n,1))
+        return {"n":self.n, "sum":s, "p_value":math.erfc(s_obs/math.sqrt(2))}
+    pass
+
+#c BlockFrequency
+class BlockFrequency(BlockStreamTest):
+    """
+    SP800-22 2.2: frequency test within a block
+    """
+    name = "block_frequency"
+    block_bits = 128
+    #f __init__
+    def __init__(self, block_bits=None):
+        BlockStreamTest.__init__(self, block_bits)
+        self.sum_squares = 0.0
+        pass
+    #f update_blocks
+    def update_blocks(self, blocks):
+        pi = blocks.sum(axis=1, dtype=np.int64) / self.block_bits
+        self.sum_squares += float(((pi-0.5)**2).sum())
+        pass
+    #f result
+    def result(self):
+        chi2 = 4 * self.block_bits * self.sum_squares
+        return {"n":self.n, "blocks":self.nblocks, "chi2":chi2, "p_value":igamc(self.nblocks/2, chi2/2)}
+    pass
+
+#c Runs
+class Runs(StreamTest):
+    """
+    SP800-22 2.3: runs test
+    """
+    name = "runs"
+    #f __init__
+    def __init__(self):
+        StreamTest.__init__(self)
+        self.ones = 0
+        self.toggles = 0
+        self.last = None
+        pass
+    #f update
+    def update(self, bits):
+        if len(bits)==0: return
+        StreamTest.update(self, bits)
+        self.ones += int(np.count_nonzero(bits))
+        self.toggles += int(np.count_nonzero(bits[1:]!=bits[:-1]))
+        if (self.last is not None) and (self.last!=bits[0]): self.toggles += 1
+        self.last = bits[-1]
+        pass
+    #f result
+    def result(self):
+        n = max(self.n, 1)
+        pi = self.ones / n
+        v_obs = self.toggles + 1
+        r = {"n":self.n, "runs":v_obs, "p_value":0.0}
+        if abs(pi-0.5) >= 2/math.sqrt(n): return r
+        r["p_value"] = math.erfc(abs(v_obs - 2*n*pi*(1-pi)) / (2*math.sqrt(2*n)*pi*(1-pi)))
+        return r
+    pass
+
+#c LongestRunOfOnes
+class LongestRunOfOnes(BlockStreamTest):
+    """
+    SP800-22 2.4: longest run of ones in a block; the block size must
+    be one of 8, 128 or 10000 (for streams of at least 128, 6272 and
+    750000 bits respectively)
+    """
+    name = "longest_run"
+    block_bits = 10000
+    categories = { 8:     (1, 4,  (0.2148, 0.3672, 0.2305, 0.1875)),
+                   128:   (4, 9,  (0.1174, 0.2430, 0.2493, 0.1752, 0.1027, 0.1124)),
+                   10000: (10,16, (0.0882, 0.2092, 0.2483, 0.1933, 0.1208, 0.0675, 0.0727)),
+    }
+    #f __init__
+    def __init__(self, block_bits=None):
+        BlockStreamTest.__init__(self, block_bits)
+        if self.block_bits not in self.categories: raise Exception("Block size for longest run must be one of %s"%(str(list(self.categories.keys()))))
+        (self.low, self.high, self.probabilities) = self.categories[self.block_bits]
+        self.counts = [0]*len(self.probabilities)
+        pass
+    #f update_blocks
+    def update_blocks(self, blocks):
+        ones = np.cumsum(blocks, axis=1, dtype=np.int32)
+        at_zero = np.maximum.accumulate(np.where(blocks==0, ones, 0), axis=1)
+        longest = (ones - at_zero).max(axis=1)
+        c = np.bincount(np.clip(longest, self.low, self.high) - self.low, minlength=len(self.counts))
+        for i in range(len(self.counts)):
+            self.counts[i] += int(c[i])
+            pass
+        pass
+    #f result
+    def result(self):
+        (chi2, p) = chi_squared_p(self.counts, self.probabilities)
+        return {"n":self.n, "blocks":self.nblocks, "counts":list(self.counts), "chi2":chi2, "p_value":p}
+    pass
+
+#c NonOverlappingTemplate
+class NonOverlappingTemplate(BlockStreamTest):
+    """
+    SP800-22 2.7: non-overlapping template matching, for a template
+    given as a string of 0s and 1s, in blocks of block_bits
+    """
+    name = "non_overlapping_template"
+    block_bits = 1<<20
+    #f __init__
+    def __init__(self, template="000000001", block_bits=None):
+        BlockStreamTest.__init__(self, block_bits)
+        self.template = template
+        self.m = len(template)
+        self.value = int(template, 2)
+        self.periodic = any(template[s:]==template[:self.m-s] for s in range(1,self.m))
+        self.sum_squares = 0.0
+        m = self.m
+        self.mean = (self.block_bits-m+1) / 2**m
+        self.variance = self.block_bits * (1/2**m - (2*m-1)/2**(2*m))
+        pass
+    #f update_blocks
+    def update_blocks(self, blocks):
+        (nblocks, M) = blocks.shape
+        windows = sliding_windows(blocks.reshape(-1).astype(np.int64), self.m)
+        matches = np.flatnonzero(windows==self.value)
+        matches = matches[(matches % M) <= M-self.m]
+        if self.periodic:
+            # Matches may overlap, so walk them; a match at r makes
+            # the next eligible at r+m (which is never in a later block)
+            positions = matches.tolist()
+            following = np.searchsorted(matches, matches+self.m).tolist()
+            counted = []
+            i = 0
+            while i<len(positions):
+                counted.append(positions[i])
+                i = following[i]
+                pass
+            matches = np.array(counted, dtype=np.int64)
+            pass
+        w = np.bincount(matches // M, minlength=nblocks)
+        self.sum_squares += float((((w-self.mean)**2)/self.variance).sum())
+        pass
+    #f result
+    def result(self):
+        chi2 = self.sum_squares
+        return {"n":self.n, "blocks":self.nblocks, "template":self.template, "chi2":chi2, "p_value":igamc(self.nblocks/2, chi2/2)}
+    pass
+
+#c OverlappingTemplate
+class OverlappingTemplate(BlockStreamTest):
+    """
+    SP800-22 2.8: overlapping template matching, for a template of m
+    ones in blocks of 1032 bits
+    """
+    name = "overlapping_template"
+    block_bits = 1032
+    probabilities = (0.364091, 0.185659, 0.139381, 0.100571, 0.070432, 0.139865)
+    #f __init__
+    def __init__(self, m=9):
+        BlockStreamTest.__init__(self, None)
+        self.m = m
+        self.value = (1<<m)-1
+        if m!=9:
+            # SP800-22 section 3.8 approximation; the table above is for m=9 only
+            eta = (self.block_bits-m+1) / 2**m / 2
+            p = [math.exp(-eta)]
+            for u in range(1,5):
+                s = sum(math.comb(u-1,l-1) * eta**l / math.factorial(l) for l in range(1,u+1))
+                p.append(math.exp(-eta) * s / 2**u)
+                pass
+            p.append(1-sum(p))
+            self.probabilities = tuple(p)
+            pass
+        self.counts = [0]*6
+        pass
+    #f update_blocks
+    def update_blocks(self, blocks):
+        (nblocks, M) = blocks.shape
+        windows = sliding_windows(blocks.reshape(-1).astype(np.int64), self.m)
+        matches = np.flatnonzero(windows==self.value)
+        matches = matches[(matches % M) <= M-self.m]
+        w = np.bincount(matches // M, minlength=nblocks)
+        c = np.bincount(np.minimum(w, 5), minlength=6)
+        for i in range(6):
+            self.counts[i] += int(c[i])
+            pass
+        pass
+    #f result
+    def result(self):
+        (chi2, p) = chi_squared_p(self.counts, self.probabilities)
+        return {"n":self.n, "blocks":self.nblocks, "counts":list(self.counts), "chi2":chi2, "p_value":p}
+    pass
+
+#c CumulativeSums
+class CumulativeSums(StreamTest):
+    """
+    SP800-22 2.13: cumulative sums, forward and reverse; the reverse
+    maximum is max|S_n - S_k|, found from the extremes of the partial
+    sums without storing them
+    """
+    name = "cumulative_sums"
+    #f __init__
+    def __init__(self):
+        StreamTest.__init__(self)
+        self.total = 0
+        self.max_sum = 0
+        self.min_sum = 0
+        pass
+    #f update
+    def update(self, bits):
+        if len(bits)==0: return
+        StreamTest.update(self, bits)
+        s = self.total + np.cumsum(2*bits.astype(np.int64)-1)
+        self.max_sum = max(self.max_sum, int(s.max()))
+        self.min_sum = min(self.min_sum, int(s.min()))
+        self.total = int(s[-1])
+        pass
+    #f p_value
+    @staticmethod
+    def p_value(n, z):
+        if z==0: return 1.0
+        rn = math.sqrt(n)
+        p = 1.0
+        for k in range(math.trunc((-n/z+1)/4), math.trunc((n/z-1)/4)+1):
+            p -= normal_cdf((4*k+1)*z/rn) - normal_cdf((4*k-1)*z/rn)
+            pass
+        for k in range(math.trunc((-n/z-3)/4), math.trunc((n/z-1)/4)+1):
+            p += normal_cdf((4*k+3)*z/rn) - normal_cdf((4*k+1)*z/rn)
+            pass
+        return p
+    #f result
+    def result(self):
+        z_forward = max(self.max_sum, -self.min_sum)
+        z_reverse = max(self.total-self.min_sum, self.max_sum-self.total)
+        return {"n":self.n, "z":(z_forward, z_reverse),
+                "p_values":(self.p_value(self.n, z_forward), self.p_value(self.n, z_reverse))}
+    pass
+
+#a Battery
+#c Battery
+class Battery(object):
+    """
+    A set of streaming tests fed with the same bits
+    """
+    #f __init__
+    def __init__(self, tests=None):
+        if tests is None:
+            tests = [Frequency(), BlockFrequency(), Runs(), LongestRunOfOnes(),
+                     NonOverlappingTemplate(), OverlappingTemplate(), CumulativeSums()]
+            pass
+        self.tests = tests
+        pass
+    #f update
+    def update(self, bits):
+        bits = np.asarray(bits, dtype=np.uint8)
+        for t in self.tests:
+            t.update(bits)
+            pass
+        pass
+    #f run
+    def run(self, chunks):
+        for c in chunks:
+            self.update(c)
+            pass
+        return self.results()
+    #f results
+    def results(self):
+        return [(t.name, t.result()) for t in self.tests]
+    #f report
+    def report(self, alpha=0.01):
+        """
+        Return a list of text lines of the results
+        """
+        lines = []
+        for (name, r) in self.results():
+            ps = r["p_values"] if "p_values" in r else (r["p_value"],)
+            verdict = "PASS" if min(ps)>=alpha else "FAIL"
+            lines.append("%-26s n=%-12d p=%-24s %s"%(name, r["n"], ",".join("%.6f"%p for p in ps), verdict))
+            pass
+        return lines
+    pass
+
+#a Bit sources
+#f words_bits
+def words_bits(words, bits_per_word=32):
+    """
+    Bits of an array of uint32 words (as get_entropy produces), first
+    (most significant) bit of each word first
+    """
+    b = np.unpackbits(np.asarray(words, dtype=">u4").view(np.uint8).reshape(-1,4), axis=1)
+    return b[:, 32-bits_per_word:].reshape(-1)
+
+#f status_event_bits
+def status_event_bits(events):
+    """
+    Bits of the status log events of a simulation of the prng module,
+    given as (cycle, valid, data, seed_complete) tuples in order (as
+    PrngScoreboard.add_status takes them): the data bit of each event
+    with valid set, which is the (one bit) data output of the prng
+    """
+    ev = np.asarray(events, dtype=np.int64).reshape(-1,4)
+    return (ev[ev[:,1]!=0, 2] & 1).astype(np.uint8)
+
+#f file_bit_chunks
+def file_bit_chunks(filename, ascii=False, chunk_bytes=1<<22):
+    """
+    Generator of bit chunks from a file as assess reads it: binary
+    bytes most significant bit first, or ASCII '0' and '1' characters
+    """
+    with open(filename, "rb") as f:
+        while True:
+            data = f.read(chunk_bytes)
+            if len(data)==0: break
+            b = np.frombuffer(data, dtype=np.uint8)
+            if ascii:
+                yield (b[(b==ord("0")) | (b==ord("1"))] - ord("0")).astype(np.uint8)
+                pass
+            else:
+                yield np.unpackbits(b)
+                pass
+            pass
+        pass
+    pass
+
+#f prng_bit_chunks
+def prng_bit_chunks(seed, min_valid=2, bits_per_line=32, attempts_per_line=64, nbits=1000*1000, lines_per_chunk=65536):
+    """
+    Generator of bit chunks of nbits from the PRNG model, as
+    get_entropy would produce them, without storing the stream
+    """
+    from .prng import Prng
+    from .prng_numpy import entropy_chunks
+    p = Prng(min_valid=min_valid)
+    p.seed(seed)
+    for c in entropy_chunks(p, bits_per_line=bits_per_line, attempts_per_line=attempts_per_line, lines_per_chunk=lines_per_chunk):
+        b = words_bits(c, bits_per_line)[:nbits]
+        nbits -= len(b)
+        yield b
+        if nbits<=0: break
+        pass
+    pass
+
+#a Toplevel
+#f main
+def main(argv=None):
+    """
+    Command line entry point:
+
+    python -m crypto.sp800_22 --file <filename> [--ascii]
+    python -m crypto.sp800_22 [--min-valid N]* [--cycles-per-bit N] [--bits N]
+    """
+    parser = argparse.ArgumentParser(prog="python -m crypto.sp800_22", description="Streaming SP800-22 tests of PRNG output")
+    parser.add_argument("--file", help="Test a file (binary, as assess reads) rather than the PRNG model")
+    parser.add_argument("--ascii", action="store_true", help="File is ASCII 0s and 1s")
+    parser.add_argument("--seed", default="The quick brown fox jumps over the lazy dog", help="Seed for the PRNG model")
+    parser.add_argument("--min-valid", type=int, action="append", default=[], help="PRNG min_valid to test; may be repeated (default 1 to 4)")
+    parser.add_argument("--cycles-per-bit", type=int, default=6, help="PRNG cycles per bit")
+    parser.add_argument("--bits-per-line", type=int, default=32, help="PRNG bits per line")
+    parser.add_argument("--bits", type=int, default=1000*1000, help="Number of bits of PRNG output to test")
+    parser.add_argument("--alpha", type=float, default=0.01, help="Significance level")
+    args = parser.parse_args(argv)
+
+    if args.file is not None:
+        battery = Battery()
+        battery.run(file_bit_chunks(args.file, ascii=args.ascii))
+        print("\n".join([args.file] + battery.report(args.alpha)))
+        return
+    for min_valid in (args.min_valid if args.min_valid else [1,2,3,4]):
+        battery = Battery()
+        battery.run(prng_bit_chunks(args.seed, min_valid=min_valid, bits_per_line=args.bits_per_line,
+                                    attempts_per_line=args.bits_per_line*args.cycles_per_bit//2, nbits=args.bits))
+        print("\n".join(["min_valid %d"%min_valid] + battery.report(args.alpha)))
+        pass
+    pass
+
+if __name__=="__main__":
+    main()
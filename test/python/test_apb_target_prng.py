@@ -24,6 +24,8 @@ from random import Random
 from regress.apb.structs import t_apb_request, t_apb_response
 from regress.apb.bfm     import ApbMaster
 from regress.crypto      import apb_target_prng
+from regress.crypto.apb_target_prng_model import PrngVirtualDevice
+from regress.crypto.prng_whiteness import whiteness_control_word, unpack_result
 from cdl.sim     import ThExecFile, LogEventParser
 from cdl.sim     import HardwareThDut
 from cdl.sim     import TestCase
@@ -86,6 +88,231 @@ class PrngTest_0(PrngTestBase):
         pass
     pass
 
+#c PrngTest_1
+class PrngTest_1(PrngTestBase):
+    """
+    Read random data and whiteness results at the data rate of the
+    hardware, using the driver
+    """
+    nwords = 64
+    #f run
+    def run(self):
+        driver = apb_target_prng.PrngDriver(self, self.apb, self.prng_map)
+        driver.configure(min_valid=2)
+        words = driver.read_random(self.nwords)
+        ones = sum(bin(w).count("1") for w in words)
+        # Within six standard deviations of half of the bits
+        nbits = 32*self.nwords
+        if abs(2*ones-nbits) > 6*(nbits**0.5):
+            self.failtest("Random data has %d ones in %d bits"%(ones, nbits))
+            pass
+        self.compare_expected("Distinct random words", len(words), len(set(words)))
+        self.verbose.info("Read %d words with %d status polls"%(len(words), driver.polls))
+        driver.set_min_valid(3)
+        words = driver.read_random(self.nwords//4)
+        # Bursts of back-to-back reads once the FIFO has filled to the watermark
+        driver.configure(min_valid=2, watermark=12)
+        for i in range(4):
+            driver.wait_fifo()
+            words = driver.read_random(12)
+            self.compare_expected("Distinct random words in burst", len(words), len(set(words)))
+            pass
+        for i in range(4):
+            result = driver.whiteness(control=whiteness_control_word(mode=0), run_length=0x1000)
+            self.verbose.info("whiteness %016x"%result)
+            pass
+        pass
+    pass
+
+#c PrngTest_2
+class PrngTest_2(PrngTestBase):
+    """
+    Run all the whiteness monitor types at once (for hardware with the
+    concurrent monitors), and check that they saw the same data
+    """
+    run_length = 0x1000
+    #f run
+    def run(self):
+        driver = apb_target_prng.PrngDriver(self, self.apb, self.prng_map)
+        driver.configure(min_valid=2)
+        control = whiteness_control_word(mode=0, only_valid=1, data=40)
+        for i in range(2):
+            start = self.global_cycle()
+            results = driver.whiteness_concurrent(self.run_length, control=control,
+                                                  run_length_parameter=3, template_parameter=(0x9<<4)|3)
+            self.verbose.info("Concurrent whiteness took %d cycles"%(self.global_cycle()-start))
+            counters = dict((m,unpack_result(r)) for (m,r) in results.items())
+            for m in apb_target_prng.concurrent_monitors:
+                self.verbose.info("whiteness monitor %d %s"%(m, str(counters[m])))
+                pass
+            # The window includes the cycle after the run_length'th valid data
+            self.compare_expected("Valid data bits counted by monitor 0", True, counters[0][0] in (self.run_length, self.run_length+1))
+            self.compare_expected("Valid data bits counted by monitor 1", counters[0][0], counters[1][0])
+            self.compare_expected("Zero crossings of monitor 7", counters[6][0], counters[7][0])
+            nbits = counters[0][0]
+            if abs(2*counters[0][2]-nbits) > 6*(nbits**0.5):
+                self.failtest("Whiteness data has %d ones in %d bits"%(counters[0][2], nbits))
+                pass
+            pass
+        pass
+    pass
+
+#c PrngTest_3
+class PrngTest_3(PrngTestBase):
+    """
+    Run the health tests of the PRNG data (which should pass) and of
+    entropy_in (which is held at zero, so should fail), and check that
+    the alarms gate the random data until they are cleared
+    """
+    #f run
+    def run(self):
+        driver = apb_target_prng.PrngDriver(self, self.apb, self.prng_map)
+        driver.configure(min_valid=2)
+        driver.configure_health("prng")
+        words = driver.read_random(32)
+        self.compare_expected("Health alarms of PRNG data", 0, driver.health_alarms())
+
+        driver.configure_health("entropy")
+        self.bfm_wait(100)
+        self.compare_expected("Repetition count alarm of constant entropy_in", 1, driver.health_alarms())
+        status = driver.read("status")
+        self.compare_expected("Data gated by entropy_in alarm", driver.status_data_gated | driver.status_health_alarm,
+                              status & (driver.status_data_gated | driver.status_health_alarm | driver.status_data_valid))
+        self.compare_expected("Random data read while gated", 0, driver.read("prng_data"))
+        self.bfm_wait(1024)
+        self.compare_expected("Both alarms of constant entropy_in", 3, driver.health_alarms())
+
+        driver.configure_health("entropy", enable=0)
+        driver.clear_health_alarms()
+        self.compare_expected("Health alarms after clearing", 0, driver.health_alarms())
+        words = driver.read_random(8)
+        self.compare_expected("Distinct random words after clearing", len(words), len(set(words)))
+        pass
+    pass
+
+#c PrngTest_4
+class PrngTest_4(PrngTestBase):
+    """
+    Fill the FIFO to the watermark and stop capture; check that the
+    FIFO level in the status drops by one for each word read, and that
+    it reaches zero after that many words
+    """
+    watermark = 12
+    #f run
+    def run(self):
+        driver = apb_target_prng.PrngDriver(self, self.apb, self.prng_map)
+        driver.configure(min_valid=2, watermark=self.watermark)
+        driver.wait_fifo()
+        driver.configure(min_valid=2, watermark=self.watermark, capture=0)
+        self.bfm_wait(10)
+        level = driver.fifo_level(driver.read("status"))
+        self.compare_expected("FIFO level at least the watermark", True, level>=self.watermark)
+        words = []
+        for i in range(level):
+            self.compare_expected("FIFO level after %d words read"%i, level-i, driver.fifo_level(driver.read("status")))
+            words.append(driver.read("prng_data"))
+            pass
+        self.compare_expected("Distinct random words read", level, len(set(words)))
+        status = driver.read("status")
+        self.compare_expected("FIFO level after all words read", 0, driver.fifo_level(status))
+        self.compare_expected("Data valid after all words read", 0, status & driver.status_data_valid)
+        self.compare_expected("Random data read from empty FIFO", 0, driver.read("prng_data"))
+        pass
+    pass
+
+#c PrngTest_5
+class PrngTest_5(PrngTestBase):
+    """
+    Run the health tests of the PRNG data in wide mode; the random data
+    should pass them. Then, with an adaptive proportion cutoff of 1 (so
+    that every window of 1024 tested bits fails at its start), check
+    that the windows pass at more than one bit per cycle, which they
+    cannot if only lane 0 of the wide data is tested
+    """
+    windows = 8
+    #f run
+    def run(self):
+        driver = apb_target_prng.PrngDriver(self, self.apb, self.prng_map)
+        driver.configure(min_valid=2, wide=2)
+        driver.configure_health("prng")
+        words = driver.read_random(32)
+        self.compare_expected("Health alarms of wide PRNG data", 0, driver.health_alarms())
+        self.compare_expected("Distinct random words", len(words), len(set(words)))
+
+        proportion_alarm = 1<<apb_target_prng.csr_field_offsets(apb_target_prng.HealthStatusCsr)["prng_proportion"]
+        driver.configure_health("prng", gate=0, repetition=0, proportion=1)
+        driver.clear_health_alarms()
+        alarm_cycles = []
+        start = self.global_cycle()
+        while len(alarm_cycles)<=self.windows:
+            if driver.health_alarms() & proportion_alarm:
+                alarm_cycles.append(self.global_cycle())
+                driver.clear_health_alarms()
+                pass
+            if self.global_cycle()-start > 2*1024*self.windows: break
+            pass
+        self.compare_expected("Windows started", self.windows+1, len(alarm_cycles))
+        if len(alarm_cycles)>self.windows:
+            cycles = alarm_cycles[-1] - alarm_cycles[0]
+            self.verbose.info("%d windows of 1024 tested bits in %d cycles"%(self.windows, cycles))
+            self.compare_expected("%d windows of 1024 tested bits in fewer than %d cycles"%(self.windows, 1024*self.windows), True, cycles < 1024*self.windows)
+            pass
+        driver.configure_health("prng", enable=0)
+        pass
+    pass
+
+#c PrngTest_6
+class PrngTest_6(PrngTestBase):
+    """
+    Perform the same configuration through the driver on the hardware
+    and on the virtual device, and check that their registers match
+    once the FIFO has filled, while entropy_in health alarms gate the
+    data, after they are cleared, and after the configuration is locked
+    """
+    registers = ("config", "status", "prng_config", "whiteness_control", "whiteness_run_length",
+                 "health_entropy_config", "health_prng_config", "health_status")
+    fill_cycles = 4000
+    #f compare_registers
+    def compare_registers(self, reason):
+        for r in self.registers:
+            self.compare_expected("%s: %s of device and hardware"%(reason, r), self.model.read(r), self.dut.read(r))
+            pass
+        pass
+    #f wait
+    def wait(self, cycles):
+        self.bfm_wait(cycles)
+        self.device.bfm_wait(cycles)
+        pass
+    #f run
+    def run(self):
+        self.device = PrngVirtualDevice(prng_map=self.prng_map)
+        self.dut   = apb_target_prng.PrngDriver(self, self.apb, self.prng_map)
+        self.model = apb_target_prng.PrngDriver(self.device, self.device, self.prng_map)
+        drivers = (self.dut, self.model)
+        self.compare_registers("After reset")
+
+        for d in drivers: d.configure(min_valid=2, watermark=8)
+        for d in drivers: d.write("whiteness_run_length", 0x100)
+        self.wait(self.fill_cycles)
+        self.compare_registers("FIFO full")
+
+        for d in drivers: d.configure_health("entropy")
+        self.wait(2048)
+        self.compare_registers("Gated by entropy_in alarms")
+
+        for d in drivers: d.configure_health("entropy", enable=0)
+        for d in drivers: d.clear_health_alarms()
+        self.wait(self.fill_cycles)
+        self.compare_registers("Alarms cleared")
+
+        for d in drivers: d.configure(min_valid=3, watermark=12, lock=1)
+        for d in drivers: d.configure(min_valid=1, watermark=4)
+        for d in drivers: d.configure_health("prng")
+        self.wait(self.fill_cycles)
+        self.compare_registers("Locked")
+        pass
+    pass
+
 #a Hardware classes
 #c ApbTargetPrngHw
 class ApbTargetPrngHw(HardwareThDut):
@@ -100,6 +327,11 @@ class ApbTargetPrngHw(HardwareThDut):
     }
     pass
 
+#c ApbTargetPrngConcurrentHw
+class ApbTargetPrngConcurrentHw(ApbTargetPrngHw):
+    module_name = "apb_target_prng_concurrent"
+    pass
+
 #a Simulation test classes
 #c ApbTargetPrng
 class ApbTargetPrng(TestCase):
@@ -111,6 +343,18 @@ class ApbTargetPrng(TestCase):
     }
     _tests = {
         "smoke"  :  (PrngTest_0,50*1000,  kwargs),
+        "driver" :  (PrngTest_1,100*1000, kwargs),
+        "health" :  (PrngTest_3,100*1000, kwargs),
+        "fifo_level" :  (PrngTest_4,50*1000, kwargs),
+        "wide_health" :  (PrngTest_5,100*1000, kwargs),
+        "virtual_device" :  (PrngTest_6,100*1000, kwargs),
     }
     pass
 
+#c ApbTargetPrngConcurrent
+class ApbTargetPrngConcurrent(ApbTargetPrng):
+    hw = ApbTargetPrngConcurrentHw
+    _tests = {
+        "concurrent" :  (PrngTest_2,100*1000, ApbTargetPrng.kwargs),
+    }
+    pass
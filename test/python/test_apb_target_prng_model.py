@@ -0,0 +1,169 @@
+#a Copyright
+#
+#  This file 'test_apb_target_prng_model.py' copyright Gavin J Stark 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#a Documentation
+"""
+Tests of the PrngDriver flows against PrngVirtualDevice, in Python
+only (no simulation); test_apb_target_prng checks the device against
+the hardware
+"""
+
+#a Imports
+import unittest
+from regress.crypto import apb_target_prng
+from regress.crypto.apb_target_prng_model import PrngVirtualDevice
+from regress.crypto.prng_whiteness import whiteness_control_word, unpack_result
+
+#a Test classes
+#c PrngVirtualDeviceDriver
+class PrngVirtualDeviceDriver(unittest.TestCase):
+    """
+    Run the driver flows of test_apb_target_prng on the virtual device
+    """
+    #f setUp
+    def setUp(self):
+        self.device = PrngVirtualDevice()
+        self.driver = apb_target_prng.PrngDriver(self.device, self.device, self.device.prng_map)
+        pass
+    #f test_configure
+    def test_configure(self):
+        driver = self.driver
+        driver.configure(min_valid=3, watermark=12, wide=1)
+        self.assertEqual(driver.read("config"), (1<<1) | (12<<8))
+        self.assertEqual(driver.read("prng_config"), 1 | (1<<1) | (3<<4))
+        driver.configure(min_valid=2, lock=1)
+        driver.configure(min_valid=1, watermark=4)
+        driver.configure_health("prng")
+        self.assertEqual(driver.read("config"), 1 | (1<<1))
+        self.assertEqual(driver.read("prng_config"), 1 | (2<<4))
+        self.assertEqual(driver.read("health_prng_config"), 0)
+        pass
+    #f test_read_random
+    def test_read_random(self):
+        driver = self.driver
+        driver.configure(min_valid=2)
+        words = driver.read_random(64)
+        ones = sum(bin(w).count("1") for w in words)
+        nbits = 32*len(words)
+        self.assertLess(abs(2*ones-nbits), 6*(nbits**0.5))
+        self.assertEqual(len(words), len(set(words)))
+        driver.set_min_valid(3)
+        self.assertEqual(len(driver.read_random(16)), 16)
+        driver.configure(min_valid=2, watermark=12)
+        for i in range(4):
+            driver.wait_fifo()
+            self.assertGreaterEqual(driver.fifo_level(driver.read("status")), 12)
+            words = driver.read_random(12)
+            self.assertEqual(len(words), len(set(words)))
+            pass
+        pass
+    #f test_fifo_level
+    def test_fifo_level(self):
+        driver = self.driver
+        driver.configure(min_valid=2, watermark=12)
+        driver.wait_fifo()
+        driver.configure(min_valid=2, watermark=12, capture=0)
+        self.device.bfm_wait(10)
+        level = driver.fifo_level(driver.read("status"))
+        self.assertGreaterEqual(level, 12)
+        for i in range(level):
+            self.assertEqual(driver.fifo_level(driver.read("status")), level-i)
+            driver.read("prng_data")
+            pass
+        status = driver.read("status")
+        self.assertEqual(driver.fifo_level(status), 0)
+        self.assertEqual(status & driver.status_data_valid, 0)
+        self.assertEqual(driver.read("prng_data"), 0)
+        pass
+    #f test_whiteness
+    def test_whiteness(self):
+        driver = self.driver
+        driver.configure(min_valid=2)
+        run_length = 0x1000
+        for i in range(2):
+            counters = unpack_result(driver.whiteness(control=whiteness_control_word(mode=0, only_valid=1), run_length=run_length))
+            # The window includes the cycle after the run_length'th valid data
+            self.assertIn(counters[0], (run_length, run_length+1))
+            self.assertLess(abs(2*counters[2]-counters[0]), 6*(counters[0]**0.5))
+            pass
+        pass
+    #f test_wide_whiteness
+    def test_wide_whiteness(self):
+        run_length = 1000
+        control = whiteness_control_word(mode=0, only_valid=1)
+        bits = {}
+        for lanes in (1, 8):
+            device = type("PrngVirtualDevice%d"%lanes, (PrngVirtualDevice,), {"whiteness_lanes":lanes})()
+            driver = apb_target_prng.PrngDriver(device, device, device.prng_map)
+            driver.configure(min_valid=2, wide=2)
+            counters = unpack_result(driver.whiteness(control=control, run_length=run_length))
+            bits[lanes] = counters[0] | (counters[1]<<16)
+            pass
+        # The window is run_length cycles with a monitored valid bit; one monitored lane has one bit in each
+        self.assertIn(bits[1], (run_length, run_length+1))
+        # Each valid lane of the wide data (about 70% of them) has a bit for an eight lane monitor
+        self.assertGreater(bits[8], 4*run_length)
+        self.assertLessEqual(bits[8], 8*(run_length+1))
+        pass
+    #f test_health
+    def test_health(self):
+        driver = self.driver
+        driver.configure(min_valid=2)
+        driver.configure_health("prng")
+        driver.read_random(32)
+        self.assertEqual(driver.health_alarms(), 0)
+
+        driver.configure_health("entropy")
+        self.device.bfm_wait(100)
+        self.assertEqual(driver.health_alarms(), 1)
+        status = driver.read("status")
+        self.assertEqual(status & (driver.status_data_gated | driver.status_health_alarm | driver.status_data_valid),
+                         driver.status_data_gated | driver.status_health_alarm)
+        self.assertEqual(driver.read("prng_data"), 0)
+        self.assertRaises(Exception, driver.read_random, 1)
+        self.device.bfm_wait(1024)
+        self.assertEqual(driver.health_alarms(), 3)
+
+        driver.configure_health("entropy", enable=0)
+        driver.clear_health_alarms()
+        self.assertEqual(driver.health_alarms(), 0)
+        words = driver.read_random(8)
+        self.assertEqual(len(words), len(set(words)))
+        pass
+    #f test_wide_health
+    def test_wide_health(self):
+        driver = self.driver
+        driver.configure(min_valid=2, wide=2)
+        driver.configure_health("prng")
+        driver.read_random(32)
+        self.assertEqual(driver.health_alarms(), 0)
+        # Every window of 1024 tested bits fails at its start; more than one bit is tested per cycle
+        proportion_alarm = 1<<apb_target_prng.csr_field_offsets(apb_target_prng.HealthStatusCsr)["prng_proportion"]
+        driver.configure_health("prng", gate=0, repetition=0, proportion=1)
+        driver.clear_health_alarms()
+        alarm_cycles = []
+        start = self.device.global_cycle()
+        while (len(alarm_cycles)<=8) and (self.device.global_cycle()-start < 2*8*1024):
+            if driver.health_alarms() & proportion_alarm:
+                alarm_cycles.append(self.device.global_cycle())
+                driver.clear_health_alarms()
+                pass
+            pass
+        self.assertEqual(len(alarm_cycles), 9)
+        self.assertLess(alarm_cycles[-1]-alarm_cycles[0], 8*1024)
+        pass
+    pass
@@ -0,0 +1,329 @@
+#a Copyright
+#
+#  This file 'test_kasumi_accelerator.py' copyright Gavin J Stark 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#a Documentation
+"""
+Tests of kasumi_accelerator; operations of every kind (f8, f9, f8_f9
+encrypt and decrypt, and cipher_stream) for all of the streams are
+presented with their request words interleaved, and every response is
+checked (by tag) against the accelerator model, with back-pressure on
+acceleration_response_ack; the words of each stream are also presented
+in turn, to check the cost of the head-of-line blocking of requests,
+and accelerators with other numbers of streams are tested
+"""
+
+#a Imports
+from random import Random
+from regress.crypto.kasumi_accelerator import KasumiAcceleratorModel, operation_requests
+from regress.crypto.kasumi_accelerator import t_kasumi_acceleration_request, t_kasumi_acceleration_response
+from regress.crypto.kasumi_accelerator import kasumi_op_shift_key, kasumi_op_set_auth_data, kasumi_op_cipher_stream, kasumi_op_f8_cipher
+from regress.crypto.kasumi_accelerator import kasumi_op_f9_mac_0, kasumi_op_f9_mac_1, kasumi_op_f9
+from regress.crypto.kasumi_accelerator import kasumi_op_f8_f9_encrypt_0, kasumi_op_f8_f9_encrypt_1, kasumi_op_f8_f9_decrypt_0, kasumi_op_f8_f9_decrypt_1
+from cdl.sim     import ThExecFile
+from cdl.sim     import HardwareThDut
+from cdl.sim     import TestCase
+
+from typing import List, Tuple, Dict, Optional
+
+#a Test classes
+#c KasumiAccelerator_Base
+class KasumiAccelerator_Base(ThExecFile):
+    """
+    For each stream, load a key and then present num_operations
+    operations, with tags whose bottom bits select the stream; the
+    request words of the streams are interleaved at random, and each
+    is presented with probability request_probability in a cycle.
+
+    Each response is acknowledged with probability ack_probability;
+    the responses are recorded and checked at the end against those of
+    the model, in order for each tag.
+
+    If cycles_per_cipher_operation is set then the time from the first
+    request to the last response is checked against it.
+    """
+    num_streams = 4
+    num_operations = 4
+    ops = [kasumi_op_cipher_stream, kasumi_op_f8_cipher,
+           kasumi_op_f9_mac_0, kasumi_op_f9_mac_1, kasumi_op_f9,
+           kasumi_op_f8_f9_encrypt_0, kasumi_op_f8_f9_encrypt_1,
+           kasumi_op_f8_f9_decrypt_0, kasumi_op_f8_f9_decrypt_1]
+    lengths = [1, 17, 62, 63, 64, 65, 126, 127, 128, 190, 191, 192, 300]
+    request_probability = 1.0
+    ack_probability = 1.0
+    cycles_per_cipher_operation = None
+    #f run__init - invoked by submodules
+    def run__init(self):
+        self.acceleration_request__valid.drive(0)
+        self.acceleration_response_ack.drive(0)
+        self.bfm_wait(10)
+        pass
+    #f operation
+    def operation(self, random, op, tag):
+        """
+        Return the request words of an operation on tag
+        """
+        length = random.choice(self.lengths)
+        if op==kasumi_op_f9: length = 64*((length+63)//64)
+        words = [random.getrandbits(64) for i in range((length+63)//64)]
+        data = random.getrandbits(64)
+        if op==kasumi_op_cipher_stream:
+            return operation_requests(op, tag, length, data)
+        requests = []
+        if op in (kasumi_op_f8_f9_encrypt_0, kasumi_op_f8_f9_encrypt_1, kasumi_op_f8_f9_decrypt_0, kasumi_op_f8_f9_decrypt_1):
+            requests += operation_requests(kasumi_op_set_auth_data, tag, data=random.getrandbits(64))
+            pass
+        return requests + operation_requests(op, tag, length, data, words)
+    #f stream_requests
+    def stream_requests(self, random):
+        """
+        Return the list, for each stream, of its request words
+        """
+        stream_requests = []
+        for s in range(self.num_streams):
+            requests = []
+            requests += operation_requests(kasumi_op_shift_key, s, data=random.getrandbits(64))
+            requests += operation_requests(kasumi_op_shift_key, s, data=random.getrandbits(64))
+            for i in range(self.num_operations):
+                tag = s + self.num_streams*random.randrange(16//self.num_streams)
+                requests += self.operation(random, random.choice(self.ops), tag)
+                pass
+            stream_requests.append(requests)
+            pass
+        return stream_requests
+    #f interleave
+    def interleave(self, random, stream_requests):
+        """
+        Interleave the request words of the streams at random, keeping
+        the order of the words of each stream
+        """
+        stream_requests = [list(r) for r in stream_requests]
+        requests = []
+        while True:
+            streams = [s for s in range(len(stream_requests)) if stream_requests[s]]
+            if not streams: break
+            requests.append(stream_requests[random.choice(streams)].pop(0))
+            pass
+        return requests
+    #f by_tag
+    def by_tag(self, responses):
+        """
+        Return a dictionary of tag to the list of (last, data) responses for the tag
+        """
+        result = {}
+        for (tag, last, data) in responses:
+            if tag not in result: result[tag] = []
+            result[tag].append((last, data))
+            pass
+        return result
+    #f run
+    def run(self):
+        random = Random()
+        random.seed("KasumiAccelerator_%d_%s_%s"%(self.num_operations, self.request_probability, self.ack_probability))
+        requests = self.interleave(random, self.stream_requests(random))
+        model = KasumiAcceleratorModel(self.num_streams)
+        expected = model.run(requests)
+        pending = list(requests)
+        responses = []
+        start = self.global_cycle()
+        while len(responses)<len(expected):
+            request_ack = self.acceleration_request_ack.value()
+            response_valid = self.acceleration_response__valid.value()
+            self.acceleration_request__valid.drive(0)
+            presented = pending and (random.random() < self.request_probability)
+            if presented:
+                (op, tag, length, data) = pending[0]
+                self.acceleration_request__valid.drive(1)
+                self.acceleration_request__op.drive(op)
+                self.acceleration_request__tag.drive(tag)
+                self.acceleration_request__length.drive(length)
+                self.acceleration_request__data.drive(data)
+                pass
+            response_ack = (random.random() < self.ack_probability)
+            self.acceleration_response_ack.drive(1 if response_ack else 0)
+            if response_valid and response_ack:
+                responses.append((self.acceleration_response__tag.value(),
+                                  self.acceleration_response__last.value(),
+                                  self.acceleration_response__data.value()))
+                pass
+            self.bfm_wait(1)
+            if presented and request_ack: pending.pop(0)
+            if self.global_cycle()-start > 1000 + 200*model.cipher_operations: break
+            pass
+        cycles = self.global_cycle()-start
+        self.acceleration_request__valid.drive(0)
+        self.acceleration_response_ack.drive(0)
+        self.compare_expected("All request words taken", 0, len(pending))
+        self.compare_expected("Responses of all operations (by tag)", self.by_tag(expected), self.by_tag(responses))
+        if self.cycles_per_cipher_operation is not None:
+            self.verbose.info("%d cycles for %d cipher operations"%(cycles, model.cipher_operations))
+            self.compare_expected("Cycles within %d per cipher operation"%self.cycles_per_cipher_operation,
+                                  True, cycles <= self.cycles_per_cipher_operation*model.cipher_operations)
+            pass
+        pass
+    #f run__finalize
+    def run__finalize(self):
+        self.bfm_wait_until_test_done(100)
+        self.passtest("Test completed")
+        pass
+    pass
+
+#c KasumiAccelerator_0
+class KasumiAccelerator_0(KasumiAccelerator_Base):
+    """
+    Operations of all kinds, presented and acknowledged as fast as possible
+    """
+    pass
+
+#c KasumiAccelerator_1
+class KasumiAccelerator_1(KasumiAccelerator_Base):
+    """
+    Back-pressure on the responses, and gaps in the requests
+    """
+    num_operations = 8
+    request_probability = 0.7
+    ack_probability = 0.3
+    pass
+
+#c KasumiAccelerator_2
+class KasumiAccelerator_2(KasumiAccelerator_Base):
+    """
+    f9 operations whose last data word has 62, 63 or 64 bits, so that
+    direction and the padding 1 are added to the last data word, split
+    over the last data word and an extra block, or in an extra block
+    """
+    num_operations = 8
+    ops = [kasumi_op_f9_mac_0, kasumi_op_f9_mac_1,
+           kasumi_op_f8_f9_encrypt_0, kasumi_op_f8_f9_encrypt_1,
+           kasumi_op_f8_f9_decrypt_0, kasumi_op_f8_f9_decrypt_1]
+    lengths = [62, 63, 64, 126, 127, 128, 190, 191, 192]
+    ack_probability = 0.5
+    pass
+
+#c KasumiAccelerator_3
+class KasumiAccelerator_3(KasumiAccelerator_Base):
+    """
+    The request words of each stream in turn, so that a word for a
+    stream that is not ready for it holds up the words for the others
+    (head-of-line blocking); the cipher should still be kept busy by
+    the f8 and f9 chains of the stream
+    """
+    num_operations = 8
+    cycles_per_cipher_operation = 28
+    #f interleave
+    def interleave(self, random, stream_requests):
+        return sum(stream_requests, [])
+    pass
+
+#c KasumiAccelerator_4
+class KasumiAccelerator_4(KasumiAccelerator_Base):
+    """
+    Interleaved operations for a single stream accelerator; every
+    request is for stream 0
+    """
+    num_streams = 1
+    ack_probability = 0.5
+    pass
+
+#c KasumiAccelerator_5
+class KasumiAccelerator_5(KasumiAccelerator_Base):
+    """
+    Interleaved operations for a two stream accelerator
+    """
+    num_streams = 2
+    ack_probability = 0.5
+    pass
+
+#c KasumiAccelerator_6
+class KasumiAccelerator_6(KasumiAccelerator_Base):
+    """
+    Interleaved operations for an eight stream accelerator
+    """
+    num_streams = 8
+    num_operations = 2
+    ack_probability = 0.5
+    pass
+
+#a Hardware classes
+#c KasumiAcceleratorHw
+class KasumiAcceleratorHw(HardwareThDut):
+    clock_desc = [("clk",(0,1,1)),
+    ]
+    reset_desc   = {"name":"reset_n", "init_value":0, "wait":5}
+    module_name  = "kasumi_accelerator"
+    dut_inputs   = {"acceleration_request":t_kasumi_acceleration_request,
+                    "acceleration_response_ack":1,
+    }
+    dut_outputs  = {"acceleration_response":t_kasumi_acceleration_response,
+                    "acceleration_request_ack":1,
+    }
+    pass
+
+#c KasumiAccelerator1Hw
+class KasumiAccelerator1Hw(KasumiAcceleratorHw):
+    module_name = "kasumi_accelerator_1"
+    pass
+
+#c KasumiAccelerator2Hw
+class KasumiAccelerator2Hw(KasumiAcceleratorHw):
+    module_name = "kasumi_accelerator_2"
+    pass
+
+#c KasumiAccelerator8Hw
+class KasumiAccelerator8Hw(KasumiAcceleratorHw):
+    module_name = "kasumi_accelerator_8"
+    pass
+
+#a Simulation test classes
+#c KasumiAccelerator
+class KasumiAccelerator(TestCase):
+    hw = KasumiAcceleratorHw
+    kwargs = {
+        # "verbosity":0,
+        "th_args":{
+        },
+    }
+    _tests = {
+        "smoke"          :  (KasumiAccelerator_0,40*1000,  kwargs),
+        "back_pressure"  :  (KasumiAccelerator_1,100*1000,  kwargs),
+        "f9_padding"     :  (KasumiAccelerator_2,100*1000,  kwargs),
+        "head_of_line"   :  (KasumiAccelerator_3,100*1000,  kwargs),
+    }
+    pass
+
+#c KasumiAccelerator1
+class KasumiAccelerator1(KasumiAccelerator):
+    hw = KasumiAccelerator1Hw
+    _tests = {
+        "streams_1"  :  (KasumiAccelerator_4,100*1000,  KasumiAccelerator.kwargs),
+    }
+    pass
+
+#c KasumiAccelerator2
+class KasumiAccelerator2(KasumiAccelerator):
+    hw = KasumiAccelerator2Hw
+    _tests = {
+        "streams_2"  :  (KasumiAccelerator_5,100*1000,  KasumiAccelerator.kwargs),
+    }
+    pass
+
+#c KasumiAccelerator8
+class KasumiAccelerator8(KasumiAccelerator):
+    hw = KasumiAccelerator8Hw
+    _tests = {
+        "streams_8"  :  (KasumiAccelerator_6,100*1000,  KasumiAccelerator.kwargs),
+    }
+    pass
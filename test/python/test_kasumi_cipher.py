@@ -0,0 +1,190 @@
+#a Copyright
+#
+#  This file 'test_kasumi_cipher.py' copyright Gavin J Stark 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#a Documentation
+"""
+Tests of the single Kasumi cipher cores in tb_kasumi_cipher, built
+with kasumi_cipher_pair_3 and with kasumi_cipher_3; every result is
+checked in order against the Kasumi model, with back-pressure on
+kasumi_output_ack, and the block latency of kasumi_cipher_pair_3 is
+checked without back-pressure
+"""
+
+#a Imports
+from random import Random
+from regress.crypto.kasumi import kasumi_cipher, t_kasumi_input, t_kasumi_output
+from cdl.sim     import ThExecFile
+from cdl.sim     import HardwareThDut
+from cdl.sim     import TestCase
+
+from typing import List, Tuple, Dict, Optional
+
+#a Test classes
+#c KasumiCipher_Base
+class KasumiCipher_Base(ThExecFile):
+    """
+    Present num_blocks blocks, as fast as they are taken, with keys from
+    a set of num_keys; acknowledge each output with probability
+    ack_probability, record the results, and check them all at the end
+
+    If cycles_per_block is given then it is checked that, without
+    back-pressure, blocks are taken every cycles_per_block cycles,
+    and that each result is valid in the cycle after the last of those
+    cycles
+    """
+    num_blocks = 32
+    num_keys = 2
+    ack_probability = 1.0
+    cycles_per_block : Optional[int] = None
+    #f run__init - invoked by submodules
+    def run__init(self):
+        self.kasumi_input__valid.drive(0)
+        self.kasumi_output_ack.drive(0)
+        self.bfm_wait(10)
+        pass
+    #f blocks
+    def blocks(self, random):
+        """
+        Return the list of (data, k0, k1) blocks to cipher
+        """
+        keys = [(random.getrandbits(64), random.getrandbits(64)) for i in range(self.num_keys)]
+        return [(random.getrandbits(64),)+random.choice(keys) for i in range(self.num_blocks)]
+    #f run
+    def run(self):
+        random = Random()
+        random.seed("KasumiCipher_%d_%s"%(self.num_blocks, self.ack_probability))
+        blocks = self.blocks(random)
+        pending = list(blocks)
+        results = []
+        taken_cycles = []
+        result_cycles = []
+        start = self.global_cycle()
+        while len(results)<len(blocks):
+            input_ack = self.kasumi_input_ack.value()
+            output_valid = self.kasumi_output__valid.value()
+            self.kasumi_input__valid.drive(0)
+            if pending:
+                (data, k0, k1) = pending[0]
+                self.kasumi_input__valid.drive(1)
+                self.kasumi_input__data.drive(data)
+                self.kasumi_input__k0.drive(k0)
+                self.kasumi_input__k1.drive(k1)
+                pass
+            output_ack = (random.random() < self.ack_probability)
+            self.kasumi_output_ack.drive(1 if output_ack else 0)
+            if output_valid and output_ack:
+                results.append(self.kasumi_output__data.value())
+                result_cycles.append(self.global_cycle())
+                pass
+            if pending and input_ack:
+                taken_cycles.append(self.global_cycle())
+                pass
+            self.bfm_wait(1)
+            if pending and input_ack: pending.pop(0)
+            if self.global_cycle()-start > 1000 + 200*len(blocks): break
+            pass
+        self.kasumi_input__valid.drive(0)
+        self.kasumi_output_ack.drive(0)
+        expected = [kasumi_cipher(data, k0, k1) for (data, k0, k1) in blocks]
+        self.compare_expected("Results of all blocks (in order)", expected, results)
+        if self.cycles_per_block is not None:
+            intervals = set(taken_cycles[i+1]-taken_cycles[i] for i in range(len(taken_cycles)-1))
+            self.compare_expected("Cycles between blocks taken", set([self.cycles_per_block]), intervals)
+            latencies = set(r-t for (r, t) in zip(result_cycles, taken_cycles))
+            self.compare_expected("Cycles from block taken to result valid", set([self.cycles_per_block+1]), latencies)
+            pass
+        pass
+    #f run__finalize
+    def run__finalize(self):
+        self.bfm_wait_until_test_done(100)
+        self.passtest("Test completed")
+        pass
+    pass
+
+#c KasumiCipherPair3_0
+class KasumiCipherPair3_0(KasumiCipher_Base):
+    """
+    kasumi_cipher_pair_3 takes 12 cycles per block
+    """
+    cycles_per_block = 12
+    pass
+
+#c KasumiCipher_1
+class KasumiCipher_1(KasumiCipher_Base):
+    """
+    Back-pressure on the output, so that results are completed while
+    the previous result is still held
+    """
+    num_blocks = 64
+    ack_probability = 0.3
+    pass
+
+#c KasumiCipher_2
+class KasumiCipher_2(KasumiCipher_Base):
+    """
+    Long stalls of the output, with results completed well before the
+    previous result is taken
+    """
+    num_blocks = 64
+    num_keys = 5
+    ack_probability = 0.03
+    pass
+
+#a Hardware classes
+#c TbKasumiCipherPair3Hw
+class TbKasumiCipherPair3Hw(HardwareThDut):
+    clock_desc = [("clk",(0,1,1)),
+    ]
+    reset_desc   = {"name":"reset_n", "init_value":0, "wait":5}
+    module_name  = "tb_kasumi_cipher_pair_3"
+    dut_inputs   = {"kasumi_input":t_kasumi_input,
+                    "kasumi_output_ack":1,
+    }
+    dut_outputs  = {"kasumi_output":t_kasumi_output,
+                    "kasumi_input_ack":1,
+    }
+    pass
+
+#c TbKasumiCipher3Hw
+class TbKasumiCipher3Hw(TbKasumiCipherPair3Hw):
+    module_name  = "tb_kasumi_cipher_3"
+    pass
+
+#a Simulation test classes
+#c KasumiCipherPair3
+class KasumiCipherPair3(TestCase):
+    hw = TbKasumiCipherPair3Hw
+    kwargs = {
+        # "verbosity":0,
+        "th_args":{
+        },
+    }
+    _tests = {
+        "smoke"          :  (KasumiCipherPair3_0,10*1000,  kwargs),
+        "back_pressure"  :  (KasumiCipher_1,20*1000,  kwargs),
+        "stalls"         :  (KasumiCipher_2,40*1000,  kwargs),
+    }
+    pass
+
+#c KasumiCipher3
+class KasumiCipher3(KasumiCipherPair3):
+    hw = TbKasumiCipher3Hw
+    _tests = {
+        "back_pressure_3"  :  (KasumiCipher_1,20*1000,  KasumiCipherPair3.kwargs),
+        "stalls_3"         :  (KasumiCipher_2,40*1000,  KasumiCipherPair3.kwargs),
+    }
+    pass
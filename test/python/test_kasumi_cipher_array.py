@@ -0,0 +1,193 @@
+#a Copyright
+#
+#  This file 'test_kasumi_cipher_array.py' copyright Gavin J Stark 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#a Documentation
+"""
+Tests of kasumi_cipher_array, built with 1, 2, 4 and 8 cores; every
+result is checked (by tag) against the Kasumi model, and the
+throughput in blocks per cycle is measured
+"""
+
+#a Imports
+from random import Random
+from regress.crypto.kasumi import kasumi_cipher, t_kasumi_tagged_input, t_kasumi_tagged_output
+from cdl.sim     import ThExecFile
+from cdl.sim     import HardwareThDut
+from cdl.sim     import TestCase
+
+from typing import List, Tuple, Dict, Optional
+
+#a Test classes
+#c KasumiArray_Base
+class KasumiArray_Base(ThExecFile):
+    """
+    Present num_blocks blocks, as fast as they are taken, with keys from
+    a set of num_keys; record the results, and check them all at the
+    end
+    """
+    num_cores = 4
+    num_blocks = 64
+    num_keys = 2
+    #f run__init - invoked by submodules
+    def run__init(self):
+        self.kasumi_input__valid.drive(0)
+        self.kasumi_output_ack.drive(1)
+        self.bfm_wait(10)
+        pass
+    #f blocks
+    def blocks(self):
+        """
+        Return the list of (tag, data, k0, k1) blocks to cipher
+        """
+        random = Random()
+        random.seed("KasumiArray_%d"%self.num_blocks)
+        keys = [(random.getrandbits(64), random.getrandbits(64)) for i in range(self.num_keys)]
+        return [(i&0xff, random.getrandbits(64))+random.choice(keys) for i in range(self.num_blocks)]
+    #f run
+    def run(self):
+        blocks = self.blocks()
+        pending = list(blocks)
+        results = []
+        start = self.global_cycle()
+        while len(results)<len(blocks):
+            ack = self.kasumi_input_ack.value()
+            self.kasumi_input__valid.drive(0)
+            if pending:
+                (tag, data, k0, k1) = pending[0]
+                self.kasumi_input__valid.drive(1)
+                self.kasumi_input__tag.drive(tag)
+                self.kasumi_input__data.drive(data)
+                self.kasumi_input__k0.drive(k0)
+                self.kasumi_input__k1.drive(k1)
+                pass
+            if self.kasumi_output__valid.value():
+                results.append((self.kasumi_output__tag.value(), self.kasumi_output__data.value()))
+                pass
+            self.bfm_wait(1)
+            if pending and ack: pending.pop(0)
+            if self.global_cycle()-start > 100*len(blocks): break
+            pass
+        cycles = self.global_cycle()-start
+        self.kasumi_input__valid.drive(0)
+        expected = sorted([(tag, kasumi_cipher(data, k0, k1)) for (tag, data, k0, k1) in blocks])
+        self.compare_expected("Results of all blocks (by tag)", expected, sorted(results))
+        blocks_per_cycle = len(results) / float(cycles)
+        self.verbose.info("%d cores: %d blocks in %d cycles, %.4f blocks/cycle"%(self.num_cores, len(results), cycles, blocks_per_cycle))
+        # Each core takes 26 cycles per block; allow for the first and last blocks
+        self.compare_expected("Throughput of at least 80%% of %d blocks per 26 cycles"%self.num_cores, True, blocks_per_cycle >= 0.8 * self.num_cores / 26.0)
+        pass
+    #f run__finalize
+    def run__finalize(self):
+        self.bfm_wait_until_test_done(100)
+        self.passtest("Test completed")
+        pass
+    pass
+
+#c KasumiArray_1
+class KasumiArray_1(KasumiArray_Base):
+    num_cores = 1
+    pass
+
+#c KasumiArray_2
+class KasumiArray_2(KasumiArray_Base):
+    num_cores = 2
+    pass
+
+#c KasumiArray_4
+class KasumiArray_4(KasumiArray_Base):
+    num_cores = 4
+    pass
+
+#c KasumiArray_8
+class KasumiArray_8(KasumiArray_Base):
+    num_cores = 8
+    pass
+
+#c KasumiArray_4_long
+class KasumiArray_4_long(KasumiArray_4):
+    num_blocks = 1000
+    num_keys = 5
+    pass
+
+#a Hardware classes
+#c KasumiArrayHw
+class KasumiArrayHw(HardwareThDut):
+    clock_desc = [("clk",(0,1,1)),
+    ]
+    reset_desc   = {"name":"reset_n", "init_value":0, "wait":5}
+    module_name  = "kasumi_cipher_array_4"
+    dut_inputs   = {"kasumi_input":t_kasumi_tagged_input,
+                    "kasumi_output_ack":1,
+    }
+    dut_outputs  = {"kasumi_output":t_kasumi_tagged_output,
+                    "kasumi_input_ack":1,
+    }
+    pass
+
+#c KasumiArray1Hw
+class KasumiArray1Hw(KasumiArrayHw):
+    module_name = "kasumi_cipher_array_1"
+    pass
+
+#c KasumiArray2Hw
+class KasumiArray2Hw(KasumiArrayHw):
+    module_name = "kasumi_cipher_array_2"
+    pass
+
+#c KasumiArray8Hw
+class KasumiArray8Hw(KasumiArrayHw):
+    module_name = "kasumi_cipher_array_8"
+    pass
+
+#a Simulation test classes
+#c KasumiArray
+class KasumiArray(TestCase):
+    hw = KasumiArrayHw
+    kwargs = {
+        # "verbosity":0,
+        "th_args":{
+        },
+    }
+    _tests = {
+        "smoke"  :  (KasumiArray_4,10*1000,  kwargs),
+        "long"   :  (KasumiArray_4_long,40*1000,  kwargs),
+    }
+    pass
+
+#c KasumiArray1
+class KasumiArray1(KasumiArray):
+    hw = KasumiArray1Hw
+    _tests = {
+        "throughput_1"  :  (KasumiArray_1,10*1000,  KasumiArray.kwargs),
+    }
+    pass
+
+#c KasumiArray2
+class KasumiArray2(KasumiArray):
+    hw = KasumiArray2Hw
+    _tests = {
+        "throughput_2"  :  (KasumiArray_2,10*1000,  KasumiArray.kwargs),
+    }
+    pass
+
+#c KasumiArray8
+class KasumiArray8(KasumiArray):
+    hw = KasumiArray8Hw
+    _tests = {
+        "throughput_8"  :  (KasumiArray_8,10*1000,  KasumiArray.kwargs),
+    }
+    pass
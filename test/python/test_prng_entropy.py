@@ -23,6 +23,11 @@
 from random import Random
 from regress.utils.lfsr import Lfsr
 from regress.crypto.prng import t_prng_config, t_prng_status, t_prng_whiteness_control, t_prng_whiteness_result
+from regress.crypto.prng_whiteness import PrngWhitenessModel, whiteness_control_word, unpack_result
+from regress.crypto.prng_entropy_mux import entropy_mux_4, EntropyLogChecker
+from regress.crypto.prng_hw import trace_of_changes
+from regress.crypto.prng_scoreboard import PrngScoreboard
+from regress.crypto.sp800_22 import Battery, status_event_bits
 from cdl.sim     import ThExecFile, LogEventParser
 from cdl.sim     import HardwareThDut
 from cdl.sim     import TestCase
@@ -39,6 +44,17 @@ class EntropyLogParser(LogEventParser):
     attr_map = {"entropy_out":{"active":1,"count":2,"entropy":3}}
     pass
 
+#c PrngLogParser - log event parser for prng
+class PrngLogParser(LogEventParser):
+    def filter_module(self, module_name:str) -> bool : return True
+    def map_log_type(self, log_type:str) -> Optional[str] :
+        if log_type in self.attr_map: return log_type
+        return None
+    attr_map = {"seeding":{"lfsr":1,"entropy":2,"lfsr_0":3,"lfsr_1":4,"lfsr_2":5,"lfsr_3":6},
+                "status":{"valid":1,"data":2,"seed_complete":3},
+    }
+    pass
+
 #a PrngEntropyMux Test classes
 #c PrngEntropyMux4_Base
 class PrngEntropyMux4_Base(ThExecFile):
@@ -97,13 +113,13 @@ class PrngEntropyMux4_Base(ThExecFile):
     def validate_burst(self, burst):
         last_cycle = None
         tpc = self.ticks_per_cycle()
-        while (self.log_entropy.num_events()!=0) and (burst!=[]):
+        for e in burst:
+            if self.log_entropy.num_events()==0: break
             l = self.log_entropy_parser.parse_log_event(self.log_entropy.event_pop())
             if last_cycle is not None:
                 self.compare_expected("Entropy back-to-back",last_cycle+tpc,l.global_cycle)
                 pass
             last_cycle = l.global_cycle
-            e = burst.pop(0)
             self.compare_expected("Entropy out %s"%(str(l)),e,l.entropy)
             pass
         pass
@@ -214,61 +230,111 @@ class PrngEntropyMux4_5(PrngEntropyMux4_Base):
         pass
     pass
 
+#c PrngEntropyMux4_6
+class PrngEntropyMux4_6(PrngEntropyMux4_Base):
+    """
+    Long random stimulus, with every entropy_out log event checked in
+    bulk against the prng_entropy_mux model at the end of the run
+    """
+    cycles = 20000
+    toggle_probability = 0.02
+    #f run
+    def run(self):
+        self.bfm_wait(20)
+        random = Random()
+        random.seed("PrngEntropyMux4_6")
+        self.trace = []
+        v = 0
+        for i in range(self.cycles):
+            if random.random()<self.toggle_probability: v = random.randrange(16)
+            self.entropy_in.drive(v)
+            self.bfm_wait(1)
+            self.trace.append(v)
+            pass
+        # Allow the mux to go inactive
+        self.trace.extend([v]*300)
+        self.bfm_wait(300)
+        pass
+    #f run__finalize
+    def run__finalize(self):
+        events = []
+        while self.log_entropy.num_events()!=0:
+            l = self.log_entropy_parser.parse_log_event(self.log_entropy.event_pop())
+            events.append((l.global_cycle, l.active, l.count, l.entropy))
+            pass
+        checker = EntropyLogChecker(entropy_mux_4(self.trace), cycles_per_tick=self.ticks_per_cycle())
+        self.compare_expected("Entropy mux log events match model", None, checker.check(events))
+        self.bfm_wait_until_test_done(1000)
+        self.passtest("Test completed")
+        pass
+    pass
+
 #a Prng Test classes
 #c Prng_Base
 class Prng_Base(ThExecFile):
     """
+    The inputs driven are recorded as a list of changes, so that the
+    expected behaviour of the whole run can be produced by replaying
+    them through crypto.prng_hw.PrngHwModel
+
+    The status and seeding log events are only recorded during the
+    run; at the end they are checked in bulk by a PrngScoreboard,
+    which reports the first divergence from the model. The SP800-22
+    battery is also run on the data of the status events, for
+    information only (a run is too short for its p-values to be a
+    check).
     """
     prng_module = "dut"
+    # Cycle of the log events relative to the cycle the inputs are driven in
+    scoreboard_cycle_offset = 0
 
-    l0 = Lfsr(nbits=47, poly=(1<<46)|1)
-    l1 = Lfsr(nbits=53, poly=(1<<52)|(1<<51)|(1<<47)|1)
-    l2 = Lfsr(nbits=59, poly=(1<<57)|(1<<55)|(1<<52)|1)
-    l3 = Lfsr(nbits=61, poly=(1<<60)|(1<<59)|(1<<56)|1)
     # min_valid of 4 will yield 1/16  = 0.0625
     # min_valid of 3 will yield 5/16  = 0.3125
     # min_valid of 2 will yield 10/16 = 0.625
     prng_config = {"min_valid":2}
-    lfsrs = (l0, l1, l2, l3)
-    #f clock_lfsrs
-    def clock_lfsrs(self):
-        for i in range(4):
-            l = self.lfsrs[i]
-            l.clk_once()
-            if l.get()==0: l.set(1)
-            pass
+    #f cycle
+    def cycle(self):
+        return self.global_cycle() // self.ticks_per_cycle()
+    #f drive_input
+    def drive_input(self, name, value):
+        """
+        Drive an input of the DUT, recording the change with the cycle it is presented in
+        """
+        {"entropy_in":self.entropy_in,
+         "seed_request":self.prng_config__seed_request,
+         "enable":self.prng_config__enable,
+         "min_valid":self.prng_config__min_valid,
+         "wide":self.prng_config__wide,
+        }[name].drive(value)
+        self.inputs[name] = value
+        self.input_changes.append((self.cycle(), dict(self.inputs)))
         pass
-    #f get_value
-    def get_value(self):
-        v=0
-        nv = 0
-        for l in self.lfsrs:
-            lv = l.get(3)
-            if lv in [1,2]:
-                v ^= lv & 1
-                nv = nv + 1
-                pass
-            pass
-        return (nv, v)
+    #f input_trace
+    def input_trace(self, ncycles):
+        """
+        Return the trace of inputs for cycles 0 to ncycles-1
+        """
+        return trace_of_changes([(c, i["entropy_in"], i["seed_request"], i["enable"], i["min_valid"], i["wide"]) for (c, i) in self.input_changes], ncycles)
     #f drive_entropy
     def drive_entropy(self, entropy, seed_request=0):
-        self.prng_config__seed_request.drive(seed_request)
+        self.drive_input("seed_request", seed_request)
         for e in entropy:
-            self.entropy_in.drive(e)
+            self.drive_input("entropy_in", e)
             self.bfm_wait(1)
-            self.clock_lfsrs()
-            self.prng_config__seed_request.drive(0)
+            self.drive_input("seed_request", 0)
             pass
-        self.entropy_in.drive(0)
+        self.drive_input("entropy_in", 0)
         pass
     #f run__init - invoked by submodules
     def run__init(self):
-        self.log_entropy         = self.log_recorder(self.prng_module)
-        self.log_entropy_parser  = EntropyLogParser()
-        for l in self.lfsrs: l.set(1)
+        self.log_prng        = self.log_recorder(self.prng_module)
+        self.log_prng_parser = PrngLogParser()
+        self.inputs = {"entropy_in":0, "seed_request":0, "enable":0, "min_valid":0, "wide":0}
+        self.input_changes = []
         self.bfm_wait(10)
-        self.prng_config__enable.drive(1)
-        self.prng_config__min_valid.drive(self.prng_config["min_valid"])
+        self.drive_input("enable", 1)
+        self.drive_input("min_valid", self.prng_config["min_valid"])
+        self.drive_input("wide", self.prng_config.get("wide",0))
         self.bfm_wait(10)
         pass
     #f run
@@ -278,8 +344,40 @@ class Prng_Base(ThExecFile):
     def run__finalize(self):
         # self.verbose.error("%s"%(self.global_cycle()))
         self.bfm_wait_until_test_done(1000)
+        self.check_scoreboard()
         self.passtest("Test completed")
         pass
+    #f check_scoreboard
+    def check_scoreboard(self):
+        """
+        Check the recorded log events against the model of the whole run
+        """
+        scoreboard = PrngScoreboard(cycle_offset=self.scoreboard_cycle_offset)
+        statuses = []
+        tpc = self.ticks_per_cycle()
+        while self.log_prng.num_events()>0:
+            l = self.log_prng_parser.parse_log_event(self.log_prng.event_pop())
+            if l is None: continue
+            cycle = l.global_cycle // tpc
+            if hasattr(l, "lfsr_0"):
+                scoreboard.add_seeding(cycle, l.lfsr, l.entropy, (l.lfsr_0, l.lfsr_1, l.lfsr_2, l.lfsr_3))
+                pass
+            else:
+                scoreboard.add_status(cycle, l.valid, l.data, l.seed_complete)
+                statuses.append((cycle, l.valid, l.data, l.seed_complete))
+                pass
+            pass
+        divergence = scoreboard.check(*self.input_trace(self.cycle()))
+        self.compare_expected("Prng scoreboard", None, None if divergence is None else str(divergence))
+        bits = status_event_bits(statuses)
+        if len(bits)>0:
+            battery = Battery()
+            battery.update(bits)
+            for l in battery.report():
+                self.verbose.info(l)
+                pass
+            pass
+        pass
     #f All done
     pass
 
@@ -303,6 +401,14 @@ class Prng_0(Prng_Base):
         pass
     pass
 
+#c Prng_1
+class Prng_1(Prng_0):
+    """
+    As Prng_0 in wide mode, with eight lanes
+    """
+    prng_config = {"min_valid":2, "wide":2}
+    pass
+
 #a TbPrng Test classes
 #c TbPrng_Base
 class TbPrng_Base(ThExecFile):
@@ -311,6 +417,7 @@ class TbPrng_Base(ThExecFile):
     prng_module = "dut"
 
     prng_config = {"min_valid":2}
+    whiteness_lanes = 1
     whiteness_control={ "mode":2, # 0-> count bits, 1 => run_length, 2 => template match, 3=>max excursions
                         "subtype":0, # count ones if 0, toggle if 1; ignored for run length; overlapping if 0; max excursions if 0, number >=N if 1
                         "only_valid":1, # run length counts down only if valid
@@ -377,6 +484,7 @@ class TbPrng_Base(ThExecFile):
         self.bfm_wait(10)
         self.prng_config__enable.drive(1)
         self.prng_config__min_valid.drive(self.prng_config["min_valid"])
+        self.prng_config__wide.drive(self.prng_config.get("wide",0))
         self.bfm_wait(10)
         pass
     #f run
@@ -393,27 +501,94 @@ class TbPrng_Base(ThExecFile):
 
 #c TbPrng_0
 class TbPrng_0(TbPrng_Base):
+    """
+    Run the whiteness monitor on the PRNG output, recording the PRNG
+    data from the cycle in which the request is acknowledged until the
+    result is valid, and check the result against the software model
+    """
+    run_length = 5000
     #f run
     def run(self):
         random = Random()
         self.bfm_wait(20)
         self.drive_entropy([1,0,0])
-        self.whiteness_control__control.drive((self.whiteness_control["mode"]<<14) |
-                                              (self.whiteness_control["subtype"]<<13) |
-                                              (self.whiteness_control["only_valid"]<<12) |
-                                              (self.whiteness_control["data"]<<0)
-                                              
-        )
-        self.whiteness_control__run_length.drive(5000)
+        control = whiteness_control_word(mode=self.whiteness_control["mode"],
+                                         subtype=self.whiteness_control["subtype"],
+                                         only_valid=self.whiteness_control["only_valid"],
+                                         data=self.whiteness_control["data"])
+        self.whiteness_control__control.drive(control)
+        self.whiteness_control__run_length.drive(self.run_length)
         self.whiteness_control__request.drive(1)
-        self.bfm_wait(2)
+        self.bfm_wait(1)
         self.whiteness_control__request.drive(0)
-        self.whiteness_result__valid.wait_for_value(1)
+        while self.whiteness_result__ack.value()==0:
+            self.bfm_wait(1)
+            pass
+        valid = []
+        data = []
+        while self.whiteness_result__valid.value()==0:
+            valid.append(self.prng_status__wide_data__valid.value())
+            data.append(self.prng_status__wide_data__data.value())
+            self.bfm_wait(1)
+            pass
         r = self.whiteness_result__data.value()
         print("%016x"%r)
+        expected = PrngWhitenessModel(lanes=self.whiteness_lanes).run(control, self.run_length, valid, data)
+        self.compare_expected("Whiteness result counters", unpack_result(expected), unpack_result(r))
         pass
     pass
 
+#c TbPrng_1
+class TbPrng_1(TbPrng_0):
+    whiteness_control={"mode":0, "subtype":1, "only_valid":0, "data":0}
+    pass
+
+#c TbPrng_2
+class TbPrng_2(TbPrng_0):
+    whiteness_control={"mode":1, "subtype":0, "only_valid":1, "data":4}
+    pass
+
+#c TbPrng_3
+class TbPrng_3(TbPrng_0):
+    whiteness_control={"mode":2, "subtype":1, "only_valid":1, "data":0x23}
+    pass
+
+#c TbPrng_4
+class TbPrng_4(TbPrng_0):
+    whiteness_control={"mode":3, "subtype":0, "only_valid":0, "data":0}
+    pass
+
+#c TbPrng_5
+class TbPrng_5(TbPrng_0):
+    whiteness_control={"mode":3, "subtype":1, "only_valid":1, "data":8}
+    pass
+
+#c TbPrng_6
+class TbPrng_6(TbPrng_0):
+    """
+    As TbPrng_2 with the PRNG in wide mode and an eight lane whiteness
+    monitor, so the whiteness monitor takes eight bits per cycle
+    """
+    prng_config = {"min_valid":2, "wide":2}
+    whiteness_lanes = 8
+    whiteness_control={"mode":1, "subtype":0, "only_valid":1, "data":4}
+    run_length = 1000
+    pass
+
+#c TbPrng_7
+class TbPrng_7(TbPrng_6):
+    whiteness_control={"mode":2, "subtype":0, "only_valid":1, "data":0xc6}
+    pass
+
+#c TbPrng_8
+class TbPrng_8(TbPrng_6):
+    """
+    As TbPrng_6 with the default (one lane) whiteness monitor, which
+    monitors lane 0 of the wide data
+    """
+    whiteness_lanes = 1
+    pass
+
 #a Hardware classes
 #c PrngEntropyMux4Hw
 class PrngEntropyMux4Hw(HardwareThDut):
@@ -455,6 +630,11 @@ class TbPrngHw(HardwareThDut):
     }
     pass
 
+#c TbPrng8Hw
+class TbPrng8Hw(TbPrngHw):
+    module_name  = "tb_prng_8"
+    pass
+
 #a Simulation test classes
 #c PrngEntropyMux4
 class PrngEntropyMux4(TestCase):
@@ -471,6 +651,7 @@ class PrngEntropyMux4(TestCase):
         "mux4_3"  :  (PrngEntropyMux4_3,1*1000,  kwargs),
         "mux4_4"  :  (PrngEntropyMux4_4,1*1000,  kwargs),
         "mux4_5"  :  (PrngEntropyMux4_5,6*1000,  kwargs),
+        "mux4_long" :  (PrngEntropyMux4_6,30*1000,  kwargs),
     }
     pass
 
@@ -484,6 +665,7 @@ class Prng(TestCase):
     }
     _tests = {
         "smoke"  :  (Prng_0,40*1000,  kwargs),
+        "wide"   :  (Prng_1,40*1000,  kwargs),
     }
     pass
 
@@ -497,6 +679,21 @@ class TbPrng(TestCase):
     }
     _tests = {
         "smoke"  :  (TbPrng_0,40*1000,  kwargs),
+        "count_toggles"   :  (TbPrng_1,40*1000,  kwargs),
+        "run_length"      :  (TbPrng_2,40*1000,  kwargs),
+        "non_overlapping" :  (TbPrng_3,40*1000,  kwargs),
+        "max_excursions"  :  (TbPrng_4,40*1000,  kwargs),
+        "excursions_of_N" :  (TbPrng_5,40*1000,  kwargs),
+        "wide_lane_0"     :  (TbPrng_8,40*1000,  kwargs),
+    }
+    pass
+
+#c TbPrng8
+class TbPrng8(TbPrng):
+    hw = TbPrng8Hw
+    _tests = {
+        "wide_run_length" :  (TbPrng_6,40*1000,  TbPrng.kwargs),
+        "wide_overlapping":  (TbPrng_7,40*1000,  TbPrng.kwargs),
     }
     pass
 